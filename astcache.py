@@ -0,0 +1,287 @@
+import hashlib
+import marshal
+import os
+
+import caching
+from semantics import *
+
+
+# NOTE: trees as they come out of the parser are cached by source, next to
+# the other cached files. A tree is stored as nested tuples of node kind,
+# line number and the arguments of the node's constructor, children
+# included, dumped with marshal, and loaded back by calling the constructors
+# again, so that nothing that is set up by them (parents, inline caches,
+# operators) is stored. Only trees of sources without errors are stored,
+# see parser.analyze(). Entries unused for MAX_AGE seconds are removed, and
+# then the least recently used ones while they take more than MAX_SIZE
+
+# NOTE: must be changed whenever the encoding changes, as it is a part of
+# the cache key along with the sources of the modules that make the trees
+VERSION = '1'
+
+SUFFIX = '.ast'
+MAX_SIZE = 64 << 20
+MAX_AGE = 30 * 24 * 60 * 60
+
+_SOURCES = ['lexis.py', 'syntax.py', 'semantics.py']
+
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+_key_prefix = None
+
+
+def load(data):
+    # the tree of the source, None if it isn't cached
+    path = caching.path(_key(data) + SUFFIX)
+    try:
+        with open(path, 'rb') as f:
+            root = decode(marshal.load(f))
+    except (IOError, EOFError, ValueError, TypeError, KeyError, IndexError):
+        _stats['misses'] += 1
+        return None
+    _stats['hits'] += 1
+    try:
+        os.utime(path, None)  # the age is the time since the last use
+    except OSError:
+        pass
+    return root
+
+
+def store(data, root):
+    encoded = encode(root)
+    caching.store(_key(data) + SUFFIX, lambda f: marshal.dump(encoded, f))
+    _stats['stores'] += 1
+    _stats['evictions'] += caching.evict(SUFFIX, MAX_SIZE, MAX_AGE)
+
+
+def stats():
+    # counters of this process, and the entries on disk
+    result = dict(_stats)
+    entries = caching.entries(SUFFIX)
+    result['entries'] = len(entries)
+    result['size'] = sum(size for _, size, _ in entries)
+    return result
+
+
+def _key(data):
+    global _key_prefix
+    if _key_prefix is None:
+        _key_prefix = caching.sources_digest(_SOURCES, VERSION)
+    return hashlib.sha1(_key_prefix + data).hexdigest()
+
+
+# Encoding
+
+
+class Encoder(object):
+    def encode(self, item):
+        return getattr(self, '_encode_' + type(item).__name__)(item)
+
+    def _encode_list(self, items):
+        return [self.encode(item) for item in items]
+
+    def _encode_NoneType(self, item):
+        return None
+
+    # Nodes
+
+    def _encode_ScopeNode(self, node):
+        return _SCOPE, node.lineno, self._encode_list(node.iterchildren())
+
+    def _encode_ExpressionStatementNode(self, node):
+        return _EXPRESSION_STATEMENT, node.lineno, self.encode(node.expression)
+
+    def _encode_VariableAssignmentNode(self, node):
+        return _ASSIGNMENT, node.lineno, node.name, self.encode(node.expression)
+
+    def _encode_DeclaredVariableAssignmentNode(self, node):
+        return (
+            _DECLARED_ASSIGNMENT, node.lineno,
+            self.encode(node.var_decl), self.encode(node.expression)
+        )
+
+    def _encode_MemberAssignmentNode(self, node):
+        return (
+            _MEMBER_ASSIGNMENT, node.lineno,
+            self.encode(node.member_node), self.encode(node.expression)
+        )
+
+    def _encode_FunctionDeclarationNode(self, node):
+        return _FUNCTION_DECLARATION, node.lineno, self.encode(node.func)
+
+    def _encode_ReturnNode(self, node):
+        return _RETURN, node.lineno, self.encode(node.expression)
+
+    def _encode_ClassDeclarationNode(self, node):
+        # the members include the constructor added by ClassValue if there
+        # was none, which it keeps as the declared one when loaded
+        cls = node.cls
+        return _CLASS_DECLARATION, node.lineno, cls.name, self._encode_list(cls.members)
+
+    def _encode_PrintNode(self, node):
+        return _PRINT, node.lineno, self.encode(node.expression)
+
+    def _encode_IfNode(self, node):
+        return (
+            _IF, node.lineno, self.encode(node.condition),
+            self.encode(node.block), self.encode(node.else_block)
+        )
+
+    def _encode_WhileLoopNode(self, node):
+        return _WHILE, node.lineno, self.encode(node.condition), self.encode(node.block)
+
+    def _encode_VariableDeclarationNode(self, node):
+        return _VARIABLE_DECLARATION, node.lineno, self.encode(node.var)
+
+    def _encode_PrimitiveValueExpression(self, node):
+        return _PRIMITIVE, node.lineno, self.encode(node.value)
+
+    def _encode_VariableExpression(self, node):
+        return _VARIABLE, node.lineno, node.name
+
+    def _encode_NegateExpression(self, node):
+        return _NEGATE, node.lineno, self.encode(node.expression)
+
+    def _encode_NegativeExpression(self, node):
+        return _NEGATIVE, node.lineno, self.encode(node.expression)
+
+    def _encode_binary(self, kind, node):
+        return kind, node.lineno, node.op, self.encode(node.left), self.encode(node.right)
+
+    def _encode_BooleanOperationExpression(self, node):
+        return self._encode_binary(_BOOLEAN_OPERATION, node)
+
+    def _encode_ArithmeticOperationExpression(self, node):
+        return self._encode_binary(_ARITHMETIC_OPERATION, node)
+
+    def _encode_ComparisonExpression(self, node):
+        return self._encode_binary(_COMPARISON, node)
+
+    def _encode_MemberAccessExpression(self, node):
+        return _MEMBER_ACCESS, node.lineno, self.encode(node.operand), node.name
+
+    def _encode_FunctionCallExpression(self, node):
+        return _FUNCTION_CALL, node.lineno, self._encode_list(node.iterchildren())
+
+    def _encode_NewInstanceExpression(self, node):
+        return _NEW_INSTANCE, node.lineno, node.name, self._encode_list(node.iterchildren())
+
+    def _encode_ThisExpression(self, node):
+        return _THIS, node.lineno
+
+    # Values
+
+    def _encode_FunctionValue(self, func):
+        return (
+            _FUNCTION, func.lineno, func.name, self._encode_list(func.params),
+            func.return_type, self.encode(func.block)
+        )
+
+    def _encode_Variable(self, var):
+        # variables are undefined until the program is run
+        return _VARIABLE_ITEM, var.name, var.type
+
+    def _encode_NumberValue(self, value):
+        return _NUMBER, value.value
+
+    def _encode_StringValue(self, value):
+        return _STRING, value.value
+
+    def _encode_BooleanValue(self, value):
+        return _BOOLEAN, value.value
+
+    def _encode_NullValue(self, value):
+        return (_NULL,)
+
+    def _encode_UndefinedValue(self, value):
+        return (_UNDEFINED,)
+
+
+def encode(root):
+    return Encoder().encode(root)
+
+
+# Decoding
+
+
+def decode(item):
+    if item is None:
+        return None
+    return _DECODERS[item[0]](*item[1:])
+
+
+def _decode_list(items):
+    return [decode(item) for item in items]
+
+
+def _decode_if(lineno, condition, block, else_block):
+    node = IfNode(lineno, decode(condition), decode(block))
+    if else_block is not None:
+        node.add_else(decode(else_block))
+    return node
+
+
+def _decode_function_call(lineno, children):
+    children = _decode_list(children)
+    return FunctionCallExpression(lineno, children[0], children[1:])
+
+
+# kinds of encoded items
+(
+    _SCOPE, _EXPRESSION_STATEMENT, _ASSIGNMENT, _DECLARED_ASSIGNMENT,
+    _MEMBER_ASSIGNMENT, _FUNCTION_DECLARATION, _RETURN, _CLASS_DECLARATION,
+    _PRINT, _IF, _WHILE, _VARIABLE_DECLARATION, _PRIMITIVE, _VARIABLE,
+    _NEGATE, _NEGATIVE, _BOOLEAN_OPERATION, _ARITHMETIC_OPERATION,
+    _COMPARISON, _MEMBER_ACCESS, _FUNCTION_CALL, _NEW_INSTANCE, _THIS,
+    _FUNCTION, _VARIABLE_ITEM, _NUMBER, _STRING, _BOOLEAN, _NULL, _UNDEFINED,
+) = range(30)
+
+_DECODERS = {
+    _SCOPE: lambda lineno, children: ScopeNode(lineno, _decode_list(children)),
+    _EXPRESSION_STATEMENT: lambda lineno, e: ExpressionStatementNode(lineno, decode(e)),
+    _ASSIGNMENT: lambda lineno, name, e: VariableAssignmentNode(lineno, name, decode(e)),
+    _DECLARED_ASSIGNMENT: lambda lineno, var_decl, e: DeclaredVariableAssignmentNode(
+        lineno, decode(var_decl), decode(e)
+    ),
+    _MEMBER_ASSIGNMENT: lambda lineno, member, e: MemberAssignmentNode(
+        lineno, decode(member), decode(e)
+    ),
+    _FUNCTION_DECLARATION: lambda lineno, func: FunctionDeclarationNode(lineno, decode(func)),
+    _RETURN: lambda lineno, e: ReturnNode(lineno, decode(e)),
+    _CLASS_DECLARATION: lambda lineno, name, members: ClassDeclarationNode(
+        lineno, name, _decode_list(members)
+    ),
+    _PRINT: lambda lineno, e: PrintNode(lineno, decode(e)),
+    _IF: _decode_if,
+    _WHILE: lambda lineno, c, block: WhileLoopNode(lineno, decode(c), decode(block)),
+    _VARIABLE_DECLARATION: lambda lineno, var: VariableDeclarationNode(lineno, decode(var)),
+    _PRIMITIVE: lambda lineno, value: PrimitiveValueExpression(lineno, decode(value)),
+    _VARIABLE: VariableExpression,
+    _NEGATE: lambda lineno, e: NegateExpression(lineno, decode(e)),
+    _NEGATIVE: lambda lineno, e: NegativeExpression(lineno, decode(e)),
+    _BOOLEAN_OPERATION: lambda lineno, op, l, r: BooleanOperationExpression(
+        lineno, op, decode(l), decode(r)
+    ),
+    _ARITHMETIC_OPERATION: lambda lineno, op, l, r: ArithmeticOperationExpression(
+        lineno, op, decode(l), decode(r)
+    ),
+    _COMPARISON: lambda lineno, op, l, r: ComparisonExpression(
+        lineno, op, decode(l), decode(r)
+    ),
+    _MEMBER_ACCESS: lambda lineno, operand, name: MemberAccessExpression(
+        lineno, decode(operand), name
+    ),
+    _FUNCTION_CALL: _decode_function_call,
+    _NEW_INSTANCE: lambda lineno, name, params: NewInstanceExpression(
+        lineno, name, _decode_list(params)
+    ),
+    _THIS: ThisExpression,
+    _FUNCTION: lambda lineno, name, params, return_type, block: FunctionValue(
+        lineno, name, _decode_list(params), return_type, decode(block)
+    ),
+    _VARIABLE_ITEM: Variable,
+    _NUMBER: number_value,
+    _STRING: StringValue,
+    _BOOLEAN: boolean_value,
+    _NULL: lambda: NULL,
+    _UNDEFINED: lambda: UNDEFINED,
+}
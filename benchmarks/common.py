@@ -0,0 +1,64 @@
+import gc
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import output
+
+
+# NOTE: what the benchmarks share. Importing this module puts the root of the
+# repository first in the path, so that it comes before the modules of the
+# interpreter:
+#
+#   from common import best_of
+#
+#   import parser
+
+
+def best_of(function, repeat, warmup=0):
+    # the best time of function() over repeat runs, after warmup ones. As in
+    # timeit, collections are off while it runs, and what it prints is
+    # dropped
+    sink = output.ListSink()
+    previous = output.set_thread_sink(sink)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        best = None
+        for i in xrange(warmup + repeat):
+            start = time.time()
+            function()
+            elapsed = time.time() - start
+            if i >= warmup:
+                best = elapsed if best is None else min(best, elapsed)
+            sink.lines = []
+    finally:
+        if enabled:
+            gc.enable()
+        output.set_thread_sink(previous)
+    return best
+
+
+def compare_classes(nodes, classes, function, repeat):
+    # the best times of function() with the nodes as they are, and with the
+    # class of each replaced by classes[class], a subclass that runs an
+    # earlier version of the code. The two take turns, as timings drift
+    originals = [type(node) for node in nodes]
+    current = previous = None
+    try:
+        for _ in xrange(repeat):
+            for node, cls in zip(nodes, originals):
+                node.__class__ = cls
+            elapsed = best_of(function, 1)
+            current = elapsed if current is None else min(current, elapsed)
+            for node, cls in zip(nodes, originals):
+                node.__class__ = classes[cls]
+            elapsed = best_of(function, 1)
+            previous = elapsed if previous is None else min(previous, elapsed)
+    finally:
+        for node, cls in zip(nodes, originals):
+            node.__class__ = cls
+    return current, previous
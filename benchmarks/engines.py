@@ -0,0 +1,61 @@
+#! /bin/python
+
+import sys
+
+from common import best_of
+
+import parser
+
+
+LOOP_PROGRAM = '''
+let i: number = 0;
+let s: number = 0;
+while (i < 100000) {
+    s = s + i * 2 - 1;
+    i = i + 1;
+}
+'''
+
+CALL_PROGRAM = '''
+function add(a: number, b: number): number {
+    return a + b;
+}
+
+function fib(n: number): number {
+    if (n < 2) {
+        return n;
+    }
+    let a: number = n - 1;
+    let b: number = n - 2;
+    return add(fib(a), fib(b));
+}
+
+let result: number = fib(18);
+'''
+
+PROGRAMS = [
+    ('loop', LOOP_PROGRAM),
+    ('calls', CALL_PROGRAM),
+]
+
+REPEAT = 3
+
+
+def measure(root, engine):
+    return best_of(lambda: parser.ENGINES[engine](root), REPEAT)
+
+
+def main():
+    engines = sys.argv[1:] or sorted(parser.ENGINES)
+    for name, program in PROGRAMS:
+        root = parser.prepare(program)
+        baseline = measure(root, 'tree')
+        for engine in engines:
+            elapsed = baseline if engine == 'tree' else measure(root, engine)
+            print '{:<8} {:<10} {:8.3f}s  x{:.2f}'.format(
+                name, engine, elapsed, baseline / elapsed
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#! /bin/python
+
+import resource
+import sys
+
+import common
+
+import parser
+from semantics import ClassDeclarationNode, number_value, walk
+
+
+TEMPLATE = '''
+class Point{i} {{
+    x: number;
+    y: number;
+
+    constructor(x: number, y: number) {{
+        this.x = x;
+        this.y = y;
+    }}
+
+    norm(): number {{
+        return this.x * this.x + this.y * this.y;
+    }}
+}}
+
+function work{i}(n: number): number {{
+    let total: number = 0;
+    let i: number = 0;
+    while (i < n) {{
+        let j: number = i + 1;
+        let p: Point{i} = new Point{i}(i, j);
+        if (p.norm() > 10 && !(i === n)) {{
+            total = total + p.norm() / 2;
+        }} else {{
+            total = total - 1;
+        }}
+        i = i + 1;
+    }}
+    return total;
+}}
+
+console.log(work{i}({i}));
+'''
+
+COPIES = 500
+OBJECTS = 10000
+
+
+def synthetic_program(copies):
+    return ''.join(TEMPLATE.format(i=i) for i in xrange(copies))
+
+
+def sizeof(obj):
+    # the object and its attribute dict, if it has one
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def node_size(node):
+    children = getattr(node, '_children', None)
+    if children is None:
+        return sizeof(node)
+    return sizeof(node) + sys.getsizeof(children)
+
+
+def object_size(obj):
+    # the values themselves are shared, see number_value()
+    return sizeof(obj) + sys.getsizeof(obj.value)
+
+
+def max_rss():
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main():
+    data = synthetic_program(COPIES)
+    rss = max_rss()
+    root = parser.prepare(data)
+    rss = max_rss() - rss
+    nodes = list(walk(root))
+    total = sum(node_size(node) for node in nodes)
+    print '{} nodes, {:.1f} bytes per node, max RSS +{}KB while parsing'.format(
+        len(nodes), float(total) / len(nodes), rss
+    )
+
+    cls = next(n for n in nodes if isinstance(n, ClassDeclarationNode)).cls
+    objects = [cls.allocate(0) for _ in xrange(OBJECTS)]
+    total = sum(object_size(obj) for obj in objects)
+    print '{} objects, {:.1f} bytes per object with its fields'.format(
+        len(objects), float(total) / len(objects)
+    )
+    print '{:.1f} bytes per number'.format(sizeof(number_value(0.5)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#! /bin/python
+
+from common import compare_classes
+
+import parser
+from semantics import (
+    TRUE, ArithmeticOperationExpression, BooleanOperationExpression,
+    ComparisonExpression, DivisionByZeroError, PrimitiveValueExpression,
+    boolean_value, number_value, walk
+)
+
+
+# NOTE: every operation is timed as it is evaluated, with the operator
+# function bound when the node is built, and as it was before, the sign
+# being compared on every evaluation, see the Dispatching classes, and the
+# ratio of the two is printed. The arithmetic loop is run both ways too, by
+# changing the class of its nodes
+
+# operands are assigned variables, so that the optimizer can't fold the
+# operations
+ARITHMETIC_PROGRAM = '''
+let i: number = 0;
+let a: number = 0;
+a = 3;
+let s: number = 0;
+while (i < 50000) {
+    s = (s + i * a - a / 2) * 0.5;
+    if (i >= a && !(s === a) || i <= 0) {
+        s = s - 1;
+    }
+    i = i + 1;
+}
+'''
+
+OPERATIONS = [
+    (ArithmeticOperationExpression, ['+', '-', '*', '/'], number_value(7.0)),
+    (ComparisonExpression, ['<', '>', '<=', '>=', '===', '!=='], number_value(7.0)),
+    (BooleanOperationExpression, ['&&', '||'], TRUE),
+]
+
+EVALUATIONS = 100000
+REPEAT = 10
+
+
+class DispatchingBooleanOperation(BooleanOperationExpression):
+    __slots__ = ()
+
+    def calculate(self, frame):
+        lvalue = self.left.calculate(frame).bool()
+        rvalue = self.right.calculate(frame).bool()
+        if self.op == '&&':
+            result = lvalue and rvalue
+        elif self.op == '||':
+            result = lvalue or rvalue
+        return boolean_value(result)
+
+
+class DispatchingArithmeticOperation(ArithmeticOperationExpression):
+    __slots__ = ()
+
+    def calculate(self, frame):
+        lvalue = self.left.calculate(frame).num()
+        rvalue = self.right.calculate(frame).num()
+        if self.op == '+':
+            result = lvalue + rvalue
+        elif self.op == '-':
+            result = lvalue - rvalue
+        elif self.op == '*':
+            result = lvalue * rvalue
+        elif self.op == '/':
+            try:
+                result = lvalue / rvalue
+            except ZeroDivisionError:
+                raise DivisionByZeroError(self.lineno)
+        return number_value(result)
+
+
+class DispatchingComparison(ComparisonExpression):
+    __slots__ = ()
+
+    def calculate(self, frame):
+        lvalue = self.left.calculate(frame).num()
+        rvalue = self.right.calculate(frame).num()
+        if self.op == '<':
+            result = lvalue < rvalue
+        elif self.op == '>':
+            result = lvalue > rvalue
+        elif self.op == '<=':
+            result = lvalue <= rvalue
+        elif self.op == '>=':
+            result = lvalue >= rvalue
+        elif self.op == '===':
+            result = lvalue == rvalue
+        elif self.op == '!==':
+            result = lvalue != rvalue
+        return boolean_value(result)
+
+
+DISPATCHING = {
+    BooleanOperationExpression: DispatchingBooleanOperation,
+    ArithmeticOperationExpression: DispatchingArithmeticOperation,
+    ComparisonExpression: DispatchingComparison,
+}
+
+
+def measure_operation(cls, op, value):
+    left = PrimitiveValueExpression(0, value)
+    right = PrimitiveValueExpression(0, value)
+    node = cls(0, op, left, right)
+
+    def evaluate():
+        calculate = node.calculate
+        for _ in xrange(EVALUATIONS):
+            calculate(None)
+    bound, dispatched = compare_classes([node], DISPATCHING, evaluate, REPEAT)
+    return bound / EVALUATIONS, dispatched / EVALUATIONS
+
+
+def measure_loop():
+    root = parser.prepare(ARITHMETIC_PROGRAM)
+    nodes = [node for node in walk(root) if type(node) in DISPATCHING]
+    return compare_classes(nodes, DISPATCHING, lambda: parser.ENGINES['tree'](root), REPEAT)
+
+
+def main():
+    print '{:<16} {:>10} {:>10}'.format('', 'bound', 'dispatched')
+    for cls, ops, value in OPERATIONS:
+        for op in ops:
+            bound, dispatched = measure_operation(cls, op, value)
+            print '{:<16} {:8.0f}ns {:8.0f}ns  x{:.2f}'.format(
+                op, bound * 1e9, dispatched * 1e9, dispatched / bound
+            )
+    bound, dispatched = measure_loop()
+    print '{:<16} {:9.3f}s {:9.3f}s  x{:.2f}'.format(
+        'arithmetic loop', bound, dispatched, dispatched / bound
+    )
+
+
+if __name__ == '__main__':
+    main()
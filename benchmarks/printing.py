@@ -0,0 +1,62 @@
+#! /bin/python
+
+import os
+import sys
+import time
+
+import common
+
+import output
+import parser
+
+
+# NOTE: a loop that prints a line per iteration, run with each sink: lines
+# written to /dev/null one by one or in batches (the default), and lines
+# kept in a list
+
+PROGRAM = '''
+let i: number = 0;
+while (i < %d) {
+    console.log(i);
+    i = i + 1;
+}
+'''
+
+LINES = 100000
+REPEAT = 3
+
+
+def measure(root, engine, sink):
+    best = None
+    previous = output.set_sink(sink)
+    try:
+        for _ in xrange(REPEAT):
+            start = time.time()
+            parser.ENGINES[engine](root)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+            if isinstance(sink, output.ListSink):
+                sink.lines = []
+    finally:
+        output.set_sink(previous)
+    return best
+
+
+def main():
+    engines = sys.argv[1:] or sorted(parser.ENGINES)
+    root = parser.prepare(PROGRAM % LINES)
+    with open(os.devnull, 'w') as devnull:
+        sinks = [
+            ('unbuffered', lambda: output.StreamSink(devnull, 1)),
+            ('buffered', lambda: output.StreamSink(devnull)),
+            ('list', output.ListSink),
+        ]
+        for engine in engines:
+            for name, make_sink in sinks:
+                elapsed = measure(root, engine, make_sink())
+                print '{:<10} {:<10} {:10.0f} lines/s'.format(engine, name, LINES / elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#! /bin/python
+
+import sys
+import time
+
+import common
+
+import output
+import parser
+
+
+# NOTE: a small program run against many inputs, either compiled once and
+# run with parser.Program.run(), or through parser.interpret(), which
+# parses (or loads from the cache of trees), checks and compiles it every
+# time. What it prints is kept in a list
+
+PROGRAM = '''
+class Account {
+    balance: number;
+
+    constructor(balance: number) {
+        this.balance = balance;
+    }
+
+    deposit(amount: number): number {
+        this.balance = this.balance + amount;
+        return this.balance;
+    }
+}
+
+let account: Account = new Account(start);
+let i: number = 0;
+while (i < 10) {
+    account.deposit(i);
+    i = i + 1;
+}
+console.log(account.balance);
+'''
+
+RUNS = 2000
+
+
+def measure(function):
+    start = time.time()
+    for i in xrange(RUNS):
+        function(i)
+    return RUNS / (time.time() - start)
+
+
+def main():
+    engines = sys.argv[1:] or sorted(parser.ENGINES)
+    previous = output.set_sink(output.ListSink())
+    try:
+        for engine in engines:
+            program = parser.Interpreter(engine).compile(PROGRAM, ['start'])
+            warm = measure(lambda i: program.run({'start': i}))
+            # the input is a declaration in front of the program
+            cold = measure(lambda i: parser.interpret(
+                'let start: number = {};\n'.format(i % 10) + PROGRAM, engine
+            ))
+            print '{:<10} program {:8.0f} runs/s  interpret {:8.0f} runs/s  x{:.1f}'.format(
+                engine, warm, cold, warm / cold
+            )
+    finally:
+        output.set_sink(previous)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#! /bin/python
+
+import sys
+
+from common import best_of, compare_classes
+
+import parser
+from semantics import (
+    UNDEFINED, FunctionDeclarationNode, FunctionValue, IfNode, ReturnNode,
+    ScopeNode, WhileLoopNode, walk
+)
+
+
+# small functions called in a loop, returning from deeper and deeper within
+# their bodies: the deeper the return, the more blocks it has to leave. On
+# the tree engine, they are also run as they were before returns were
+# passed up, a return raising an exception that the call catches, see the
+# Raising classes, and the ratio of the two is printed
+TEMPLATE = '''
+function {name}(n: number): number {{
+{body}
+}}
+
+let i: number = 0;
+let s: number = 0;
+while (i < {calls}) {{
+    s = s + {name}(i);
+    i = i + 1;
+}}
+'''
+
+FUNCTIONS = [
+    ('flat', '''
+    return n + 1;
+'''),
+    ('if', '''
+    if (n > 0) {
+        return n + 1;
+    }
+    return 1;
+'''),
+    ('nested', '''
+    let k: number = 0;
+    while (k < 1) {
+        if (n > 0) {
+            if (n > 1) {
+                return n + 1;
+            }
+        }
+        k = k + 1;
+    }
+    return 1;
+'''),
+    ('no return', '''
+    let k: number = n + 1;
+'''),
+]
+
+CALLS = 20000
+REPEAT = 10
+
+
+class _Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class RaisingReturn(ReturnNode):
+    __slots__ = ()
+
+    def run(self, frame):
+        raise _Return(self.expression.calculate(frame))
+
+
+class RaisingScope(ScopeNode):
+    __slots__ = ()
+
+    def run(self, frame):
+        for child in self._children:
+            child.run(frame)
+
+
+class RaisingIf(IfNode):
+    __slots__ = ()
+
+    def run(self, frame):
+        if self.condition.calculate(frame).bool():
+            self.block.run(frame)
+        elif self.else_block is not None:
+            self.else_block.run(frame)
+
+
+class RaisingWhileLoop(WhileLoopNode):
+    __slots__ = ()
+
+    def run(self, frame):
+        condition, block = self.condition, self.block
+        while condition.calculate(frame).bool():
+            block.run(frame)
+
+
+class RaisingFunction(FunctionValue):
+    __slots__ = ()
+
+    def call(self, values, lineno, this=None, caller=None, check=True):
+        frame = self.new_frame(values, lineno, this, caller, check)
+        try:
+            self.block.run(frame)
+        except _Return as r:
+            return r.value
+        return UNDEFINED
+
+
+RAISING = {
+    ReturnNode: RaisingReturn,
+    ScopeNode: RaisingScope,
+    IfNode: RaisingIf,
+    WhileLoopNode: RaisingWhileLoop,
+    FunctionValue: RaisingFunction,
+}
+
+
+def measure(root, engine):
+    # (ns per call, and as before for the tree engine or None)
+    run = lambda: parser.ENGINES[engine](root)
+    if engine != 'tree':
+        return best_of(run, REPEAT) / CALLS * 1e9, None
+    nodes = [node for node in walk(root) if type(node) in RAISING]
+    # the functions, which the closures made when the program runs copy
+    nodes.extend(
+        node.func for node in walk(root) if isinstance(node, FunctionDeclarationNode)
+    )
+    current, previous = compare_classes(nodes, RAISING, run, REPEAT)
+    return current / CALLS * 1e9, previous / CALLS * 1e9
+
+
+def main():
+    engines = sys.argv[1:] or ['tree']
+    for name, body in FUNCTIONS:
+        func_name = 'f_' + name.replace(' ', '_')
+        program = TEMPLATE.format(name=func_name, body=body, calls=CALLS)
+        root = parser.prepare(program)
+        for engine in engines:
+            current, previous = measure(root, engine)
+            if previous is None:
+                print '{:<10} {:<10} {:8.0f}ns per call'.format(name, engine, current)
+            else:
+                print '{:<10} {:<10} {:8.0f}ns per call, raising {:8.0f}ns  x{:.2f}'.format(
+                    name, engine, current, previous, previous / current
+                )
+
+
+if __name__ == '__main__':
+    main()
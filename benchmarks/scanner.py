@@ -0,0 +1,91 @@
+#! /bin/python
+
+import os
+import sys
+import time
+
+from common import ROOT
+
+import output
+import parser
+from memory import synthetic_program
+
+
+# NOTE: the token streams of both lexers are compared first, on sample.ts, a
+# synthetic program, the edge cases below and the files given as arguments
+
+EDGE_CASES = '''
+let a1: number = 1.5 + 2. - 3.25;
+let $b_: string = 'multi
+line';
+console.logger; xconsole.log; NaNa; Infinity1; 1a2b 3x;
+a === b; a !== b; a == b; a != b; a <= b >= c && d || e; a & b | c;
+x = -1 * y / z; // comment
+// comment at the end, without a newline'''
+
+COPIES = 60
+REPEAT = 10
+
+
+def _key(token):
+    # NaN isn't equal to itself
+    return token.type, repr(token.value), token.lineno, token.lexpos
+
+
+def token_stream(data, lexer):
+    # also what is printed, i.e. lexical errors
+    tokens = []
+    text, error, _ = output.capture(
+        lambda: tokens.extend(_key(token) for token in parser.tokenize(data, lexer))
+    )
+    if error is not None:
+        raise error
+    return tokens, text
+
+
+def compare(data):
+    # None if the lexers agree, else how they differ
+    expected, expected_output = token_stream(data, 'ply')
+    found, output = token_stream(data, 'scanner')
+    for i, (a, b) in enumerate(zip(expected, found)):
+        if a != b:
+            return 'token #{} is {}, expected {}'.format(i, b, a)
+    if len(found) != len(expected):
+        return '{} tokens, expected {}'.format(len(found), len(expected))
+    if output != expected_output:
+        return 'printed {!r}, expected {!r}'.format(output, expected_output)
+    return None
+
+
+def measure(data, lexers):
+    # tokens per second by lexer, which take turns as timings drift
+    best = {}
+    for _ in xrange(REPEAT):
+        for lexer in lexers:
+            start = time.time()
+            count = sum(1 for _ in parser.tokenize(data, lexer))
+            elapsed = time.time() - start
+            best[lexer] = max(best.get(lexer, 0), count / elapsed)
+    return best
+
+
+def main():
+    with open(os.path.join(ROOT, 'sample.ts')) as f:
+        corpus = [('sample.ts', f.read())]
+    corpus.append(('synthetic', synthetic_program(20)))
+    corpus.append(('edge cases', EDGE_CASES))
+    for path in sys.argv[1:]:
+        with open(path) as f:
+            corpus.append((path, f.read()))
+    for name, data in corpus:
+        difference = compare(data)
+        print '{:<12} {}'.format(name, difference or 'same tokens')
+
+    lexers = ['ply', 'scanner']
+    rates = measure(synthetic_program(COPIES), lexers)
+    for lexer in lexers:
+        print '{:<8} {:10.0f} tokens/s'.format(lexer, rates[lexer])
+
+
+if __name__ == '__main__':
+    main()
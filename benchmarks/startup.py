@@ -0,0 +1,63 @@
+#! /bin/python
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT
+
+
+PROGRAM = '''
+function add(a: number, b: number): number {
+    return a + b;
+}
+
+console.log(add(1, 2));
+'''
+
+# run in a fresh interpreter each time, as a command line invocation would
+SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+import parser
+{code}
+'''
+
+RUNS = [
+    ('import', ''),
+    ('tree', 'parser.interpret(sys.stdin.read(), "tree")'),
+    ('python', 'parser.interpret(sys.stdin.read(), "python")'),
+]
+
+REPEAT = 10
+
+
+def run(code, cache_dir):
+    env = dict(os.environ, MTRAN_CACHE_DIR=cache_dir)
+    script = SCRIPT.format(root=ROOT, code=code)
+    start = time.time()
+    process = subprocess.Popen(
+        [sys.executable, '-c', script], env=env, cwd=cache_dir,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+    process.communicate(PROGRAM)
+    return time.time() - start
+
+
+def main():
+    for name, code in RUNS:
+        cache_dir = tempfile.mkdtemp()
+        try:
+            # the first run fills the cache
+            cold = run(code, cache_dir)
+            warm = min(run(code, cache_dir) for _ in xrange(REPEAT))
+        finally:
+            shutil.rmtree(cache_dir)
+        print '{:<8} cold {:6.1f}ms  warm {:6.1f}ms'.format(name, cold * 1e3, warm * 1e3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#! /bin/python
+
+import mmap
+import os
+import subprocess
+import sys
+import tempfile
+from StringIO import StringIO
+
+from common import ROOT
+
+import lexis
+import output
+import streaming
+from memory import synthetic_program
+
+
+# NOTE: tokens read from files and mmaps in small chunks are compared with
+# the ones read from the whole string first, then the peak memory of
+# tokenizing a large file is measured for each kind of source, each in a
+# process of its own. The file is made of lines, of one line, and of lines
+# after a quote that is never closed
+
+# strings and comments spanning chunks, an unfinished one at the end
+EDGE_CASES = '''
+let s: string = 'a string
+over // three
+lines';
+// a comment with a 'quote
+let n: number = 12.5; // another one
+console.log(s); 'unfinished
+'''
+
+CHUNK_SIZES = [1, 7, 64]
+MEGABYTES = 16
+
+SCRIPT = '''
+import mmap
+import resource
+import sys
+import time
+sys.path.insert(0, {root!r})
+import output
+import parser
+with open({path!r}, 'rb') as f:
+    if {kind!r} == 'string':
+        source = f.read()
+    elif {kind!r} == 'mmap':
+        source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        source = f
+    start = time.time()
+    count = sum(1 for _ in parser.tokenize(source))
+    output.flush()  # the lexical errors come first
+    print count, time.time() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+'''
+
+
+def token_stream(lexer, source, chunk_size):
+    # as in benchmarks/scanner.py
+    lexer = lexis.get_lexer(lexer)
+    lexer.lineno = 1
+    return [
+        (t.type, repr(t.value), t.lineno, t.lexpos)
+        for t in streaming.tokens(lexer, source, chunk_size)
+    ]
+
+
+def compare(data):
+    # None if every source gives the same tokens, else the first that doesn't
+    previous = output.set_sink(output.ListSink())  # lexical errors
+    try:
+        for lexer in ('ply', 'scanner'):
+            expected = token_stream(lexer, data, None)
+            for chunk_size in CHUNK_SIZES:
+                if token_stream(lexer, StringIO(data), chunk_size) != expected:
+                    return '{} lexer, file in chunks of {}'.format(lexer, chunk_size)
+                with tempfile.TemporaryFile() as f:
+                    f.write(data)
+                    f.flush()
+                    source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    if token_stream(lexer, source, chunk_size) != expected:
+                        return '{} lexer, mmap in chunks of {}'.format(lexer, chunk_size)
+    finally:
+        output.set_sink(previous)
+    return None
+
+
+def measure(path, kind):
+    script = SCRIPT.format(root=ROOT, path=path, kind=kind)
+    result = subprocess.check_output([sys.executable, '-c', script])
+    # after the lexical errors, if any
+    count, elapsed, rss = result.splitlines()[-1].split()
+    return int(count), float(elapsed), int(rss)
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else MEGABYTES
+    with open(os.path.join(ROOT, 'sample.ts')) as f:
+        corpus = [('sample.ts', f.read())]
+    corpus.append(('synthetic', synthetic_program(3)))
+    corpus.append(('edge cases', EDGE_CASES))
+    for name, data in corpus:
+        print '{:<12} {}'.format(name, compare(data) or 'same tokens')
+
+    template = synthetic_program(10)
+    shapes = [
+        ('lines', '', template),
+        ('one line', '', template.replace('\n', ' ')),
+        ('unclosed quote', "'", template),
+    ]
+    for shape, head, text in shapes:
+        with tempfile.NamedTemporaryFile(suffix='.ts') as f:
+            f.write(head)
+            for _ in xrange(megabytes * (1 << 20) // len(text)):
+                f.write(text)
+            f.flush()
+            print
+            print '{}, {:.1f}MB source'.format(shape, os.path.getsize(f.name) / float(1 << 20))
+            for kind in ('string', 'file', 'mmap'):
+                count, elapsed, rss = measure(f.name, kind)
+                print '{:<8} {} tokens, {:8.0f} tokens/s, max RSS {}KB'.format(
+                    kind, count, count / elapsed, rss
+                )
+
+
+if __name__ == '__main__':
+    main()
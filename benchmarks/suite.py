@@ -0,0 +1,254 @@
+#! /bin/python
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from common import best_of
+
+import output
+import parser
+import syntax
+import tracing
+from memory import synthetic_program
+from semantics import walk
+
+
+# NOTE: the suite of representative programs. Lexing is measured in tokens
+# per second, parsing in nodes per second and running in statements per
+# second, the statements being counted once with a tracer, see tracing.
+# Each measurement is repeated after warming up, and the best time is kept,
+# see common.best_of(). Results can be saved as JSON and compared with the
+# ones of an earlier run, a rate lower by more than the threshold being a
+# regression
+#
+#   benchmarks/suite.py --save before.json
+#   ... a change ...
+#   benchmarks/suite.py --compare before.json
+
+LOOP = '''
+let i: number = 0;
+while (i < 20000) {
+    i = i + 1;
+}
+'''
+
+ARITHMETIC = '''
+let i: number = 0;
+let s: number = 0;
+while (i < 5000) {
+    s = s + (i * 3 - 1) / 2 + i * i - (s / 7 + 1) * 2;
+    i = i + 1;
+}
+'''
+
+ALLOCATION = '''
+class Point {
+    x: number;
+    y: number;
+
+    constructor(x: number, y: number) {
+        this.x = x;
+        this.y = y;
+    }
+}
+
+let i: number = 0;
+let p: Point = null;
+while (i < 5000) {
+    let j: number = i + 1;
+    p = new Point(i, j);
+    i = j;
+}
+'''
+
+METHODS = '''
+class Counter {
+    count: number;
+
+    constructor() {
+        this.count = 0;
+    }
+
+    add(n: number): number {
+        this.count = this.count + n;
+        return this.count;
+    }
+}
+
+let c: Counter = new Counter();
+let i: number = 0;
+while (i < 5000) {
+    c.add(i);
+    i = i + 1;
+}
+'''
+
+# deep enough to be far from the recursion limit of every engine
+CALL_CHAIN = '''
+function chain(n: number): number {
+    if (n < 1) {
+        return 0;
+    }
+    let m: number = n - 1;
+    return chain(m) + 1;
+}
+
+let i: number = 0;
+while (i < 200) {
+    chain(40);
+    i = i + 1;
+}
+'''
+
+PROGRAMS = [
+    ('loop', LOOP),
+    ('arithmetic', ARITHMETIC),
+    ('allocation', ALLOCATION),
+    ('methods', METHODS),
+    ('call chain', CALL_CHAIN),
+    ('synthetic x10', synthetic_program(10)),
+    ('synthetic x50', synthetic_program(50)),
+]
+
+# sources to lex and parse
+SOURCES = [
+    ('synthetic x10', synthetic_program(10)),
+    ('synthetic x100', synthetic_program(100)),
+]
+
+LEXERS = ['ply', 'scanner']
+WARMUP = 1
+REPEAT = 5
+THRESHOLD = 10.0  # percent
+
+
+def count_statements(root):
+    counter = [0]
+
+    def count(frame, event, arg):
+        if event == 'line':
+            counter[0] += 1
+
+    previous = output.set_sink(output.ListSink())
+    tracing.settrace(count)
+    try:
+        parser.ENGINES['tree'](root)
+    finally:
+        tracing.settrace(None)
+        output.set_sink(previous)
+    return counter[0]
+
+
+def lexing(data, lexer, repeat):
+    tokens = sum(1 for _ in parser.tokenize(data, lexer))
+    elapsed = best_of(lambda: sum(1 for _ in parser.tokenize(data, lexer)), repeat, WARMUP)
+    return tokens, elapsed
+
+
+def parsing(data, repeat):
+    # without the cache of trees, see astcache
+    analyzer = syntax.get_analyzer()
+    nodes = sum(1 for _ in walk(analyzer.parse(data, lexer=parser._lexer(None))))
+    elapsed = best_of(lambda: analyzer.parse(data, lexer=parser._lexer(None)), repeat, WARMUP)
+    return nodes, elapsed
+
+
+def running(root, engine, repeat):
+    return best_of(lambda: parser.ENGINES[engine](root), repeat, WARMUP)
+
+
+def run_suite(engines, repeat, report):
+    # {name: {'rate': ..., 'unit': ..., 'time': ...}}, report(name, result)
+    # is called for each one
+    results = {}
+
+    def add(name, amount, elapsed, unit):
+        result = results[name] = {'rate': amount / elapsed, 'unit': unit, 'time': elapsed}
+        report(name, result)
+
+    for source_name, data in SOURCES:
+        for lexer in LEXERS:
+            tokens, elapsed = lexing(data, lexer, repeat)
+            add('lex {} {}'.format(lexer, source_name), tokens, elapsed, 'tokens/s')
+        nodes, elapsed = parsing(data, repeat)
+        add('parse {}'.format(source_name), nodes, elapsed, 'nodes/s')
+    for program_name, program in PROGRAMS:
+        # a tree of its own for each, so that no run finds the inline caches
+        # filled by another engine
+        statements = count_statements(parser.prepare(program))
+        for engine in engines:
+            elapsed = running(parser.prepare(program), engine, repeat)
+            add('run {} {}'.format(engine, program_name), statements, elapsed, 'statements/s')
+    return results
+
+
+def compare(results, baseline, threshold):
+    # names of the results whose rate fell by more than threshold percent
+    regressions = []
+    print
+    print '{:<36} {:>14} {:>14} {:>8}'.format('', 'baseline', 'now', 'change')
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before = baseline[name]['rate']
+        after = results[name]['rate']
+        change = 100 * (after / before - 1)
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print '{:<36} {:>14.0f} {:>14.0f} {:>+7.1f}%{}'.format(name, before, after, change, flag)
+    return regressions
+
+
+def make_argument_parser():
+    argument_parser = argparse.ArgumentParser(description='Runs the benchmark suite.')
+    argument_parser.add_argument(
+        '-e', '--engine', action='append', choices=sorted(parser.ENGINES),
+        help='engine to run the programs with, can be repeated (default: all)'
+    )
+    argument_parser.add_argument(
+        '-r', '--repeat', type=int, default=REPEAT,
+        help='times each measurement is repeated (default: {})'.format(REPEAT)
+    )
+    argument_parser.add_argument('--save', help='file to save the results to, as JSON')
+    argument_parser.add_argument('--compare', help='results of an earlier run to compare with')
+    argument_parser.add_argument(
+        '--threshold', type=float, default=THRESHOLD,
+        help='drop of a rate, in percent, that is a regression (default: {})'.format(THRESHOLD)
+    )
+    return argument_parser
+
+
+def main(argv=None):
+    args = make_argument_parser().parse_args(argv)
+    engines = args.engine or sorted(parser.ENGINES)
+
+    def report(name, result):
+        print '{:<36} {:14.0f} {}'.format(name, result['rate'], result['unit'])
+
+    results = run_suite(engines, args.repeat, report)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'python': platform.python_version(),
+                'warmup': WARMUP,
+                'repeat': args.repeat,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print '{} regressions'.format(len(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
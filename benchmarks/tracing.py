@@ -0,0 +1,123 @@
+#! /bin/python
+
+from common import best_of
+
+import output
+import parser
+import tracing
+from semantics import UNDEFINED, ClassValue, FunctionValue, PrintNode, ScopeNode
+
+
+# NOTE: the same program is run untraced, with the methods the tracing hooks
+# are in patched back to how they were before the hooks, with the hooks but
+# no tracer set, and with a tracer that does nothing. The overheads are
+# relative to the untraced run. The runs are short and many, taking turns as
+# timings drift, and the best of each is kept
+
+PROGRAM = '''
+class Point {
+    x: number;
+    y: number;
+
+    constructor(x: number, y: number) {
+        this.x = x;
+        this.y = y;
+    }
+}
+
+function norm(p: Point): number {
+    return p.x * p.x + p.y * p.y;
+}
+
+let i: number = 0;
+let s: number = 0;
+while (i < %d) {
+    let p: Point = new Point(i, 1);
+    s = s + norm(p);
+    i = i + 1;
+}
+'''
+
+ITERATIONS = 2000
+REPEAT = 100
+WARMUP = 1
+
+
+def count(frame, event, arg):
+    pass
+
+
+def run_scope(self, frame):
+    for child in self._children:
+        result = child.run(frame)
+        if result is not None:
+            return result
+
+
+def run_print(self, frame):
+    output.write(self.expression.calculate(frame).str())
+
+
+def call_function(self, values, lineno, this=None, caller=None, check=True):
+    frame = self.new_frame(values, lineno, this, caller, check)
+    result = self.block.run(frame)
+    if result is None:
+        return UNDEFINED
+    return result
+
+
+def instantiate(self, values, lineno, caller=None, check=True):
+    result = self.allocate(lineno)
+    self.constructor.call(values, lineno, result, caller, check)
+    return result
+
+
+UNTRACED = [
+    (ScopeNode, 'run', run_scope),
+    (PrintNode, 'run', run_print),
+    (FunctionValue, 'call', call_function),
+    (ClassValue, 'instantiate', instantiate),
+]
+
+
+def run_untraced(function):
+    hooked = [(cls, name, cls.__dict__[name]) for cls, name, _ in UNTRACED]
+    try:
+        for cls, name, method in UNTRACED:
+            setattr(cls, name, method)
+        return best_of(function, 1, WARMUP)
+    finally:
+        for cls, name, method in hooked:
+            setattr(cls, name, method)
+
+
+def run_traced(function, tracer):
+    tracing.settrace(tracer)
+    try:
+        return best_of(function, 1, WARMUP)
+    finally:
+        tracing.settrace(None)
+
+
+def main():
+    root = parser.prepare(PROGRAM % ITERATIONS)
+    run = lambda: parser.ENGINES['tree'](root)
+    variants = [
+        ('untraced', lambda: run_untraced(run)),
+        ('no tracer', lambda: run_traced(run, None)),
+        ('no-op', lambda: run_traced(run, count)),
+    ]
+    best = {}
+    for _ in xrange(REPEAT):
+        for name, variant in variants:
+            elapsed = variant()
+            best[name] = min(best.get(name, elapsed), elapsed)
+    baseline = best['untraced']
+    for name, _ in variants:
+        print '{:<10} {:8.2f}ms  {:+6.1f}%'.format(
+            name, best[name] * 1e3, 100 * (best[name] / baseline - 1)
+        )
+
+
+if __name__ == '__main__':
+    main()
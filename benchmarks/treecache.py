@@ -0,0 +1,44 @@
+#! /bin/python
+
+import os
+import shutil
+import tempfile
+
+from common import best_of
+
+# the cache is kept apart from the user's one
+CACHE_DIR = tempfile.mkdtemp()
+os.environ['MTRAN_CACHE_DIR'] = CACHE_DIR
+
+import astcache
+import parser
+import syntax
+from memory import synthetic_program
+
+
+# NOTE: the time to parse a source is compared with the time to load its tree
+# from the cache, for synthetic programs of increasing size
+
+SIZES = [1, 10, 100]
+REPEAT = 10
+
+
+def main():
+    analyzer = syntax.get_analyzer()
+    try:
+        for copies in SIZES:
+            data = synthetic_program(copies)
+            parser.analyze(data)  # stores the tree
+            parse = best_of(lambda: analyzer.parse(data, lexer=parser._lexer(None)), REPEAT)
+            load = best_of(lambda: astcache.load(data), REPEAT)
+            print '{:>4} copies  parse {:8.2f}ms  load {:8.2f}ms  {:5.1f}x'.format(
+                copies, parse * 1e3, load * 1e3, parse / load
+            )
+        stats = astcache.stats()
+        print '{} trees cached, {:.1f}KB'.format(stats['entries'], stats['size'] / 1024.0)
+    finally:
+        shutil.rmtree(CACHE_DIR)
+
+
+if __name__ == '__main__':
+    main()
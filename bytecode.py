@@ -0,0 +1,414 @@
+from array import array
+
+from semantics import (
+    UNDEFINED, ClassValue, ComparisonExpression, FunctionValue,
+    MemberAccessExpression, NumberValue, StringValue
+)
+
+
+# Opcodes, every instruction is an (opcode, argument) pair of ints. They
+# are numbered roughly in order of frequency, as the VM checks them in that
+# order, in groups: loads, stores and jumps come before ADD, binary
+# operations go from ADD to OR, and calls and returns come before TO_OBJECT
+
+LOAD_SLOT = 0
+LOAD_CONST = 1
+STORE_CHECKED = 2
+STORE_SLOT = 3
+JUMP_UNLESS_LT = 4
+JUMP_UNLESS_GT = 5
+JUMP_UNLESS_LE = 6
+JUMP_UNLESS_GE = 7
+JUMP_UNLESS_EQ = 8
+JUMP_UNLESS_NE = 9
+JUMP = 10
+JUMP_IF_FALSE = 11
+ADD = 12
+SUB = 13
+MUL = 14
+DIV = 15
+LT = 16
+GT = 17
+LE = 18
+GE = 19
+EQ = 20
+NE = 21
+AND = 22
+OR = 23
+LOAD_OUTER = 24
+CHECK_FUNCTION = 25
+CALL = 26
+RETURN = 27
+TO_OBJECT = 28
+GET_METHOD = 29
+CALL_METHOD = 30
+GET_MEMBER = 31
+LOAD_THIS = 32
+SET_MEMBER = 33
+NEW = 34
+CHECK_CLASS = 35
+POP = 36
+STORE_OUTER = 37
+TYPECHECK = 38
+NEG = 39
+NOT = 40
+PRINT = 41
+MAKE_FUNCTION = 42
+MAKE_CLASS = 43
+
+OPNAMES = {
+    value: name for name, value in globals().items()
+    if name.isupper() and isinstance(value, int)
+}
+
+_COMPARE_JUMPS = {
+    '<': JUMP_UNLESS_LT,
+    '>': JUMP_UNLESS_GT,
+    '<=': JUMP_UNLESS_LE,
+    '>=': JUMP_UNLESS_GE,
+    '===': JUMP_UNLESS_EQ,
+    '!==': JUMP_UNLESS_NE,
+}
+
+_BINARY_OPS = {
+    '+': ADD,
+    '-': SUB,
+    '*': MUL,
+    '/': DIV,
+    '&&': AND,
+    '||': OR,
+    '<': LT,
+    '>': GT,
+    '<=': LE,
+    '>=': GE,
+    '===': EQ,
+    '!==': NE,
+}
+
+
+class Code(object):
+    def __init__(self, name):
+        self.name = name
+        self.code = array('i')
+        self.lines = array('i')  # line number of every instruction
+        self.consts = []
+        self.names = []  # class names
+        self.caches = []  # inline caches of member reads, one per site
+        self.refs = []  # (hops, slot) of variables of enclosing functions
+        # (variable name, type, line number) for TYPECHECK and the same with
+        # the slot for STORE_CHECKED, so that no lookup is needed to check
+        self.checks = []
+        self.stores = []
+        # (number of values, whether to typecheck them) for CALL, CALL_METHOD
+        # and NEW, (member name, whether to typecheck) for SET_MEMBER
+        self.calls = []
+        self.member_stores = []
+        self._const_index = {}
+
+    def add_cache(self, cache):
+        return self._add(self.caches, cache)
+
+    def add_call(self, count, check):
+        return self._add(self.calls, (count, check))
+
+    def add_check(self, name, var_type, lineno):
+        return self._add(self.checks, (name, var_type, lineno))
+
+    def add_const(self, value):
+        # equal literals share an entry, anything else is compared by identity.
+        # repr() tells 0.0 from -0.0
+        if isinstance(value, (NumberValue, StringValue)):
+            key = (type(value), repr(value.value))
+            if key not in self._const_index:
+                self.consts.append(value)
+                self._const_index[key] = len(self.consts) - 1
+            return self._const_index[key]
+        return self._add(self.consts, value)
+
+    def add_member_store(self, name, check):
+        return self._add(self.member_stores, (name, check))
+
+    def add_name(self, name):
+        return self._add(self.names, name)
+
+    def add_ref(self, hops, slot):
+        return self._add(self.refs, (hops, slot))
+
+    def add_store(self, name, var_type, lineno, slot):
+        return self._add(self.stores, (name, var_type, lineno, slot))
+
+    def emit(self, op, arg, lineno):
+        offset = len(self.code)
+        self.code.append(op)
+        self.code.append(arg)
+        self.lines.append(lineno)
+        return offset
+
+    def patch(self, offset, target):
+        self.code[offset + 1] = target
+
+    def tell(self):
+        return len(self.code)
+
+    def _add(self, table, item):
+        if item in table:
+            return table.index(item)
+        table.append(item)
+        return len(table) - 1
+
+    def __repr__(self):
+        return 'Code({})'.format(self.name)
+
+
+class Compiler(object):
+    def __init__(self):
+        # code objects of function bodies by block node
+        self.bodies = {}
+        self._code = None
+
+    def compile(self, root):
+        code = self._compile_code('<program>', root)
+        return code
+
+    def _compile_code(self, name, block):
+        outer, self._code = self._code, Code(name)
+        self._compile(block)
+        self._emit(LOAD_CONST, self._code.add_const(UNDEFINED), block)
+        self._emit(RETURN, 0, block)
+        code, self._code = self._code, outer
+        return code
+
+    def _compile_function(self, func):
+        self.bodies[func.block] = self._compile_code(func.name, func.block)
+
+    def _compile(self, node):
+        getattr(self, '_compile_' + type(node).__name__)(node)
+
+    def _compile_children(self, node):
+        for child in node.iterchildren():
+            self._compile(child)
+
+    def _emit(self, op, arg, node):
+        return self._code.emit(op, arg, node.lineno)
+
+    def _load(self, node):
+        if node.hops:
+            self._emit(LOAD_OUTER, self._code.add_ref(node.hops, node.slot), node)
+        else:
+            self._emit(LOAD_SLOT, node.slot, node)
+
+    def _store(self, node):
+        if node.hops:
+            self._emit(STORE_OUTER, self._code.add_ref(node.hops, node.slot), node)
+        else:
+            self._emit(STORE_SLOT, node.slot, node)
+
+    # Statements
+
+    def _compile_ScopeNode(self, node):
+        self._compile_children(node)
+
+    def _compile_ExpressionStatementNode(self, node):
+        self._compile_children(node)
+        self._emit(POP, 0, node)
+
+    def _compile_VariableAssignmentNode(self, node):
+        self._compile_children(node)
+        self._assign(node)
+
+    def _compile_DeclaredVariableAssignmentNode(self, node):
+        expression, var_decl = node.iterchildren()
+        self._compile(var_decl)
+        self._compile(expression)
+        self._assign(node)
+
+    def _assign(self, node):
+        name, var_type, lineno = node.name, node.binding.type, node.lineno
+        if not node.checked:
+            self._store(node)
+        elif node.hops:
+            check = self._code.add_check(name, var_type, lineno)
+            self._emit(TYPECHECK, check, node)
+            self._store(node)
+        else:
+            store = self._code.add_store(name, var_type, lineno, node.slot)
+            self._emit(STORE_CHECKED, store, node)
+
+    def _compile_MemberAssignmentNode(self, node):
+        member_node, expression = node.iterchildren()
+        self._compile_children(member_node)
+        self._emit(TO_OBJECT, 0, node)
+        self._compile(expression)
+        store = self._code.add_member_store(member_node.name, node.checked)
+        self._emit(SET_MEMBER, store, node)
+
+    def _compile_FunctionDeclarationNode(self, node):
+        self._compile_function(node.func)
+        self._emit(MAKE_FUNCTION, self._code.add_const(node.func), node)
+        self._emit(STORE_SLOT, node.slot, node)
+
+    def _compile_ReturnNode(self, node):
+        self._compile_children(node)
+        self._emit(RETURN, 0, node)
+
+    def _compile_ClassDeclarationNode(self, node):
+        for member in node.cls.members:
+            if isinstance(member, FunctionValue):
+                self._compile_function(member)
+        self._emit(MAKE_CLASS, self._code.add_const(node.cls), node)
+        self._emit(STORE_SLOT, node.slot, node)
+
+    def _compile_PrintNode(self, node):
+        self._compile_children(node)
+        self._emit(PRINT, 0, node)
+
+    def _compile_IfNode(self, node):
+        children = list(node.iterchildren())
+        jump_else = self._compile_jump_unless(children[0])
+        self._compile(children[1])
+        if len(children) == 3:
+            jump_end = self._emit(JUMP, 0, node)
+            self._code.patch(jump_else, self._code.tell())
+            self._compile(children[2])
+            self._code.patch(jump_end, self._code.tell())
+        else:
+            self._code.patch(jump_else, self._code.tell())
+
+    def _compile_WhileLoopNode(self, node):
+        condition, block = node.iterchildren()
+        start = self._code.tell()
+        jump_end = self._compile_jump_unless(condition)
+        self._compile(block)
+        self._emit(JUMP, start, node)
+        self._code.patch(jump_end, self._code.tell())
+
+    def _compile_jump_unless(self, condition):
+        # comparisons jump without producing a BooleanValue, the target is
+        # patched by the caller
+        if isinstance(condition, ComparisonExpression):
+            self._compile_children(condition)
+            return self._emit(_COMPARE_JUMPS[condition.op], 0, condition)
+        self._compile(condition)
+        return self._emit(JUMP_IF_FALSE, 0, condition)
+
+    def _compile_VariableDeclarationNode(self, node):
+        self._emit(LOAD_CONST, self._code.add_const(UNDEFINED), node)
+        self._emit(STORE_SLOT, node.slot, node)
+
+    # Expressions
+
+    def _compile_PrimitiveValueExpression(self, node):
+        self._emit(LOAD_CONST, self._code.add_const(node.value), node)
+
+    def _compile_VariableExpression(self, node):
+        self._load(node)
+
+    def _compile_NegateExpression(self, node):
+        self._compile_children(node)
+        self._emit(NOT, 0, node)
+
+    def _compile_NegativeExpression(self, node):
+        self._compile_children(node)
+        self._emit(NEG, 0, node)
+
+    def _compile_binary(self, node):
+        self._compile_children(node)
+        self._emit(_BINARY_OPS[node.op], 0, node)
+
+    _compile_BooleanOperationExpression = _compile_binary
+    _compile_ArithmeticOperationExpression = _compile_binary
+    _compile_ComparisonExpression = _compile_binary
+
+    def _compile_MemberAccessExpression(self, node):
+        self._compile_children(node)
+        self._emit(GET_MEMBER, self._code.add_cache(node.cache), node)
+
+    def _compile_FunctionCallExpression(self, node):
+        children = list(node.iterchildren())
+        callee, params = children[0], children[1:]
+        if isinstance(callee, MemberAccessExpression):
+            self._compile_children(callee)
+            self._emit(TO_OBJECT, 0, callee)
+            self._emit(GET_METHOD, self._code.add_cache(callee.cache), callee)
+            call = CALL_METHOD
+        else:
+            self._compile(callee)
+            call = CALL
+        self._emit(CHECK_FUNCTION, 0, node)
+        for param in params:
+            self._compile(param)
+        self._emit(call, self._code.add_call(len(params), node.checked), node)
+
+    def _compile_NewInstanceExpression(self, node):
+        self._load(node)
+        self._emit(CHECK_CLASS, self._code.add_name(node.name), node)
+        self._compile_children(node)
+        count = len(list(node.iterchildren()))
+        self._emit(NEW, self._code.add_call(count, node.checked), node)
+
+    def _compile_ThisExpression(self, node):
+        self._emit(LOAD_THIS, 0, node)
+
+
+def compile_program(root):
+    compiler = Compiler()
+    code = compiler.compile(root)
+    return code, compiler.bodies
+
+
+def disassemble(code, bodies=None):
+    lines = ['Disassembly of {}:'.format(code.name)]
+    last_lineno = None
+    for offset in xrange(0, len(code.code), 2):
+        op, arg = code.code[offset], code.code[offset + 1]
+        lineno = code.lines[offset // 2]
+        prefix = str(lineno).ljust(6) if lineno != last_lineno else ' ' * 6
+        last_lineno = lineno
+        line = '{}{:>6} {:<16}{}'.format(
+            prefix, offset, OPNAMES[op], _describe(code, op, arg)
+        )
+        lines.append(line.rstrip())
+    if bodies is not None:
+        for const in code.consts:
+            for func in _functions(const):
+                lines.append('')
+                lines.append(disassemble(bodies[func.block], bodies))
+    return '\n'.join(lines)
+
+
+def _describe(code, op, arg):
+    if op == LOAD_CONST:
+        return '{} ({!r})'.format(arg, code.consts[arg])
+    if op in (MAKE_FUNCTION, MAKE_CLASS):
+        const = code.consts[arg]
+        return '{} (<{} {}>)'.format(arg, const.gettype(), const.name)
+    if op in (GET_MEMBER, GET_METHOD):
+        return '{} ({})'.format(arg, code.caches[arg].name)
+    if op == CHECK_CLASS:
+        return '{} ({})'.format(arg, code.names[arg])
+    if op == SET_MEMBER:
+        name, check = code.member_stores[arg]
+        return '{} ({}{})'.format(arg, name, '' if check else ', unchecked')
+    if op in (CALL, CALL_METHOD, NEW):
+        count, check = code.calls[arg]
+        return '{} ({} values{})'.format(arg, count, '' if check else ', unchecked')
+    if op in (LOAD_OUTER, STORE_OUTER):
+        return '{} (hops={}, slot={})'.format(arg, *code.refs[arg])
+    if op == TYPECHECK:
+        return '{} ({}: {})'.format(arg, *code.checks[arg][:2])
+    if op == STORE_CHECKED:
+        name, var_type, _, slot = code.stores[arg]
+        return '{} ({}: {}, slot={})'.format(arg, name, var_type, slot)
+    if op in (LOAD_SLOT, STORE_SLOT):
+        return str(arg)
+    if JUMP_UNLESS_LT <= op <= JUMP_IF_FALSE:
+        return str(arg)
+    return ''
+
+
+def _functions(const):
+    if isinstance(const, FunctionValue):
+        return [const]
+    if isinstance(const, ClassValue):
+        return [m for m in const.members if isinstance(m, FunctionValue)]
+    return []
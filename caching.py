@@ -0,0 +1,84 @@
+import hashlib
+import imp
+import os
+import tempfile
+import time
+
+
+# NOTE: files that are cached between runs, such as the lexer and parser
+# tables and the compiled programs, are all kept in one directory. Caching is
+# best effort: a cache that can't be written to is just not used
+
+CACHE_DIR = os.environ.get(
+    'MTRAN_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'mtran')
+)
+
+_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def path(name):
+    return os.path.join(CACHE_DIR, name)
+
+
+def store(name, write):
+    # write(f) is given a temporary file, which then replaces the cached one,
+    # so that a file is never read while it is being written
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.rename(tmp_path, path(name))
+    except (IOError, OSError):
+        pass
+
+
+def sources_digest(names, version=''):
+    # digest of the sources of the modules named, of version and of the
+    # version of python, for keys of files that the modules make. The
+    # modules are read rather than imported, so that looking up a cached
+    # file doesn't import PLY
+    digest = hashlib.sha1(version + imp.get_magic())
+    for name in names:
+        with open(os.path.join(_DIRECTORY, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def entries(suffix):
+    # (path, size, time of last modification) of the cached files
+    result = []
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return result
+    for name in names:
+        if not name.endswith(suffix):
+            continue
+        file_path = path(name)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue  # removed in the meantime
+        result.append((file_path, stat.st_size, stat.st_mtime))
+    return result
+
+
+def evict(suffix, max_size, max_age):
+    # removes the files not modified for max_age seconds, and the oldest
+    # ones while all of them take more than max_size bytes. Returns the
+    # number of files removed
+    removed = 0
+    now = time.time()
+    size = 0
+    for file_path, file_size, mtime in sorted(entries(suffix), key=lambda e: -e[2]):
+        size += file_size
+        if size <= max_size and now - mtime <= max_age:
+            continue
+        try:
+            os.remove(file_path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,195 @@
+from collections import defaultdict
+
+from semantics import (
+    BooleanValue, ClassDeclarationNode, FunctionDeclarationNode, FunctionValue,
+    MemberAccessExpression, NullValue, NumberValue, StringValue, UndefinedValue,
+    VariableAssignmentNode, VariableExpression, walk
+)
+
+
+# NOTE: runs on a resolved tree. Assignments, member assignments and calls
+# whose values are proven to be of the declared types are marked as not
+# needing a runtime typecheck(). Everything else is still checked at runtime,
+# so type errors are raised at the same point and with the same messages.
+# Types are names as in typecheck(), None stands for an unknown type
+
+_NOTHING = 'undefined'  # null and undefined, which match any type
+
+_LITERAL_TYPES = {
+    NumberValue: 'number',
+    StringValue: 'string',
+    BooleanValue: 'boolean',
+    NullValue: _NOTHING,
+    UndefinedValue: _NOTHING,
+}
+
+
+class TypeChecker(object):
+    def __init__(self):
+        self._functions = {}  # functions by the binding they are declared with
+        self._classes = {}  # classes by binding
+        self._class_names = {}  # classes by name, only for unique names
+        self._this = None  # type of 'this' in the current function
+
+    def check(self, root):
+        assigned = set()
+        classes = defaultdict(list)
+        for node in walk(root):
+            if type(node) is VariableAssignmentNode:
+                assigned.add(node.binding)
+            elif isinstance(node, FunctionDeclarationNode):
+                self._functions[node.binding] = node.func
+            elif isinstance(node, ClassDeclarationNode):
+                self._classes[node.binding] = node.cls
+                classes[node.cls.name].append(node.cls)
+        for binding in assigned:
+            self._functions.pop(binding, None)
+            self._classes.pop(binding, None)
+        # instances are told apart by class name only, see typecheck()
+        for name, found in classes.iteritems():
+            if len(found) == 1:
+                self._class_names[name] = found[0]
+        self._visit(root)
+
+    def _visit(self, node):
+        method = getattr(self, '_visit_' + type(node).__name__, None)
+        if method is not None:
+            method(node)
+        for child in node.iterchildren():
+            self._visit(child)
+
+    def _visit_function(self, func, this_type=None):
+        outer, self._this = self._this, this_type
+        self._visit(func.block)
+        self._this = outer
+
+    def _check_call(self, node, func, params):
+        if func is None or len(params) != len(func.params):
+            return
+        for value, param in zip(params, func.params):
+            if not _assignable(self._type(value), param.type):
+                return
+        node.checked = False
+
+    # Statements
+
+    def _visit_VariableAssignmentNode(self, node):
+        expression = next(node.iterchildren())
+        if _assignable(self._type(expression), node.binding.type):
+            node.checked = False
+
+    _visit_DeclaredVariableAssignmentNode = _visit_VariableAssignmentNode
+
+    def _visit_MemberAssignmentNode(self, node):
+        member_node, expression = node.iterchildren()
+        cls = self._class_names.get(self._type(next(member_node.iterchildren())))
+        field_type = _field_type(cls, member_node.name)
+        if field_type is not None and _assignable(self._type(expression), field_type):
+            node.checked = False
+
+    def _visit_FunctionDeclarationNode(self, node):
+        self._visit_function(node.func)
+
+    def _visit_ClassDeclarationNode(self, node):
+        cls = node.cls
+        for member in cls.members:
+            if isinstance(member, FunctionValue):
+                # the constructor is the only method that can't be called
+                # on an object of another class
+                if member is cls.constructor and cls.name in self._class_names:
+                    self._visit_function(member, cls.name)
+                else:
+                    self._visit_function(member)
+
+    def _visit_FunctionCallExpression(self, node):
+        children = list(node.iterchildren())
+        callee, params = children[0], children[1:]
+        if isinstance(callee, MemberAccessExpression):
+            cls = self._class_names.get(self._type(next(callee.iterchildren())))
+            func = _method(cls, callee.name)
+        elif isinstance(callee, VariableExpression):
+            func = self._functions.get(callee.binding)
+        else:
+            func = None
+        self._check_call(node, func, params)
+
+    def _visit_NewInstanceExpression(self, node):
+        cls = self._classes.get(node.binding)
+        if cls is not None:
+            self._check_call(node, cls.constructor, list(node.iterchildren()))
+
+    # Expressions
+
+    def _type(self, node):
+        method = getattr(self, '_type_' + type(node).__name__, None)
+        if method is None:
+            return None
+        return method(node)
+
+    def _type_PrimitiveValueExpression(self, node):
+        return _LITERAL_TYPES.get(type(node.value))
+
+    def _type_VariableExpression(self, node):
+        return _declared(node.binding.type)
+
+    def _type_MemberAccessExpression(self, node):
+        cls = self._class_names.get(self._type(next(node.iterchildren())))
+        return _declared(_field_type(cls, node.name))
+
+    def _type_NewInstanceExpression(self, node):
+        if node.binding.type == 'class':
+            return node.name
+        return None
+
+    def _type_ThisExpression(self, node):
+        return self._this
+
+    def _type_number(self, node):
+        return 'number'
+
+    def _type_boolean(self, node):
+        return 'boolean'
+
+    _type_ArithmeticOperationExpression = _type_number
+    _type_NegativeExpression = _type_number
+    _type_BooleanOperationExpression = _type_boolean
+    _type_ComparisonExpression = _type_boolean
+    _type_NegateExpression = _type_boolean
+
+
+def _assignable(value_type, var_type):
+    if var_type == 'any' or value_type == _NOTHING:
+        return True
+    return value_type is not None and value_type == var_type
+
+
+def _declared(var_type):
+    # functions and classes are not values of a declared type
+    if var_type in ('any', 'function', 'class'):
+        return None
+    return var_type
+
+
+def _field_type(cls, name):
+    # None if there is no such field
+    if cls is None:
+        return None
+    offset = cls.shape.offsets.get(name)
+    if offset is None:
+        return None
+    return cls.shape.types[offset]
+
+
+def _method(cls, name):
+    # fields shadow methods, see ObjectValue.get_member()
+    if cls is None or name in cls.shape.offsets:
+        return None
+    member = cls.get_member(name)
+    if isinstance(member, FunctionValue):
+        return member
+    return None
+
+
+def check(root):
+    TypeChecker().check(root)
+    return root
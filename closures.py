@@ -0,0 +1,313 @@
+import output
+from semantics import (
+    UNDEFINED, ArithmeticOperationExpression, ClassValue, ComparisonExpression,
+    DivisionByZeroError, Frame, FunctionValue, MemberAccessExpression,
+    NotAClassError, NotAFunctionError, PrimitiveValueExpression,
+    boolean_value, number_value, typecheck
+)
+
+
+# NOTE: every node is compiled into a closure taking the current frame.
+# Statements return None, or the returned value if a 'return' was executed,
+# so no exception is needed to leave a function
+
+
+_ARITHMETIC_OPS = ArithmeticOperationExpression.OPERATORS
+_COMPARISON_OPS = ComparisonExpression.OPERATORS
+
+
+class Compiler(object):
+    def __init__(self):
+        # function bodies by block node, shared by all closures of a function
+        self._bodies = {}
+
+    def compile(self, root):
+        body = self._compile_block(root)
+
+        def run(frame):
+            body(frame)
+        return run
+
+    def _compile(self, node):
+        return getattr(self, '_compile_' + type(node).__name__)(node)
+
+    def _compile_block(self, node):
+        statements = tuple(self._compile(child) for child in node.iterchildren())
+        if not statements:
+            return lambda frame: None
+        if len(statements) == 1:
+            return statements[0]
+
+        def run(frame):
+            for statement in statements:
+                result = statement(frame)
+                if result is not None:
+                    return result
+        return run
+
+    def _compile_function(self, func):
+        self._bodies[func.block] = self._compile_block(func.block)
+
+    def _compile_test(self, node):
+        # conditions are evaluated straight to python booleans where possible
+        if isinstance(node, ComparisonExpression):
+            op = _COMPARISON_OPS[node.op]
+            left, right = node.iterchildren()
+            left, right = self._compile(left), self._compile(right)
+            return lambda frame: op(left(frame).num(), right(frame).num())
+        expression = self._compile(node)
+        return lambda frame: expression(frame).bool()
+
+    def _invoke(self, func, values, lineno, this, caller, check=True):
+        frame = func.new_frame(values, lineno, this, caller, check)
+        result = self._bodies[func.block](frame)
+        if result is None:
+            return UNDEFINED
+        return result
+
+    # Statements
+
+    def _compile_ScopeNode(self, node):
+        return self._compile_block(node)
+
+    def _compile_ExpressionStatementNode(self, node):
+        expression = self._compile(next(node.iterchildren()))
+
+        def run(frame):
+            expression(frame)
+        return run
+
+    def _compile_VariableAssignmentNode(self, node):
+        expression = self._compile(next(node.iterchildren()))
+        return self._assignment(node, expression)
+
+    def _compile_DeclaredVariableAssignmentNode(self, node):
+        expression, var_decl = node.iterchildren()
+        declare = self._compile(var_decl)
+        assign = self._assignment(node, self._compile(expression))
+
+        def run(frame):
+            declare(frame)
+            assign(frame)
+        return run
+
+    def _assignment(self, node, expression):
+        lineno, name, var_type = node.lineno, node.name, node.binding.type
+        hops, slot = node.hops, node.slot
+        if not node.checked:
+            if hops:
+                def run(frame):
+                    frame.up(hops).slots[slot] = expression(frame)
+            else:
+                def run(frame):
+                    frame.slots[slot] = expression(frame)
+        elif hops:
+            def run(frame):
+                value = expression(frame)
+                typecheck(lineno, name, value, var_type)
+                frame.up(hops).slots[slot] = value
+        else:
+            def run(frame):
+                value = expression(frame)
+                typecheck(lineno, name, value, var_type)
+                frame.slots[slot] = value
+        return run
+
+    def _compile_MemberAssignmentNode(self, node):
+        member_node, expression = node.iterchildren()
+        operand = self._compile(next(member_node.iterchildren()))
+        expression = self._compile(expression)
+        lineno, name, check = node.lineno, member_node.name, node.checked
+
+        def run(frame):
+            obj = operand(frame).obj(lineno)
+            obj.set_member(lineno, name, expression(frame), check)
+        return run
+
+    def _compile_FunctionDeclarationNode(self, node):
+        func, slot = node.func, node.slot
+        self._compile_function(func)
+
+        def run(frame):
+            frame.slots[slot] = func.closure(frame)
+        return run
+
+    def _compile_ReturnNode(self, node):
+        # the value itself signals the return, see _compile_block()
+        return self._compile(next(node.iterchildren()))
+
+    def _compile_ClassDeclarationNode(self, node):
+        cls, slot = node.cls, node.slot
+        for member in cls.members:
+            if isinstance(member, FunctionValue):
+                self._compile_function(member)
+
+        def run(frame):
+            frame.slots[slot] = cls.closure(frame)
+        return run
+
+    def _compile_PrintNode(self, node):
+        expression = self._compile(next(node.iterchildren()))
+
+        def run(frame):
+            output.write(expression(frame).str())
+        return run
+
+    def _compile_IfNode(self, node):
+        children = list(node.iterchildren())
+        test = self._compile_test(children[0])
+        block = self._compile(children[1])
+        if len(children) == 2:
+            def run(frame):
+                if test(frame):
+                    return block(frame)
+        else:
+            else_block = self._compile(children[2])
+
+            def run(frame):
+                if test(frame):
+                    return block(frame)
+                return else_block(frame)
+        return run
+
+    def _compile_WhileLoopNode(self, node):
+        condition, block = node.iterchildren()
+        test = self._compile_test(condition)
+        block = self._compile(block)
+
+        def run(frame):
+            while test(frame):
+                result = block(frame)
+                if result is not None:
+                    return result
+        return run
+
+    def _compile_VariableDeclarationNode(self, node):
+        slot = node.slot
+
+        def run(frame):
+            frame.slots[slot] = UNDEFINED
+        return run
+
+    # Expressions
+
+    def _compile_PrimitiveValueExpression(self, node):
+        value = node.value
+        return lambda frame: value
+
+    def _compile_VariableExpression(self, node):
+        hops, slot = node.hops, node.slot
+        if hops == 0:
+            return lambda frame: frame.slots[slot]
+        if hops == 1:
+            return lambda frame: frame.parent.slots[slot]
+        return lambda frame: frame.up(hops).slots[slot]
+
+    def _compile_NegateExpression(self, node):
+        expression = self._compile(next(node.iterchildren()))
+        return lambda frame: boolean_value(not expression(frame).bool())
+
+    def _compile_NegativeExpression(self, node):
+        expression = self._compile(next(node.iterchildren()))
+        return lambda frame: number_value(-expression(frame).num())
+
+    def _compile_BooleanOperationExpression(self, node):
+        left, right = node.iterchildren()
+        left, right = self._compile(left), self._compile(right)
+        # both operands are always evaluated, as in the tree walker
+        if node.op == '&&':
+            def calculate(frame):
+                lvalue = left(frame).bool()
+                rvalue = right(frame).bool()
+                return boolean_value(lvalue and rvalue)
+        else:
+            def calculate(frame):
+                lvalue = left(frame).bool()
+                rvalue = right(frame).bool()
+                return boolean_value(lvalue or rvalue)
+        return calculate
+
+    def _compile_ArithmeticOperationExpression(self, node):
+        left, right = node.iterchildren()
+        if node.op == '/':
+            return self._division(node, self._compile(left), self._compile(right))
+        op = _ARITHMETIC_OPS[node.op]
+        left = self._compile(left)
+        if isinstance(right, PrimitiveValueExpression):
+            rvalue = right.value.num()
+            return lambda frame: number_value(op(left(frame).num(), rvalue))
+        right = self._compile(right)
+        return lambda frame: number_value(op(left(frame).num(), right(frame).num()))
+
+    def _division(self, node, left, right):
+        lineno = node.lineno
+
+        def calculate(frame):
+            lvalue = left(frame).num()
+            rvalue = right(frame).num()
+            try:
+                return number_value(lvalue / rvalue)
+            except ZeroDivisionError:
+                raise DivisionByZeroError(lineno)
+        return calculate
+
+    def _compile_ComparisonExpression(self, node):
+        test = self._compile_test(node)
+        return lambda frame: boolean_value(test(frame))
+
+    def _compile_MemberAccessExpression(self, node):
+        operand = self._compile(next(node.iterchildren()))
+        lineno, cache = node.lineno, node.cache
+        return lambda frame: cache.get(operand(frame).obj(lineno))
+
+    def _compile_FunctionCallExpression(self, node):
+        children = list(node.iterchildren())
+        callee = children[0]
+        params = tuple(self._compile(child) for child in children[1:])
+        lineno, check, invoke = node.lineno, node.checked, self._invoke
+        if isinstance(callee, MemberAccessExpression):
+            operand = self._compile(next(callee.iterchildren()))
+            member_lineno, cache = callee.lineno, callee.cache
+
+            def get_func(frame):
+                this = operand(frame).obj(member_lineno)
+                return this, cache.get(this)
+        else:
+            operand = self._compile(callee)
+
+            def get_func(frame):
+                return None, operand(frame)
+
+        def calculate(frame):
+            this, func = get_func(frame)
+            func = func.obj(lineno)
+            if not isinstance(func, FunctionValue):
+                raise NotAFunctionError(func, lineno)
+            values = [param(frame) for param in params]
+            return invoke(func, values, lineno, this, frame, check)
+        return calculate
+
+    def _compile_NewInstanceExpression(self, node):
+        params = tuple(self._compile(child) for child in node.iterchildren())
+        lineno, name, hops, slot = node.lineno, node.name, node.hops, node.slot
+        check, invoke = node.checked, self._invoke
+
+        def calculate(frame):
+            cls = frame.up(hops).slots[slot]
+            if not isinstance(cls, ClassValue):
+                raise NotAClassError(name, lineno)
+            values = [param(frame) for param in params]
+            obj = cls.allocate(lineno)
+            invoke(cls.constructor, values, lineno, obj, frame, check)
+            return obj
+        return calculate
+
+    def _compile_ThisExpression(self, node):
+        return lambda frame: frame.this
+
+
+def run(root):
+    try:
+        Compiler().compile(root)(Frame(root.frame_size))
+    finally:
+        output.flush()
@@ -1,6 +1,11 @@
-from ply import lex
+import os
+import sys
+
 from ply.lex import TOKEN
 
+import output
+import tables
+
 
 ident = r'(?<!\d)[$_a-zA-Z][$_a-zA-Z0-9]*'
 number = r'(?<![a-zA-Z])\d+(\.\d+)?'
@@ -104,7 +109,7 @@ def t_newline(t):
 t_AND = r'\&{2}'
 t_OR = r'\|{2}'
 t_STRICT_EQUALS = r'\={3}'
-t_STRICT_NOT_EQUAL = 'r\!\={2}'
+t_STRICT_NOT_EQUAL = r'\!\={2}'
 t_LESS_OR_EQUAL = r'\<\='
 t_MORE_OR_EQUAL = r'\>\='
 
@@ -113,9 +118,31 @@ t_ignore = " \t"
 
 def t_error(t):
     # TODO: skip while not space or reserved or smth
-    print("Lexical error: unidentified token '{}' on line #{}".format(
+    t.lexer.errors += 1
+    output.write("Lexical error: unidentified token '{}' on line #{}".format(
         t.value[0], t.lexer.lineno
     ))
     t.lexer.skip(1)
 
-lexer = lex.lex()
+# NOTE: 'ply' is the lexer that PLY generates from the rules above and
+# 'scanner' the hand-written one in scanner.py, which yields the same tokens.
+# Both count the errors they report in errors, as the parser does, see
+# syntax.p_error(). It is reset along with the line number
+LEXER = os.environ.get('MTRAN_LEXER', 'ply')
+
+_lexer = None
+
+
+def get_lexer(kind=None):
+    kind = kind or LEXER
+    if kind == 'scanner':
+        import scanner
+        return scanner.Scanner()
+    if kind != 'ply':
+        raise Exception('Unknown lexer: {}'.format(kind))
+    # built on first use, see tables
+    global _lexer
+    if _lexer is None:
+        _lexer = tables.build_lexer(sys.modules[__name__])
+        _lexer.errors = 0
+    return _lexer
@@ -1,9 +1,19 @@
 #! /bin/python
 
+import argparse
+import glob
+import multiprocessing
 import sys
+import time
 from collections import defaultdict
 
+import astcache
+import bytecode
+import output
 import parser
+import profiler
+import transpiler
+from semantics import MemberAccessExpression, SemanticError, cache_stats, walk
 
 
 def print_token_stat(data):
@@ -17,30 +27,261 @@ def print_token_list(data):
     for token in parser.tokenize(data):
         lineno = str(token.lineno).ljust(4)
         if token.type.isalpha():  # empiric rule
-            print "line {} - {}: '{}'".format(
+            output.write("line {} - {}: '{}'".format(
                 lineno, token.type, token.value
-            )
+            ))
         else:
-            print "line {} - {}".format(lineno, token.type)
+            output.write("line {} - {}".format(lineno, token.type))
 
 
-def print_tree(data):
-    root = parser.analyze(data)
+def print_tree(data, optimized=False):
+    if optimized:
+        root = parser.prepare(data)
+    else:
+        root = parser.analyze(data)
     _print_tree(root)
 
 
-def main():
-    with open('sample.ts') as f:
-        data = f.read()
-    # print_token_stat(data)
-    # print_token_list(data)
-    # print_tree(data)
-    parser.interpret(data)
+def print_bytecode(data):
+    root = parser.prepare(data)
+    code, bodies = bytecode.compile_program(root)
+    output.write(bytecode.disassemble(code, bodies))
+
+
+def print_python(data):
+    root = parser.prepare(data)
+    output.write(transpiler.transpile(root))
+
+
+def print_cache_stats(data):
+    # runs the program with the tree engine, whose caches are the nodes' own
+    root = parser.prepare(data)
+    try:
+        parser.ENGINES['tree'](root)
+    except SemanticError as e:
+        output.write(e.message)
+    stats = cache_stats(
+        n.cache for n in walk(root) if isinstance(n, MemberAccessExpression)
+    )
+    lookups = stats['hits'] + stats['misses'] + stats['megamorphic']
+    output.write('{} member access sites, {} lookups'.format(stats['sites'], lookups))
+    for key in ('hits', 'misses', 'megamorphic'):
+        share = 100.0 * stats[key] / lookups if lookups else 0.0
+        output.write('\t{}: {} ({:.1f}%)'.format(key, stats[key], share))
+
+
+def print_ast_cache_stats(data):
+    # analyzes the source twice, the second time it is loaded from the cache
+    parser.analyze(data)
+    parser.analyze(data)
+    stats = astcache.stats()
+    output.write(
+        'hits: {hits}, misses: {misses}, stores: {stores}, evictions: {evictions}'.format(**stats)
+    )
+    output.write('{} trees cached, {:.1f}KB'.format(stats['entries'], stats['size'] / 1024.0))
+
+
+# Commands, given the path of a file and the command line arguments
+
+
+def command_tokens(path, args):
+    # the file is tokenized as it is read, see streaming
+    with open(path, 'rb') as f:
+        print_token_list(f)
+
+
+def command_stats(path, args):
+    if args.kind == 'tokens':
+        with open(path, 'rb') as f:
+            print_token_stat(f)
+    elif args.kind == 'caches':
+        print_cache_stats(_read(path))
+    else:
+        print_ast_cache_stats(_read(path))
+
+
+def command_tree(path, args):
+    data = _read(path)
+    if args.form == 'bytecode':
+        print_bytecode(data)
+    elif args.form == 'python':
+        print_python(data)
+    else:
+        print_tree(data, optimized=args.form == 'optimized')
+
+
+def command_run(path, args):
+    if args.profile is None:
+        parser.interpret(_read(path), args.engine)
+        return
+    program_profiler = profiler.Profiler()
+    parser.interpret(_read(path), args.engine, program_profiler)
+    if args.profile == 'collapsed':
+        output.write(program_profiler.collapsed())
+    else:
+        output.write(program_profiler.report())
+
+
+COMMANDS = {
+    'tokens': command_tokens,
+    'stats': command_stats,
+    'tree': command_tree,
+    'run': command_run,
+}
+
+
+def make_argument_parser():
+    argument_parser = argparse.ArgumentParser(
+        description='Tokenizes, parses and runs TypeScript programs.'
+    )
+    argument_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='number of processes to spread the files across, 0 for one per CPU'
+    )
+    argument_parser.add_argument(
+        '--lexer', choices=['ply', 'scanner'], help='lexer to use, see lexis'
+    )
+    argument_parser.add_argument(
+        '-q', '--quiet', action='store_true', help="don't print the timing summary"
+    )
+    subparsers = argument_parser.add_subparsers(dest='command')
+
+    tokens = subparsers.add_parser('tokens', help='print the tokens')
+    stats = subparsers.add_parser('stats', help='print statistics')
+    stats.add_argument(
+        '--kind', choices=['tokens', 'caches', 'ast'], default='tokens',
+        help='tokens by type, the inline caches of a run with the tree engine, '
+        'or the cache of trees'
+    )
+    tree = subparsers.add_parser('tree', help='print the tree or the compiled program')
+    tree.add_argument(
+        '--form', choices=['parsed', 'optimized', 'bytecode', 'python'],
+        default='parsed'
+    )
+    run = subparsers.add_parser('run', help='run the programs')
+    run.add_argument(
+        '-e', '--engine', choices=sorted(parser.ENGINES), default='tree',
+        help='engine to run the programs with (default: tree)'
+    )
+    run.add_argument(
+        '--profile', choices=['table', 'collapsed'],
+        help='profile the tree engine, printing the hot lines or collapsed '
+        'stacks for flame graphs'
+    )
+    for subparser in (tokens, stats, tree, run):
+        subparser.add_argument('files', nargs='+', help='files or glob patterns')
+    return argument_parser
+
+
+def main(argv=None):
+    args = make_argument_parser().parse_args(argv)
+    paths = _expand(args.files)
+    jobs = args.jobs or multiprocessing.cpu_count()
+    start = time.time()
+    pool = None
+    if jobs == 1 or len(paths) == 1:
+        # nothing is built before it is needed, a file whose tree is cached
+        # is run without the parser
+        _set_lexer(args.lexer)
+        results = (_execute_here(args, path, len(paths) > 1) for path in paths)
+    else:
+        pool = multiprocessing.Pool(jobs, _set_up, (args.lexer,))
+        # in the order of the files, whichever finishes first
+        results = pool.imap(_execute, [(args, path) for path in paths])
+    failed = 0
+    times = []
+    for path, text, error, elapsed in results:
+        if text is not None:
+            if len(paths) > 1:
+                print '==> {} <=='.format(path)
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        if error is not None:
+            failed += 1
+            print >>sys.stderr, '{}: {}'.format(path, error)
+        times.append((elapsed, path))
+    if pool is not None:
+        pool.close()
+        pool.join()
+    if not args.quiet:
+        _print_summary(times, failed, time.time() - start, jobs)
+    return 1 if failed else 0
+
+
+def _expand(patterns):
+    # a pattern that matches nothing is kept, for its error to be reported
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def _set_lexer(lexer):
+    if lexer is not None:
+        import lexis
+        lexis.LEXER = lexer
+
+
+def _set_up(lexer):
+    # builds the lexer and the parser before the first file, so that each
+    # worker of the pool does it once
+    import lexis
+    import syntax
+    _set_lexer(lexer)
+    lexis.get_lexer()
+    syntax.get_analyzer()
+
+
+def _execute(task):
+    # (path, output, error, time taken) of a file, whatever it prints is kept
+    # apart from the output of the other files
+    args, path = task
+    text, error, elapsed = output.capture(COMMANDS[args.command], path, args)
+    if error is not None:
+        error = '{}: {}'.format(type(error).__name__, error)
+    return path, text, error, elapsed
+
+
+def _execute_here(args, path, header):
+    # as _execute(), but what the file prints goes straight to stdout rather
+    # than being kept until it ends, the output text being None
+    if header:
+        print '==> {} <=='.format(path)
+    error = None
+    start = time.time()
+    try:
+        COMMANDS[args.command](path, args)
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        elapsed = time.time() - start
+        output.flush()
+        sys.stdout.flush()
+    return path, None, error, elapsed
+
+
+def _print_summary(times, failed, wall, jobs):
+    total = sum(elapsed for elapsed, _ in times)
+    print >>sys.stderr, '{} files, {} failed, {:.3f}s in files, {:.3f}s wall clock, {} jobs'.format(
+        len(times), failed, total, wall, jobs
+    )
+    if times:
+        elapsed, path = max(times)
+        print >>sys.stderr, 'slowest: {} ({:.3f}s), mean {:.3f}s'.format(
+            path, elapsed, total / len(times)
+        )
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
 
 
 def _print_tree(node, indent=0):
     pad = '\t' * indent
-    print pad, node
+    output.write('{} {}'.format(pad, node))
     next_indent = indent + 1
     for child in node.iterchildren():
         _print_tree(child, next_indent)
@@ -48,10 +289,10 @@ def _print_tree(node, indent=0):
 
 def _print_stat(stat):
     for key in stat:
-        print key
+        output.write(str(key))
         for value, lineno in stat[key]:
-            print '\t{} - line #{}'.format(value, lineno)
+            output.write('\t{} - line #{}'.format(value, lineno))
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,77 @@
+from semantics import (
+    ClassDeclarationNode, FunctionDeclarationNode, FunctionValue,
+    PrimitiveValueExpression, SemanticError, VariableAssignmentNode, walk
+)
+
+
+# NOTE: runs on a resolved tree. Operations on literals are evaluated once
+# and replaced by their value, as well as reads of variables that are
+# initialized with a literal and never assigned again
+
+
+class Optimizer(object):
+    def __init__(self):
+        self._assigned = set()
+        self._constants = {}
+
+    def optimize(self, root):
+        for node in walk(root):
+            if type(node) is VariableAssignmentNode:
+                self._assigned.add(node.binding)
+        self._visit(root)
+
+    def _visit(self, node):
+        # children first, so that folded operands make their parent foldable
+        for func in _functions(node):
+            self._visit(func.block)
+        for child in list(node.iterchildren()):
+            new_child = self._visit(child)
+            if new_child is not child:
+                node.replace_child(child, new_child)
+        method = getattr(self, '_visit_' + type(node).__name__, None)
+        if method is None:
+            return node
+        return method(node)
+
+    def _fold(self, node):
+        for child in node.iterchildren():
+            if not isinstance(child, PrimitiveValueExpression):
+                return node
+        try:
+            value = node.calculate(None)
+        except SemanticError:
+            return node  # e.g. division by zero is left to be raised at runtime
+        return PrimitiveValueExpression(node.lineno, value)
+
+    _visit_NegateExpression = _fold
+    _visit_NegativeExpression = _fold
+    _visit_BooleanOperationExpression = _fold
+    _visit_ArithmeticOperationExpression = _fold
+    _visit_ComparisonExpression = _fold
+
+    def _visit_DeclaredVariableAssignmentNode(self, node):
+        expression, _ = node.iterchildren()
+        if isinstance(expression, PrimitiveValueExpression):
+            if node.binding not in self._assigned:
+                self._constants[node.binding] = expression.value
+        return node
+
+    def _visit_VariableExpression(self, node):
+        # only reads within the declaring function are replaced: the others
+        # may happen in a function called before the declaration is executed
+        if node.hops == 0 and node.binding in self._constants:
+            return PrimitiveValueExpression(node.lineno, self._constants[node.binding])
+        return node
+
+
+def _functions(node):
+    if isinstance(node, FunctionDeclarationNode):
+        return [node.func]
+    if isinstance(node, ClassDeclarationNode):
+        return [m for m in node.cls.members if isinstance(m, FunctionValue)]
+    return []
+
+
+def optimize(root):
+    Optimizer().optimize(root)
+    return root
@@ -0,0 +1,128 @@
+import atexit
+import sys
+import threading
+import time
+
+
+# NOTE: what programs print (console.log) goes to the current sink, one
+# line at a time, without its newline, and so do the lexical, syntax and
+# semantic errors that are reported, in the order they happen. Every engine
+# flushes the sink when a program ends, normally or with an error, and what
+# is still buffered is written when python exits. Sinks have write(text)
+# and flush()
+#
+#   sink = ListSink()
+#   previous = set_sink(sink)
+#   try:
+#       parser.interpret(data)
+#   finally:
+#       set_sink(previous)
+#   sink.lines
+#
+# A thread can have a sink of its own, see set_thread_sink(), which takes
+# what is written in the thread instead of the global one. That's how
+# capture() and parser.Program.run() keep the output of programs run in
+# different threads apart
+
+BUFFER_SIZE = 1 << 16
+
+
+class StreamSink(object):
+    # lines are written in batches of about buffer_size characters. The
+    # stream is sys.stdout as it is when flushing if it is None, so that
+    # replacing sys.stdout around a run still captures the output
+    def __init__(self, stream=None, buffer_size=BUFFER_SIZE):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._lines = []
+        self._size = 0
+
+    def write(self, text):
+        self._lines.append(text)
+        self._size += len(text) + 1
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._lines:
+            return
+        stream = self.stream if self.stream is not None else sys.stdout
+        self._lines.append('')
+        stream.write('\n'.join(self._lines))
+        self._lines = []
+        self._size = 0
+
+
+class ListSink(object):
+    # keeps the lines
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(text)
+
+    def flush(self):
+        pass
+
+
+class _Local(threading.local):
+    sink = None
+
+
+sink = StreamSink()
+_local = _Local()
+
+
+def set_sink(new_sink):
+    # returns the previous one, which is flushed
+    global sink
+    previous = sink
+    previous.flush()
+    sink = new_sink
+    return previous
+
+
+def set_thread_sink(new_sink):
+    # the sink of the current thread, None for the global one. Returns the
+    # previous one, which is flushed, None if there was none
+    previous = _local.sink
+    if previous is not None:
+        previous.flush()
+    _local.sink = new_sink
+    return previous
+
+
+def current():
+    # the sink of the current thread, or the global one
+    thread_sink = _local.sink
+    return thread_sink if thread_sink is not None else sink
+
+
+def write(text):
+    # as current(), which it inlines, for print statements
+    thread_sink = _local.sink
+    (thread_sink if thread_sink is not None else sink).write(text)
+
+
+def flush():
+    current().flush()
+
+
+def capture(function, *args):
+    # (what function(*args) writes, the exception it raises or None, the
+    # time it takes), what it writes being kept apart from the rest
+    lines = ListSink()
+    previous = set_thread_sink(lines)
+    error = None
+    start = time.time()
+    try:
+        function(*args)
+    except Exception as e:
+        error = e
+    finally:
+        elapsed = time.time() - start
+        set_thread_sink(previous)
+    return ''.join(line + '\n' for line in lines.lines), error, elapsed
+
+
+atexit.register(flush)
@@ -1,26 +1,237 @@
-import lexis
-import syntax
+import copy
+
+import astcache
+import bytecode
+import checker
+import optimizer
+import output
 import semantics
+import resolver
+import closures
+import streaming
+import transpiler
+import vm
+
+
+# NOTE: lexis and syntax are imported on first use, as importing PLY takes a
+# good share of the startup time, and programs that are run from the
+# transpiler's cache aren't parsed at all
+
+
+def analyze(source, lexer=None):
+    # source is a string, a file object or an mmap, see streaming. lexer is
+    # the kind of lexer to use, see lexis.get_lexer()
+    return _analyze(source, lambda: (_lexer(lexer), _analyzer()))[0]
 
 
-def analyze(data):
-    analyzer = syntax.analyzer
-    return analyzer.parse(data)
+def prepare(data):
+    # the tree as it is run by every engine
+    return _prepare(analyze(data))
 
 
-def interpret(data):
-    root_node = analyze(data)
+def interpret(data, engine='tree', profiler=None):
+    # profiler is a profiler.Profiler, which only the tree engine supports
+    if profiler is not None and engine != 'tree':
+        raise Exception('Profiling is not supported by the {} engine'.format(engine))
     try:
-        root_node.run()
+        if engine == 'python':
+            transpiler.execute(_python_code(data))
+        elif profiler is not None:
+            root_node = prepare(data)
+            with profiler:
+                _run_tree(root_node)
+        else:
+            ENGINES[engine](prepare(data))
     except semantics.SemanticError as e:
-        print e.message
+        output.write(e.message)
+        output.flush()
+
+
+def tokenize(source, lexer=None):
+    # as analyze()
+    return streaming.tokens(_lexer(lexer), source)
+
+
+class Interpreter(object):
+    # compiles programs with a lexer and a parser of its own, which are
+    # built on first use, so that interpreters share no state. sink takes
+    # the lexical and syntax errors, and what the programs it compiles
+    # print, instead of the sink of the thread, see output
+    def __init__(self, engine='tree', lexer=None, sink=None):
+        if engine not in ENGINES:
+            raise Exception('Unknown engine: {}'.format(engine))
+        self.engine = engine
+        self.lexer = lexer  # the kind, see lexis.get_lexer()
+        self.sink = sink
+        self._parsers = None
+
+    def analyze(self, source):
+        return _with_sink(self.sink, _analyze, source, self._get_parsers)[0]
+
+    def compile(self, source, globals=()):
+        # globals are the names of variables that the program reads without
+        # declaring them, their values are given to Program.run()
+        root_node = self.analyze(source)
+        if root_node is None:
+            raise Exception('The program could not be parsed')
+        return Program(_prepare(root_node, globals), self.engine, globals, self.sink)
+
+    def _get_parsers(self):
+        if self._parsers is None:
+            import lexis
+            lexer = lexis.get_lexer(self.lexer)
+            if hasattr(lexer, 'clone'):
+                lexer = lexer.clone()  # PLY's lexer is shared
+            self._parsers = lexer, copy.copy(_analyzer())
+        lexer, analyzer = self._parsers
+        lexer.lineno = 1
+        lexer.errors = 0
+        return lexer, analyzer
+
+
+class Program(object):
+    # a program compiled for an engine, which can be run any number of
+    # times, each run with variables of its own. Runs may overlap, from
+    # several threads: they share the inline caches of the program, whose
+    # entries hold for every run, see semantics.InlineCache
+    def __init__(self, root_node, engine, globals=(), sink=None):
+        self.root_node = root_node
+        self.engine = engine
+        self.globals = list(globals)
+        self.sink = sink
+        if engine == 'closures':
+            self._code = closures.Compiler().compile(root_node)
+        elif engine == 'vm':
+            code, bodies = bytecode.compile_program(root_node)
+            self._code = code, vm.VM(bodies)
+        elif engine == 'python':
+            self._code = transpiler.compile_program(root_node)
+        else:
+            self._code = root_node.run
+
+    def run(self, globals=None, sink=None):
+        # globals maps names given to Interpreter.compile() to values, python
+        # or semantics ones, the others are undefined. What the program
+        # prints goes to sink, else to the one of the program, else to the
+        # one of the thread. SemanticErrors are raised, not printed
+        values = [semantics.UNDEFINED] * len(self.globals)
+        for name, value in (globals or {}).iteritems():
+            if name not in self.globals:
+                raise Exception('Undeclared global: {}'.format(name))
+            values[self.globals.index(name)] = _language_value(value)
+        _with_sink(sink if sink is not None else self.sink, self._run, values)
+
+    def _run(self, values):
+        if self.engine == 'python':
+            transpiler.execute(self._code, values)
+            return
+        frame = semantics.Frame(self.root_node.frame_size)
+        frame.slots[:len(values)] = values
+        try:
+            if self.engine == 'vm':
+                code, machine = self._code
+                machine.execute(code, frame)
+            else:
+                self._code(frame)
+        finally:
+            output.flush()
+
+
+def _analyze(source, get_parsers):
+    # (tree, number of lexical and syntax errors). get_parsers() gives the
+    # lexer and the parser, which aren't needed for trees that are cached
+    if isinstance(source, basestring):
+        root_node = astcache.load(source)
+        if root_node is not None:
+            return root_node, 0
+    lexer, analyzer = get_parsers()
+    if not isinstance(source, basestring):
+        import syntax
+        root_node = syntax.parse(analyzer, None, streaming.ChunkedLexer(lexer, source))
+    else:
+        root_node = _parse(source, lexer, analyzer)
+    return root_node, lexer.errors
+
+
+def _parse(data, lexer, analyzer):
+    # lexical and syntax errors are printed while parsing and counted by the
+    # lexer, the trees of sources that have any are not cached
+    import syntax
+    root_node = syntax.parse(analyzer, data, lexer)
+    if root_node is not None and not lexer.errors:
+        astcache.store(data, root_node)
+    return root_node
+
+
+def _with_sink(sink, function, *args):
+    # function(*args), what it writes going to sink if it isn't None
+    if sink is None:
+        return function(*args)
+    previous = output.set_thread_sink(sink)
+    try:
+        return function(*args)
+    finally:
+        output.set_thread_sink(previous)
+
+
+def _analyzer():
+    import syntax
+    return syntax.get_analyzer()
+
+
+def _prepare(root_node, names=()):
+    # names are the ones of globals, see resolver.resolve()
+    resolver.resolve(root_node, names)
+    optimizer.optimize(root_node)
+    checker.check(root_node)
+    return root_node
+
+
+def _python_code(data):
+    # the code is cached by source, so that parsing can be skipped as well,
+    # and like trees only for sources without errors
+    code = transpiler.load(data)
+    if code is None:
+        root_node, errors = _analyze(data, lambda: (_lexer(None), _analyzer()))
+        code = transpiler.compile_program(_prepare(root_node))
+        if not errors:
+            transpiler.store(data, code)
+    return code
+
+
+def _language_value(value):
+    if isinstance(value, semantics.LanguageValue):
+        return value
+    if isinstance(value, bool):
+        return semantics.boolean_value(value)
+    if isinstance(value, (int, long, float)):
+        return semantics.number_value(float(value))
+    if isinstance(value, basestring):
+        return semantics.StringValue(value)
+    if value is None:
+        return semantics.NULL
+    raise Exception('Unsupported value: {!r}'.format(value))
+
+
+def _lexer(kind):
+    import lexis
+    lexer = lexis.get_lexer(kind)
+    # neither lexer resets the line number on input(), nor the errors
+    lexer.lineno = 1
+    lexer.errors = 0
+    return lexer
+
+
+def _run_tree(root_node):
+    try:
+        root_node.run(semantics.Frame(root_node.frame_size))
+    finally:
+        output.flush()
 
 
-def tokenize(data):
-    lexer = lexis.lexer
-    lexer.input(data)
-    while True:
-        token = lexer.token()
-        if token is None:
-            raise StopIteration()
-        yield token
+ENGINES = {
+    'tree': _run_tree,
+    'closures': closures.run,
+    'python': transpiler.run,
+    'vm': vm.run,
+}
@@ -0,0 +1,170 @@
+import time
+from collections import defaultdict
+
+from semantics import ExpressionNode, FunctionValue, LanguageItemNode
+
+
+# NOTE: profiles programs run by the tree engine. While a profiler is
+# enabled, the run() and calculate() methods of every node class, and
+# FunctionValue.call(), are replaced by wrappers that time them; they are
+# put back when it is disabled, so nothing is added to a run that isn't
+# profiled. Inclusive times of recursive nodes and functions are counted
+# once, for the outermost call
+#
+#   profiler = Profiler()
+#   with profiler:
+#       root_node.run(frame)
+#   print profiler.report()
+
+_clock = time.time
+
+_PROGRAM = '<program>'
+
+
+class Profiler(object):
+    def __init__(self):
+        # (line number, node type): [calls, inclusive time, exclusive time]
+        self.nodes = {}
+        # (function name, line number): [calls, inclusive time]
+        self.functions = {}
+        # (stack of function names, line number): exclusive time
+        self.stacks = defaultdict(float)
+        self._patched = []
+        self._running = []  # the active nodes
+        self._children = []  # time spent in the children of each one
+        self._active = defaultdict(int)  # active calls by key
+        self._path = [_PROGRAM]  # the stack of functions, ';'-separated
+
+    def enable(self):
+        if self._patched:
+            return
+        for cls in _classes(LanguageItemNode):
+            self._patch(cls, 'run', self._wrap_node)
+        for cls in _classes(ExpressionNode):
+            self._patch(cls, 'calculate', self._wrap_node)
+            self._patch(cls, 'calculate_bound', self._wrap_node)
+        self._patch(FunctionValue, 'call', self._wrap_function)
+
+    def disable(self):
+        for cls, name, method in self._patched:
+            setattr(cls, name, method)
+        self._patched = []
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disable()
+
+    def report(self, limit=20):
+        # the nodes that took the most time by themselves, then the functions
+        total = sum(entry[2] for entry in self.nodes.itervalues()) or 1.0
+        lines = ['{:>6}  {:<32} {:>9} {:>12} {:>12} {:>6}'.format(
+            'line', 'node', 'calls', 'inclusive ms', 'exclusive ms', '%'
+        )]
+        hot = sorted(self.nodes.iteritems(), key=lambda item: -item[1][2])
+        for (lineno, node_type), (calls, inclusive, exclusive) in hot[:limit]:
+            lines.append('{:>6}  {:<32} {:>9} {:>12.3f} {:>12.3f} {:>6.1f}'.format(
+                lineno, node_type, calls, inclusive * 1e3, exclusive * 1e3,
+                100 * exclusive / total
+            ))
+        lines.append('')
+        lines.append('{:>6}  {:<32} {:>9} {:>12}'.format(
+            'line', 'function', 'calls', 'inclusive ms'
+        ))
+        functions = sorted(self.functions.iteritems(), key=lambda item: -item[1][1])
+        for (name, lineno), (calls, inclusive) in functions[:limit]:
+            lines.append('{:>6}  {:<32} {:>9} {:>12.3f}'.format(
+                lineno, name, calls, inclusive * 1e3
+            ))
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        # one line per stack, in the format of flamegraph.pl: the functions
+        # and the line, then the exclusive time in microseconds
+        lines = []
+        for (path, lineno), elapsed in sorted(self.stacks.iteritems()):
+            microseconds = int(round(elapsed * 1e6))
+            if microseconds:
+                lines.append('{};line {} {}'.format(path, lineno, microseconds))
+        return '\n'.join(lines)
+
+    def _patch(self, cls, name, wrap):
+        # only where the method is defined, subclasses inherit the wrapper
+        method = cls.__dict__.get(name)
+        if method is not None:
+            self._patched.append((cls, name, method))
+            setattr(cls, name, wrap(method))
+
+    def _wrap_node(self, method):
+        nodes = self.nodes
+        stacks = self.stacks
+        running = self._running
+        children = self._children
+        active = self._active
+        path = self._path
+
+        def profiled(node, frame):
+            if running and running[-1] is node:
+                # the method of a base class, called by the overriding one
+                return method(node, frame)
+            key = node.lineno, type(node).__name__
+            active[key] += 1
+            running.append(node)
+            children.append(0.0)
+            start = _clock()
+            try:
+                return method(node, frame)
+            finally:
+                elapsed = _clock() - start
+                running.pop()
+                exclusive = elapsed - children.pop()
+                if children:
+                    children[-1] += elapsed
+                active[key] -= 1
+                entry = nodes.get(key)
+                if entry is None:
+                    entry = nodes[key] = [0, 0.0, 0.0]
+                entry[0] += 1
+                if not active[key]:
+                    entry[1] += elapsed
+                entry[2] += exclusive
+                stacks[path[-1], node.lineno] += exclusive
+
+        return profiled
+
+    def _wrap_function(self, method):
+        functions = self.functions
+        active = self._active
+        path = self._path
+
+        def profiled(func, *args, **kwargs):
+            key = func.name, func.lineno
+            active[key] += 1
+            path.append('{};{}'.format(path[-1], func.name))
+            start = _clock()
+            try:
+                return method(func, *args, **kwargs)
+            finally:
+                elapsed = _clock() - start
+                path.pop()
+                active[key] -= 1
+                entry = functions.get(key)
+                if entry is None:
+                    entry = functions[key] = [0, 0.0]
+                entry[0] += 1
+                if not active[key]:
+                    entry[1] += elapsed
+
+        return profiled
+
+
+def _classes(base):
+    # base and all of its subclasses
+    result = [base]
+    for cls in result:
+        for subclass in cls.__subclasses__():
+            if subclass not in result:
+                result.append(subclass)
+    return result
@@ -0,0 +1,378 @@
+#! /bin/python
+
+import argparse
+import difflib
+import glob
+import multiprocessing
+import os
+import resource
+import select
+import sys
+import threading
+import time
+
+import parser
+import semantics
+from output import ListSink, capture, write
+
+
+# NOTE: runs programs and compares what they print with the .expected file
+# next to each one, e.g. loops.expected for loops.ts. The programs run in
+# worker processes that are reused from one program to the next; a worker
+# that takes longer than the timeout is killed and replaced, and one that
+# runs out of the memory limit reports it as the program's error. The
+# status is 1 if any program doesn't pass, so that it can gate changes.
+# With --threads, each program is compiled once and run by that many threads
+# at the same time, switching as often as the interpreter allows, and their
+# outputs must all be the expected one. The programs in tests are the ones of
+# the repository, and the default:
+#
+#   python regression.py -e tree -e closures -e vm -e python
+#   python regression.py tests/loop.ts --update
+#   python regression.py -e tree -e vm --threads 4
+
+TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests')
+TIMEOUT = 10.0
+MEMORY_LIMIT = 512  # MB
+SLOWEST = 5
+DIFF_LINES = 20
+SHARED_RUNS = 30  # by each thread, see --threads
+
+# statuses of a program, and how they are shown while running
+PASS = 'pass'
+FAIL = 'fail'  # the output differs
+ERROR = 'error'  # an exception other than a SemanticError
+MEMORY = 'memory'
+TIMEOUT_EXPIRED = 'timeout'
+CRASH = 'crash'  # the worker died
+MISSING = 'missing'  # no .expected file
+
+_MARKS = {
+    PASS: '.', FAIL: 'F', ERROR: 'E', MEMORY: 'M', TIMEOUT_EXPIRED: 'T',
+    CRASH: 'C', MISSING: '?',
+}
+
+
+class Result(object):
+    __slots__ = ('path', 'engine', 'status', 'output', 'error', 'elapsed')
+
+    def __init__(self, path, engine, status, output, error, elapsed):
+        self.path = path
+        self.engine = engine
+        self.status = status
+        self.output = output
+        self.error = error
+        self.elapsed = elapsed
+
+
+def expected_path(path):
+    return os.path.splitext(path)[0] + '.expected'
+
+
+def find(patterns):
+    # the programs matching the patterns, directories searched recursively
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.isdir(path):
+                found = []
+                for directory, _, names in os.walk(path):
+                    found.extend(
+                        os.path.join(directory, name)
+                        for name in names if name.endswith('.ts')
+                    )
+                candidates = sorted(found)
+            else:
+                candidates = [path]
+            for candidate in candidates:
+                if candidate not in paths:
+                    paths.append(candidate)
+    return paths
+
+
+def run(paths, engines, jobs, timeout=TIMEOUT, memory_limit=MEMORY_LIMIT, report=None, threads=1):
+    # the results of every program with every engine, in that order.
+    # report(result) is called as each one finishes
+    tasks = [(path, engine) for path in paths for engine in engines]
+    pending = list(reversed(tasks))
+    results = {}
+    workers = [_Worker(memory_limit, threads) for _ in xrange(min(jobs, len(tasks)))]
+    try:
+        while pending or any(worker.task is not None for worker in workers):
+            for worker in workers:
+                if worker.task is None and pending:
+                    worker.send(pending.pop())
+            busy = [worker for worker in workers if worker.task is not None]
+            deadline = min(worker.start for worker in busy) + timeout
+            ready, _, _ = select.select(
+                [worker.connection for worker in busy], [], [],
+                max(0, deadline - time.time())
+            )
+            now = time.time()
+            for i, worker in enumerate(workers):
+                if worker.task is None:
+                    continue
+                path, engine = worker.task
+                if worker.connection in ready:
+                    try:
+                        output, error, elapsed = worker.connection.recv()
+                    except EOFError:
+                        result = Result(path, engine, CRASH, '', 'the worker died', now - worker.start)
+                        workers[i] = _replace(worker, memory_limit, threads)
+                    else:
+                        worker.task = None
+                        result = _check(path, engine, output, error, elapsed)
+                elif now - worker.start > timeout:
+                    result = Result(
+                        path, engine, TIMEOUT_EXPIRED, '',
+                        'took more than {}s'.format(timeout), now - worker.start
+                    )
+                    workers[i] = _replace(worker, memory_limit, threads)
+                else:
+                    continue
+                results[path, engine] = result
+                if report is not None:
+                    report(result)
+    finally:
+        for worker in workers:
+            worker.stop()
+    return [results[task] for task in tasks]
+
+
+def update(results):
+    # writes the output of the first engine that ran a program to completion
+    # as the expected one, and returns the results checked against it
+    written = set()
+    for result in results:
+        if result.path in written or result.status not in (PASS, FAIL, MISSING):
+            continue
+        written.add(result.path)
+        if result.status != PASS:
+            with open(expected_path(result.path), 'w') as f:
+                f.write(result.output)
+    return [
+        _check(r.path, r.engine, r.output, None, r.elapsed)
+        if r.status in (PASS, FAIL, MISSING) else r
+        for r in results
+    ]
+
+
+def _check(path, engine, output, error, elapsed):
+    if error == MEMORY:
+        return Result(path, engine, MEMORY, output, 'ran out of memory', elapsed)
+    if error is not None:
+        return Result(path, engine, ERROR, output, error, elapsed)
+    try:
+        with open(expected_path(path)) as f:
+            expected = f.read()
+    except IOError:
+        return Result(path, engine, MISSING, output, None, elapsed)
+    status = PASS if output == expected else FAIL
+    error = None if status == PASS else _diff(expected, output, path)
+    return Result(path, engine, status, output, error, elapsed)
+
+
+def _diff(expected, output, path):
+    lines = list(difflib.unified_diff(
+        expected.splitlines(True), output.splitlines(True),
+        expected_path(path), 'output'
+    ))
+    if len(lines) > DIFF_LINES:
+        lines = lines[:DIFF_LINES] + ['... {} more lines\n'.format(len(lines) - DIFF_LINES)]
+    return ''.join(line if line.endswith('\n') else line + '\n' for line in lines)
+
+
+# Workers
+
+
+class _Worker(object):
+    def __init__(self, memory_limit, threads):
+        self.connection, connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_work, args=(connection, memory_limit, threads)
+        )
+        self.process.daemon = True
+        self.process.start()
+        connection.close()
+        self.task = None
+        self.start = None
+
+    def send(self, task):
+        self.task = task
+        self.start = time.time()
+        self.connection.send(task)
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+def _replace(worker, memory_limit, threads):
+    worker.stop()
+    return _Worker(memory_limit, threads)
+
+
+def _work(connection, memory_limit, threads):
+    if memory_limit:
+        limit = memory_limit << 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # the lexer and the parser are built once per worker
+    import syntax
+    syntax.get_analyzer()
+    while True:
+        try:
+            path, engine = connection.recv()
+        except EOFError:
+            break
+        connection.send(_execute(path, engine, threads))
+
+
+def _execute(path, engine, threads=1):
+    # (output, error, time taken) of a program
+    if threads > 1:
+        output, error, elapsed = capture(_interpret_shared, path, engine, threads)
+    else:
+        output, error, elapsed = capture(_interpret, path, engine)
+    if isinstance(error, MemoryError):
+        error = MEMORY
+    elif error is not None:
+        error = '{}: {}'.format(type(error).__name__, error)
+    return output, error, elapsed
+
+
+def _interpret(path, engine):
+    with open(path) as f:
+        parser.interpret(f.read(), engine)
+
+
+def _interpret_shared(path, engine, threads):
+    # as _interpret(), the program being run SHARED_RUNS times by each
+    # thread, all at once. What the first run prints is the output, the
+    # others must print the same
+    with open(path) as f:
+        source = f.read()
+    try:
+        program = parser.Interpreter(engine).compile(source)
+    except semantics.SemanticError as e:
+        write(e.message)
+        return
+    outputs = []
+    errors = []
+    interval = sys.getcheckinterval()
+    sys.setcheckinterval(1)
+    try:
+        runners = [
+            threading.Thread(target=_run_shared, args=(program, outputs, errors))
+            for _ in xrange(threads)
+        ]
+        for runner in runners:
+            runner.start()
+        for runner in runners:
+            runner.join()
+    finally:
+        sys.setcheckinterval(interval)
+    if errors:
+        raise errors[0]
+    for line in outputs[0]:
+        write(line)
+    if any(lines != outputs[0] for lines in outputs):
+        raise Exception('the runs of the threads printed different outputs')
+
+
+def _run_shared(program, outputs, errors):
+    try:
+        for _ in xrange(SHARED_RUNS):
+            sink = ListSink()
+            try:
+                program.run(sink=sink)
+            except semantics.SemanticError as e:
+                sink.write(e.message)
+            outputs.append(sink.lines)
+    except Exception as e:
+        errors.append(e)
+
+
+# Command line
+
+
+def make_argument_parser():
+    argument_parser = argparse.ArgumentParser(
+        description='Runs programs and compares their output with the expected one.'
+    )
+    argument_parser.add_argument(
+        'paths', nargs='*', default=[TESTS],
+        help='programs, directories or glob patterns (default: the tests directory)'
+    )
+    argument_parser.add_argument(
+        '-e', '--engine', action='append', choices=sorted(parser.ENGINES),
+        help='engine to run the programs with, can be repeated (default: tree)'
+    )
+    argument_parser.add_argument(
+        '-j', '--jobs', type=int, default=0,
+        help='number of worker processes, 0 for one per CPU (default)'
+    )
+    argument_parser.add_argument(
+        '-t', '--timeout', type=float, default=TIMEOUT,
+        help='seconds a program may run for (default: {})'.format(TIMEOUT)
+    )
+    argument_parser.add_argument(
+        '-m', '--memory', type=int, default=MEMORY_LIMIT,
+        help='megabytes a worker may use, 0 for no limit (default: {})'.format(MEMORY_LIMIT)
+    )
+    argument_parser.add_argument(
+        '--slowest', type=int, default=SLOWEST,
+        help='number of the slowest programs to list (default: {})'.format(SLOWEST)
+    )
+    argument_parser.add_argument(
+        '--threads', type=int, default=1,
+        help='number of threads running each program at once (default: 1)'
+    )
+    argument_parser.add_argument(
+        '--update', action='store_true',
+        help='write the outputs as the expected ones where they differ'
+    )
+    return argument_parser
+
+
+def main(argv=None):
+    args = make_argument_parser().parse_args(argv)
+    engines = args.engine or ['tree']
+    paths = find(args.paths)
+    jobs = args.jobs or multiprocessing.cpu_count()
+
+    def report(result):
+        sys.stdout.write(_MARKS[result.status])
+        sys.stdout.flush()
+
+    start = time.time()
+    results = run(paths, engines, jobs, args.timeout, args.memory, report, args.threads)
+    elapsed = time.time() - start
+    print
+
+    if args.update:
+        results = update(results)
+
+    failed = [r for r in results if r.status != PASS]
+    for result in failed:
+        print '{} [{}]: {}'.format(result.path, result.engine, result.status)
+        if result.error:
+            print result.error.rstrip('\n')
+
+    print '{} programs, {} engines: {} passed, {} failed'.format(
+        len(paths), len(engines), len(results) - len(failed), len(failed)
+    )
+    print '{:.2f}s, {:.1f} runs/s, {} jobs'.format(
+        elapsed, len(results) / elapsed if elapsed else 0.0, jobs
+    )
+    slowest = sorted(results, key=lambda r: -r.elapsed)[:args.slowest]
+    if slowest:
+        print 'slowest:'
+        for result in slowest:
+            print '\t{:8.3f}s {} [{}]'.format(result.elapsed, result.path, result.engine)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+from semantics import (
+    FunctionValue, UndeclaredClassError, UndeclaredVariableError
+)
+
+
+BUILTIN_TYPES = ['boolean', 'number', 'string', 'any']
+
+
+# NOTE: every block-level declaration gets its own slot in the frame of the
+# enclosing function (or of the program root), so a binding is fully
+# described by the function nesting depth and the slot index
+
+
+class Binding(object):
+    def __init__(self, name, var_type, depth, slot):
+        self.name = name
+        self.type = var_type
+        self.depth = depth
+        self.slot = slot
+
+    def __repr__(self):
+        return 'Binding({}, {}, depth={}, slot={})'.format(
+            self.name, self.type, self.depth, self.slot
+        )
+
+
+class _FunctionScope(object):
+    def __init__(self, depth):
+        self.depth = depth
+        self.size = 0
+
+    def allocate(self):
+        slot = self.size
+        self.size += 1
+        return slot
+
+
+class _BlockScope(object):
+    def __init__(self, parent, function):
+        self.parent = parent
+        self.function = function
+        self.names = {}
+        self.deferred = []
+
+    def lookup(self, name):
+        scope = self
+        while scope is not None:
+            if name in scope.names:
+                return scope.names[name]
+            scope = scope.parent
+        return None
+
+
+class Resolver(object):
+    def __init__(self):
+        self._scope = None
+
+    def resolve(self, root, names=()):
+        # names are variables of the program that are set before it runs,
+        # of any type, they take the first slots
+        function = _FunctionScope(0)
+        self._enter(function)
+        for name in names:
+            self._declare(name, 'any')
+        self._visit_children(root)
+        self._leave()
+        root.frame_size = function.size
+
+    # Scopes
+
+    def _enter(self, function=None):
+        if function is None:
+            function = self._scope.function
+        self._scope = _BlockScope(self._scope, function)
+
+    def _leave(self):
+        # function bodies are resolved once the enclosing block is complete,
+        # so that they can refer to anything declared in it
+        scope = self._scope
+        for func in scope.deferred:
+            self._resolve_function(func)
+        self._scope = scope.parent
+
+    def _declare(self, name, var_type):
+        function = self._scope.function
+        binding = Binding(name, var_type, function.depth, function.allocate())
+        self._scope.names[name] = binding
+        return binding
+
+    def _bind(self, node, binding):
+        node.bind(binding, self._scope.function.depth)
+
+    def _lookup(self, name, lineno):
+        binding = self._scope.lookup(name)
+        if binding is None:
+            raise UndeclaredVariableError(name, lineno)
+        return binding
+
+    def _ensure_type(self, type_name, lineno):
+        if type_name in BUILTIN_TYPES:
+            return
+        binding = self._scope.lookup(type_name)
+        if binding is None or binding.type != 'class':
+            raise UndeclaredClassError(type_name, lineno)
+
+    def _ensure_func_types(self, func, lineno):
+        self._ensure_type(func.return_type, lineno)
+        for param in func.params:
+            self._ensure_type(param.type, lineno)
+
+    def _resolve_function(self, func):
+        function = _FunctionScope(self._scope.function.depth + 1)
+        self._enter(function)
+        for param in func.params:
+            self._declare(param.name, param.type)
+        self._visit_children(func.block)
+        self._leave()
+        func.block.frame_size = function.size
+
+    # Nodes
+
+    def _visit(self, node):
+        method = getattr(self, '_visit_' + type(node).__name__, None)
+        if method is None:
+            self._visit_children(node)
+        else:
+            method(node)
+
+    def _visit_children(self, node):
+        for child in node.iterchildren():
+            self._visit(child)
+
+    def _visit_ScopeNode(self, node):
+        self._enter()
+        self._visit_children(node)
+        self._leave()
+
+    def _visit_VariableDeclarationNode(self, node):
+        var = node.var
+        self._ensure_type(var.type, node.lineno)
+        self._bind(node, self._declare(var.name, var.type))
+
+    def _visit_VariableAssignmentNode(self, node):
+        self._visit_children(node)
+        self._bind(node, self._lookup(node.name, node.lineno))
+
+    def _visit_DeclaredVariableAssignmentNode(self, node):
+        expression, var_decl = node.iterchildren()
+        self._visit(var_decl)
+        self._visit(expression)
+        self._bind(node, self._lookup(node.name, node.lineno))
+
+    def _visit_FunctionDeclarationNode(self, node):
+        func = node.func
+        self._bind(node, self._declare(func.name, func.gettype()))
+        self._scope.deferred.append(func)
+
+    def _visit_ClassDeclarationNode(self, node):
+        cls = node.cls
+        self._bind(node, self._declare(cls.name, cls.gettype()))
+        for member in cls.members:
+            if isinstance(member, FunctionValue):
+                if not member.name == 'constructor':
+                    self._ensure_func_types(member, node.lineno)
+                self._scope.deferred.append(member)
+            else:
+                self._ensure_type(member.type, node.lineno)
+
+    def _visit_VariableExpression(self, node):
+        self._bind(node, self._lookup(node.name, node.lineno))
+
+    def _visit_NewInstanceExpression(self, node):
+        self._visit_children(node)
+        self._bind(node, self._lookup(node.name, node.lineno))
+
+
+def resolve(root, names=()):
+    Resolver().resolve(root, names)
+    return root
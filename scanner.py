@@ -0,0 +1,174 @@
+import re
+
+import output
+from lexis import literals, reserved
+
+
+# NOTE: a hand-written replacement for the lexer that PLY generates from the
+# rules in lexis, yielding the same tokens, line numbers included. The buffer
+# is scanned once: the first character of a token selects how it is read,
+# and the rules are checked in the order PLY checks them, so that e.g. 'NaN'
+# takes precedence over identifiers
+
+_BLANKS = re.compile(r'[ \t]+')
+_NEWLINES = re.compile(r'\n+')
+_IDENT = re.compile(r'[$_a-zA-Z][$_a-zA-Z0-9]*')
+_NUMBER = re.compile(r'\d+(\.\d+)?')
+
+_DIGITS = frozenset('0123456789')
+_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+_LITERALS = frozenset(literals)
+
+# two or three character operators, by the first character
+_OPERATORS = {
+    '!': ('!==', 'STRICT_NOT_EQUAL'),
+    '=': ('===', 'STRICT_EQUALS'),
+    '&': ('&&', 'AND'),
+    '|': ('||', 'OR'),
+    '<': ('<=', 'LESS_OR_EQUAL'),
+    '>': ('>=', 'MORE_OR_EQUAL'),
+}
+
+# words that are read as other tokens than identifiers, see lexis
+_WORDS = {
+    'c': ('console.log', 'CONSOLE_LOG', 'console.log'),
+    'N': ('NaN', 'NUMBER', float('nan')),
+    'I': ('Infinity', 'NUMBER', float('inf')),
+}
+
+# how a token is read, by its first character
+_BLANK = 'blank'
+_NEWLINE = 'newline'
+_NAME = 'name'
+_DIGIT = 'digit'
+_QUOTE = 'quote'
+_SLASH = 'slash'
+_OPERATOR = 'operator'
+_LITERAL = 'literal'
+
+_CLASSES = dict.fromkeys(literals, _LITERAL)
+_CLASSES.update(dict.fromkeys(_OPERATORS, _OPERATOR))
+_CLASSES.update(dict.fromkeys(_LETTERS | frozenset('$_'), _NAME))
+_CLASSES.update(dict.fromkeys(_DIGITS, _DIGIT))
+_CLASSES.update({' ': _BLANK, '\t': _BLANK, '\n': _NEWLINE, "'": _QUOTE, '/': _SLASH})
+
+
+class Token(object):
+    # the attributes of ply.lex.LexToken that the parser uses, the lexer is
+    # set by the parser on errors
+    __slots__ = ('type', 'value', 'lineno', 'lexpos', 'lexer')
+
+    def __init__(self, token_type, value, lineno, lexpos):
+        self.type = token_type
+        self.value = value
+        self.lineno = lineno
+        self.lexpos = lexpos
+
+    def __str__(self):
+        return 'LexToken(%s,%r,%d,%d)' % (self.type, self.value, self.lineno, self.lexpos)
+
+    def __repr__(self):
+        return str(self)
+
+
+class Scanner(object):
+    # the interface of ply.lex.Lexer that the parser uses: input(), token()
+    # and the line number, which is not reset by input() either, and the
+    # count of errors, see lexis. Tokens are read by a generator, so that
+    # the state of the scan stays in its locals
+    def __init__(self):
+        self.lexdata = ''
+        self.lineno = 1
+        self.errors = 0
+        self._tokens = iter(())
+
+    def input(self, data):
+        self.lexdata = data
+        self._tokens = self._scan(data)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        token = self.token()
+        if token is None:
+            raise StopIteration()
+        return token
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def _scan(self, data):
+        # the line number is kept up to date as the parser reads it, see syntax
+        lineno = self.lineno
+        pos = 0
+        end = len(data)
+        while pos < end:
+            char = data[pos]
+            kind = _CLASSES.get(char)
+            if kind is _BLANK:
+                pos = _BLANKS.match(data, pos).end()
+                continue
+            if kind is _NEWLINE:
+                newlines = _NEWLINES.match(data, pos).end()
+                lineno += newlines - pos
+                self.lineno = lineno
+                pos = newlines
+                continue
+            if kind is _NAME:
+                word = _WORDS.get(char)
+                if word is not None and data.startswith(word[0], pos):
+                    yield Token(word[1], word[2], lineno, pos)
+                    pos += len(word[0])
+                    continue
+                # identifiers can't start right after a digit
+                if not pos or data[pos - 1] not in _DIGITS:
+                    value = _IDENT.match(data, pos).group()
+                    yield Token(reserved.get(value, 'ID'), value, lineno, pos)
+                    pos += len(value)
+                    continue
+            elif kind is _LITERAL:
+                yield Token(char, char, lineno, pos)
+                pos += 1
+                continue
+            elif kind is _DIGIT:
+                # and neither can numbers after a letter
+                if not pos or data[pos - 1] not in _LETTERS:
+                    value = _NUMBER.match(data, pos).group()
+                    yield Token('NUMBER', float(value), lineno, pos)
+                    pos += len(value)
+                    continue
+            elif kind is _OPERATOR:
+                operator, token_type = _OPERATORS[char]
+                if data.startswith(operator, pos):
+                    yield Token(token_type, operator, lineno, pos)
+                    pos += len(operator)
+                    continue
+                if char in _LITERALS:
+                    yield Token(char, char, lineno, pos)
+                    pos += 1
+                    continue
+            elif kind is _QUOTE:
+                close = data.find("'", pos + 1)
+                if close >= 0:
+                    yield Token('STRING', data[pos + 1:close], lineno, pos)
+                    pos = close + 1
+                    continue
+            elif kind is _SLASH:
+                # a comment only counts as one if it ends with a newline
+                newline = data.find('\n', pos) if data.startswith('//', pos) else -1
+                if newline >= 0:
+                    lineno += 1
+                    self.lineno = lineno
+                    pos = newline + 1
+                    continue
+                yield Token(char, char, lineno, pos)
+                pos += 1
+                continue
+            # no rule matched, as in lexis.t_error()
+            self.errors += 1
+            output.write("Lexical error: unidentified token '{}' on line #{}".format(
+                char, lineno
+            ))
+            pos += 1
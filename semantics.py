@@ -1,426 +1,494 @@
+import copy
+import operator
+
+import output
+
+
+# the tracer of the tree engine, see tracing.settrace()
+_tracer = None
+
+
 # TODO: ! add support for void functions !
 # TODO: override __repr__ everywhere properly instead of node_type => remove 'type'?
 # TODO: split into multiple files
 # TODO: get rid of 'name' in Variable?
 
 class Node(object):
+    __slots__ = ('type', 'lineno', 'parent', 'binding', 'hops', 'slot')
+    # attributes holding the children, in order. Nodes with any number of
+    # children keep them in a list instead, see _ListNode
+    _fields = ()
+
     def __init__(self, lineno, node_type):
         self.type = node_type
         self.lineno = lineno
         self.parent = None
-        self._children = []
 
-    def add_child(self, child):
-        self._children.append(child)
+    def replace_child(self, child, new_child):
+        for field in self._fields:
+            if getattr(self, field) is child:
+                setattr(self, field, self._adopt(new_child))
+                return
+        raise ValueError('{} is not a child of {}'.format(child, self))
+
+    def bind(self, binding, depth):
+        # called by the resolver before execution, depth is the one of the
+        # function the node belongs to
+        self.binding = binding
+        self.hops = depth - binding.depth
+        self.slot = binding.slot
+
+    def iterchildren(self):
+        for field in self._fields:
+            child = getattr(self, field)
+            if child is not None:
+                yield child
+
+    def _adopt(self, child):
         child.parent = self
+        return child
+
+    def __repr__(self):
+        return 'Node({})'.format(self.type)
+
+
+class _ListNode(object):
+    # mixin for nodes with any number of children, they must have a
+    # '_children' slot
+    __slots__ = ()
+
+    def add_child(self, child):
+        self._children.append(self._adopt(child))
 
     def add_children(self, children):
         for child in children:
             self.add_child(child)
 
-    # TODO: incapsulate scopes traversal
-    def getvar(self, name):
-        node = self
-        while node is not None:
-            if isinstance(node, ScopeNode) and name in node.scope:
-                value = self._getvar(node.scope, name)
-                return value
-            node = node.parent
-        raise UndeclaredVariableError(name, self.lineno)
+    def replace_child(self, child, new_child):
+        index = self._children.index(child)
+        self._children[index] = self._adopt(new_child)
 
     def iterchildren(self):
-        for child in self._children:
-            yield child
-
-    def _getvar(self, scope, name):
-        value = scope[name]
-        if value is not None:
-            return value
-        return UndefinedValue()
-
-    def __repr__(self):
-        return 'Node({})'.format(self.type)
+        return iter(self._children)
 
 
 # Control flow nodes
 
 
 class LanguageItemNode(Node):
-    TYPES = ['boolean', 'number', 'string', 'any']
-
-    def ensure_func_types(self, func):
-        self.ensure_type(func.return_type)
-        for param in func.params:
-            self.ensure_type(param.type)
+    __slots__ = ()
 
-    def ensure_type(self, type_name):
-        if type_name in self.TYPES:
-            return
-        var = self.getvar(type_name)
-        if not isinstance(var.value, ClassValue):
-            raise UndeclaredClassError(type_name, self.lineno)
-
-    def run(self):
+    # NOTE: run() returns None, or the value of a return statement that was
+    # executed, which blocks and loops pass on to FunctionValue.call()
+    def run(self, frame):
         raise NotImplementedError()
 
-    def setvar(self, name, value):
-        node = self
-        while node is not None:
-            if isinstance(node, ScopeNode):
-                node.scope[name] = value
-                return
-            node = node.parent
 
+class ScopeNode(_ListNode, LanguageItemNode):
+    __slots__ = ('frame_size', '_children')
 
-class ScopeNode(LanguageItemNode):
     def __init__(self, lineno, statements):
         super(ScopeNode, self).__init__(lineno, 'block')
-        self.scope = {}
-        self._this = None
+        # only set for function bodies and the root, see resolver
+        self.frame_size = 0
+        self._children = []
         self.add_children(statements)
 
-    def get_this(self):
-        if self._this is not None:
-            return self._this
-        return UndefinedValue()
-
-    def run(self):
+    def run(self, frame):
+        if _tracer is not None:
+            return self._run_traced(frame)
         for child in self._children:
-            child.run()
-
-    def set_this(self, this):
-        self._this = this
+            result = child.run(frame)
+            if result is not None:
+                return result
 
-    def update_scope(self, scope):
-        self.scope.update(scope)
+    def _run_traced(self, frame):
+        for child in self._children:
+            _tracer(frame, 'line', child)
+            result = child.run(frame)
+            if result is not None:
+                return result
 
 
 class ExpressionStatementNode(LanguageItemNode):
+    __slots__ = ('expression',)
+    _fields = ('expression',)
+
     def __init__(self, lineno, expression):
         super(ExpressionStatementNode, self).__init__(lineno, 'expression statement')
-        self.add_child(expression)
+        self.expression = self._adopt(expression)
 
-    def run(self):
-        self._children[0].calculate()
+    def run(self, frame):
+        self.expression.calculate(frame)
 
 
 class VariableAssignmentNode(LanguageItemNode):
+    __slots__ = ('name', 'checked', 'expression')
+    _fields = ('expression',)
+
     def __init__(self, lineno, name, expression):
         super(VariableAssignmentNode, self).__init__(lineno, 'variable assignment')
-        self._name = name
-        self.add_child(expression)
+        self.name = name
+        # cleared where the type is proven statically, see checker
+        self.checked = True
+        self.expression = self._adopt(expression)
 
-    def run(self):
-        value = self._children[0].calculate()
-        var = self.getvar(self._name)
-        typecheck(self.lineno, self._name, value, var.type)
-        var.value = value
+    def run(self, frame):
+        value = self.expression.calculate(frame)
+        if self.checked:
+            typecheck(self.lineno, self.name, value, self.binding.type)
+        frame.up(self.hops).slots[self.slot] = value
 
 
 class DeclaredVariableAssignmentNode(VariableAssignmentNode):
+    __slots__ = ('var_decl',)
+    _fields = ('expression', 'var_decl')
+
     def __init__(self, lineno, var_decl, expression):
         name = var_decl.var.name
         super(DeclaredVariableAssignmentNode, self).__init__(lineno, name, expression)
-        self.add_child(var_decl)
+        self.var_decl = self._adopt(var_decl)
 
-    def run(self):
-        self._children[1].run()
-        super(DeclaredVariableAssignmentNode, self).run()
+    def run(self, frame):
+        self.var_decl.run(frame)
+        super(DeclaredVariableAssignmentNode, self).run(frame)
 
 
 class MemberAssignmentNode(LanguageItemNode):
+    __slots__ = ('checked', 'member_node', 'expression')
+    _fields = ('member_node', 'expression')
+
     def __init__(self, lineno, member_node, expression):
         super(MemberAssignmentNode, self).__init__(lineno, 'member assignment')
-        self.add_child(member_node)
-        self.add_child(expression)
+        self.checked = True
+        self.member_node = self._adopt(member_node)
+        self.expression = self._adopt(expression)
 
-    def run(self):
-        member_node = self._children[0]
-        member_node_child = next(iter(member_node.iterchildren()))
-        obj = member_node_child.calculate().obj(self.lineno)
-        obj.set_member(self.lineno, member_node.name, self._children[1].calculate())
+    def run(self, frame):
+        member_node = self.member_node
+        obj = member_node.operand.calculate(frame).obj(self.lineno)
+        value = self.expression.calculate(frame)
+        obj.set_member(self.lineno, member_node.name, value, self.checked)
 
 
 class FunctionDeclarationNode(LanguageItemNode):
+    __slots__ = ('func',)
+
     def __init__(self, lineno, func):
         super(FunctionDeclarationNode, self).__init__(lineno, 'function declaration')
         self.func = func
 
-    def run(self):
-        name = self.func.name
-        func_type = self.func.gettype()
-        var = Variable(name, func_type, self.func)
-        self.setvar(name, var)
+    def run(self, frame):
+        frame.slots[self.slot] = self.func.closure(frame)
 
 
 class ReturnNode(LanguageItemNode):
+    __slots__ = ('expression',)
+    _fields = ('expression',)
+
     def __init__(self, lineno, expression):
         super(ReturnNode, self).__init__(lineno, 'return statement')
-        self.add_child(expression)
+        self.expression = self._adopt(expression)
 
-    def run(self):
+    def run(self, frame):
         # TODO: check if both in function and not in contstructor
-        result = self._children[0].calculate()
-        raise _Return(result)
+        return self.expression.calculate(frame)
 
 
 class ClassDeclarationNode(LanguageItemNode):
+    __slots__ = ('cls',)
+
     def __init__(self, lineno, name, members):
         super(ClassDeclarationNode, self).__init__(lineno, 'class declaration')
         self.cls = ClassValue(lineno, name, members)
-        self._name = name
-
-    def run(self):
-        self._ensure_class_types()
-        class_type = self.cls.gettype()
-        var = Variable(self._name, class_type, self.cls)
-        self.setvar(self._name, var)
 
-    def _ensure_class_types(self):
-        for member in self.cls.members:
-            if isinstance(member, FunctionValue):
-                if not member.name == 'constructor':
-                    self.ensure_func_types(member)
-            else:
-                self.ensure_type(member.type)
+    def run(self, frame):
+        frame.slots[self.slot] = self.cls.closure(frame)
 
 
 class PrintNode(LanguageItemNode):
+    __slots__ = ('expression',)
+    _fields = ('expression',)
+
     def __init__(self, lineno, expression):
         super(PrintNode, self).__init__(lineno, 'print statement')
-        self.add_child(expression)
+        self.expression = self._adopt(expression)
 
-    def run(self):
-        print self._children[0].calculate().str()
+    def run(self, frame):
+        value = self.expression.calculate(frame)
+        if _tracer is not None:
+            _tracer(frame, 'print', value)
+        output.write(value.str())
 
 
 class IfNode(LanguageItemNode):
+    __slots__ = ('condition', 'block', 'else_block')
+    _fields = ('condition', 'block', 'else_block')
+
     def __init__(self, lineno, condition, block):
         super(IfNode, self).__init__(lineno, 'if statement')
-        self.add_child(condition)
-        self.add_child(block)
+        self.condition = self._adopt(condition)
+        self.block = self._adopt(block)
+        self.else_block = None
 
     def add_else(self, block):
-        if len(self._children) == 2:
-            self.add_child(block)
+        if self.else_block is None:
+            self.else_block = self._adopt(block)
         else:
             raise Exception("Trying to add 'else' block when it already exists")
 
-    def run(self):
-        if self._children[0].calculate().bool():
-            self._children[1].run()
+    def run(self, frame):
+        if self.condition.calculate(frame).bool():
+            return self.block.run(frame)
         else:
-            if len(self._children) == 3:
-                self._children[2].run()
+            if self.else_block is not None:
+                return self.else_block.run(frame)
 
 
 class WhileLoopNode(LanguageItemNode):
+    __slots__ = ('condition', 'block')
+    _fields = ('condition', 'block')
+
     def __init__(self, lineno, condition, block):
         super(WhileLoopNode, self).__init__(lineno, 'while loop')
-        self.add_child(condition)
-        self.add_child(block)
+        self.condition = self._adopt(condition)
+        self.block = self._adopt(block)
 
-    def run(self):
-        while self._children[0].calculate().bool():
-            self._children[1].run()
+    def run(self, frame):
+        condition, block = self.condition, self.block
+        while condition.calculate(frame).bool():
+            result = block.run(frame)
+            if result is not None:
+                return result
 
 
 class VariableDeclarationNode(LanguageItemNode):
+    __slots__ = ('var',)
+
     def __init__(self, lineno, var):
         super(VariableDeclarationNode, self).__init__(lineno, 'variable declaration')
         self.var = var
 
-    def run(self):
-        self.ensure_type(self.var.type)
-        self.setvar(self.var.name, self.var)
+    def run(self, frame):
+        frame.slots[self.slot] = UNDEFINED
 
 
 # Expression nodes
 
 
 class ExpressionNode(Node):
-    def calculate(self):
+    __slots__ = ()
+
+    def calculate(self, frame):
         raise NotImplementedError()
 
 
 class PrimitiveValueExpression(ExpressionNode):
+    __slots__ = ('value',)
+
     def __init__(self, lineno, value):
         super(PrimitiveValueExpression, self).__init__(lineno, 'primitive value')
-        self._value = value
+        self.value = value
 
-    def calculate(self):
-        return self._value
+    def calculate(self, frame):
+        return self.value
+
+    def __repr__(self):
+        return 'Node(primitive value {!r})'.format(self.value)
 
 
 class VariableExpression(ExpressionNode):
+    __slots__ = ('name',)
+
     def __init__(self, lineno, name):
         super(VariableExpression, self).__init__(lineno, 'variable')
-        self._name = name
+        self.name = name
 
-    def calculate(self):
-        return self.getvar(self._name).value
+    def calculate(self, frame):
+        if self.hops:
+            frame = frame.up(self.hops)
+        return frame.slots[self.slot]
 
-    # def __repr__(self):
-        # return 'variable {}'.format(self._name)
+    def __repr__(self):
+        return 'Node(variable {})'.format(self.name)
 
 
 class NegateExpression(ExpressionNode):
+    __slots__ = ('expression',)
+    _fields = ('expression',)
+
     def __init__(self, lineno, expression):
         super(NegateExpression, self).__init__(lineno, 'boolean negation')
-        self.add_child(expression)
+        self.expression = self._adopt(expression)
 
-    def calculate(self):
-        value = self._children[0].calculate()
+    def calculate(self, frame):
+        value = self.expression.calculate(frame)
         bool_result = not value.bool()
-        return BooleanValue(bool_result)
+        return boolean_value(bool_result)
 
 
 class BinaryOperationExpression(ExpressionNode):
-    # TODO: avoid checking for sign in all operations
+    __slots__ = ('op', '_operator', 'left', 'right')
+    _fields = ('left', 'right')
+    # operator functions by sign, defined by every subclass
+    OPERATORS = {}
+
     def __init__(self, lineno, op, left, right):
         super(BinaryOperationExpression, self).__init__(lineno, op)
-        self._op = op
-        self.add_child(left)
-        self.add_child(right)
-
-    def _bool_values(self):
-        lvalue = self._children[0].calculate().bool()
-        rvalue = self._children[1].calculate().bool()
-        return lvalue, rvalue
-
-    def _num_values(self):
-        lvalue = self._children[0].calculate().num()
-        rvalue = self._children[1].calculate().num()
-        return lvalue, rvalue
+        self.op = op
+        # bound once, so that the operator is not looked up on evaluation
+        self._operator = self.OPERATORS[op]
+        self.left = self._adopt(left)
+        self.right = self._adopt(right)
 
 
 class BooleanOperationExpression(BinaryOperationExpression):
-    def calculate(self):
-        lvalue, rvalue = self._bool_values()
-        if self._op == '&&':
-            result = lvalue and rvalue
-        elif self._op == '||':
-            result = lvalue or rvalue
-        return BooleanValue(result)
+    __slots__ = ()
+    # both operands are always evaluated
+    OPERATORS = {
+        '&&': lambda lvalue, rvalue: lvalue and rvalue,
+        '||': lambda lvalue, rvalue: lvalue or rvalue,
+    }
+
+    def calculate(self, frame):
+        lvalue = self.left.calculate(frame).bool()
+        rvalue = self.right.calculate(frame).bool()
+        return boolean_value(self._operator(lvalue, rvalue))
 
 
 class ArithmeticOperationExpression(BinaryOperationExpression):
+    __slots__ = ()
     # TODO: add support for '+' as string concatenation
-    def calculate(self):
-        lvalue, rvalue = self._num_values()
-        if self._op == '+':
-            result = lvalue + rvalue
-        elif self._op == '-':
-            result = lvalue - rvalue
-        elif self._op == '*':
-            result = lvalue * rvalue
-        elif self._op == '/':
-            try:
-                result = lvalue / rvalue
-            except ZeroDivisionError:
-                raise DivisionByZeroError(self.lineno)
-        return NumberValue(result)
+    OPERATORS = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '/': operator.div,
+    }
+
+    def calculate(self, frame):
+        lvalue = self.left.calculate(frame).num()
+        rvalue = self.right.calculate(frame).num()
+        try:
+            return number_value(self._operator(lvalue, rvalue))
+        except ZeroDivisionError:
+            raise DivisionByZeroError(self.lineno)
 
 
 class ComparisonExpression(BinaryOperationExpression):
-    def calculate(self):
-        # TODO: make equality comparison work not only for numbers
-        lvalue, rvalue = self._num_values()
-        if self._op == '<':
-            result = lvalue < rvalue
-        elif self._op == '>':
-            result = lvalue > rvalue
-        elif self._op == '<=':
-            result = lvalue <= rvalue
-        elif self._op == '>=':
-            result = lvalue >= rvalue
-        elif self._op == '===':
-            result = lvalue == rvalue
-        elif self._op == '!==':
-            result = lvalue != rvalue
-        return BooleanValue(result)
+    __slots__ = ()
+    # TODO: make equality comparison work not only for numbers
+    OPERATORS = {
+        '<': operator.lt,
+        '>': operator.gt,
+        '<=': operator.le,
+        '>=': operator.ge,
+        '===': operator.eq,
+        '!==': operator.ne,
+    }
+
+    def calculate(self, frame):
+        lvalue = self.left.calculate(frame).num()
+        rvalue = self.right.calculate(frame).num()
+        return boolean_value(self._operator(lvalue, rvalue))
 
 
 class NegativeExpression(ExpressionNode):
+    __slots__ = ('expression',)
+    _fields = ('expression',)
+
     def __init__(self, lineno, expression):
-        super(NegateExpression, self).__init__(lineno, 'negation')
-        self.add_child(expression)
+        super(NegativeExpression, self).__init__(lineno, 'negation')
+        self.expression = self._adopt(expression)
 
-    def calculate(self):
-        value = self._children[0].calculate()
+    def calculate(self, frame):
+        value = self.expression.calculate(frame)
         num_result = -value.num()
-        return NumberValue(num_result)
+        return number_value(num_result)
 
 
 class MemberAccessExpression(ExpressionNode):
+    __slots__ = ('operand', 'name', 'cache')
+    _fields = ('operand',)
+
     def __init__(self, lineno, operand, name):
         super(MemberAccessExpression, self).__init__(lineno, 'member access')
-        self.add_child(operand)
+        self.operand = self._adopt(operand)
         self.name = name
-        self.obj = None
+        self.cache = InlineCache(name)
+
+    def calculate(self, frame):
+        return self.cache.get(self.operand.calculate(frame).obj(self.lineno))
 
-    def calculate(self):
-        value = self._children[0].calculate()
-        self.obj = value.obj(self.lineno)
-        return self.obj.get_member(self.name).value
+    def calculate_bound(self, frame):
+        # also returns the object, which becomes 'this' for method calls
+        obj = self.operand.calculate(frame).obj(self.lineno)
+        return obj, self.cache.get(obj)
 
 
-class FunctionCallExpression(ExpressionNode):
+class FunctionCallExpression(_ListNode, ExpressionNode):
+    # the children are the callee followed by the parameters
+    __slots__ = ('_is_method', 'checked', '_children')
+
     def __init__(self, lineno, operand, params):
         super(FunctionCallExpression, self).__init__(lineno, 'function call')
+        self._is_method = isinstance(operand, MemberAccessExpression)
+        self.checked = True
+        self._children = []
         self.add_child(operand)
         self.add_children(params)
 
-    def calculate(self):
-        func = self._get_func()
-        this = self._get_this()
-        values = [child.calculate() for child in self._children[1:]]
-        return func.call(values, self.lineno, this)
+    def calculate(self, frame):
+        this, func = self._get_func(frame)
+        values = [child.calculate(frame) for child in self._children[1:]]
+        return func.call(values, self.lineno, this, frame, self.checked)
 
-    def _get_func(self):
-        func = self._children[0].calculate().obj(self.lineno)
+    def _get_func(self, frame):
+        operand = self._children[0]
+        if self._is_method:
+            this, value = operand.calculate_bound(frame)
+        else:
+            this, value = None, operand.calculate(frame)
+        func = value.obj(self.lineno)
         if not isinstance(func, FunctionValue):
             raise NotAFunctionError(func, self.lineno)
-        return func
-
-    def _get_this(self):
-        this = None
-        if isinstance(self._children[0], MemberAccessExpression):
-            this = self._children[0].obj
-        return this
+        return this, func
 
 
-class NewInstanceExpression(ExpressionNode):
+class NewInstanceExpression(_ListNode, ExpressionNode):
     # TODO: extract common parts with FunctionCallExpression
+    __slots__ = ('name', 'checked', '_children')
+
     def __init__(self, lineno, name, params):
         super(NewInstanceExpression, self).__init__(lineno, 'new instance')
-        self._name = name
+        self.name = name
+        self.checked = True
+        self._children = []
         self.add_children(params)
 
-    def calculate(self):
-        cls = self.getvar(self._name).value
+    def calculate(self, frame):
+        cls = frame.up(self.hops).slots[self.slot]
         if not isinstance(cls, ClassValue):
-            raise NotAClassError(self._name, self.lineno)
-        params = [child.calculate() for child in self._children]
-        return cls.instantiate(params, self.lineno)
+            raise NotAClassError(self.name, self.lineno)
+        params = [child.calculate(frame) for child in self._children]
+        return cls.instantiate(params, self.lineno, frame, self.checked)
 
 
 class ThisExpression(ExpressionNode):
+    __slots__ = ()
+
     def __init__(self, lineno):
         super(ThisExpression, self).__init__(lineno, 'this')
 
-    def calculate(self):
-        node = self.parent
-        while node is not None:
-            if isinstance(node, ScopeNode):
-                return node.get_this()
-            node = node.parent
+    def calculate(self, frame):
+        return frame.this
 
 
 # Values
 
 
 class LanguageValue(object):
+    __slots__ = ()
     # TODO: supply lineno for all methods
     def bool(self):
         raise NotImplementedError()
@@ -440,6 +508,8 @@ class LanguageValue(object):
 
 
 class LanguageContainerValue(LanguageValue):
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -451,6 +521,8 @@ class LanguageContainerValue(LanguageValue):
 
 
 class BooleanValue(LanguageContainerValue):
+    __slots__ = ()
+
     def bool(self):
         return self.value
 
@@ -466,11 +538,15 @@ class BooleanValue(LanguageContainerValue):
 
 
 class NumberValue(LanguageContainerValue):
+    __slots__ = ()
+
     def num(self):
         return self.value
 
 
 class StringValue(LanguageContainerValue):
+    __slots__ = ()
+
     def num(self):
         try:
             return float(self.value)
@@ -482,9 +558,12 @@ class StringValue(LanguageContainerValue):
 
 
 class ObjectValue(LanguageContainerValue):
-    def __init__(self, lineno, cls, params):
-        members = {var.name : var for var in params}
-        super(ObjectValue, self).__init__(members)
+    # an instance of a class, the values of its fields are kept in a list in
+    # the order given by the shape of the class
+    __slots__ = ('lineno', 'cls')
+
+    def __init__(self, lineno, cls, fields):
+        super(ObjectValue, self).__init__(fields)
         self.lineno = lineno
         self.cls = cls
 
@@ -501,34 +580,33 @@ class ObjectValue(LanguageContainerValue):
         return self
 
     def str(self):
-        return str(self.value)
+        shape = self.cls.shape
+        members = {
+            name: Variable(name, var_type, value)
+            for name, var_type, value in zip(shape.names, shape.types, self.value)
+        }
+        return str(members)
 
-    # TODO: supply lineno
     def get_member(self, name):
-        if name in self.value:
-            return self.value[name]
-        if self.cls is not None and name in self.cls.value:
-            return self.cls.get_member(name)
-        return UndefinedValue()
-
-    def set_member(self, lineno, name, value):
-        var = self.value.get(name)
-        if var is None:
-            cls_name = self.cls.name if self.cls is not None else 'None'
+        offset = self.cls.shape.offsets.get(name)
+        if offset is not None:
+            return self.value[offset]
+        return self.cls.get_member(name)
+
+    def set_member(self, lineno, name, value, check=True):
+        shape = self.cls.shape
+        offset = shape.offsets.get(name)
+        if offset is None:
             # TODO: supply correct line number
-            raise NoMemberError(cls_name, name, lineno)
-        typecheck(self.lineno, name, value, var.type)
-        var.value = value
-
-    def __iter__(self):
-        for name, var in self.value.iteritems():
-            yield var
-        if self.cls is not None:
-            for member in self.cls:
-                yield member
+            raise NoMemberError(self.cls.name, name, lineno)
+        if check:
+            typecheck(self.lineno, name, value, shape.types[offset])
+        self.value[offset] = value
 
 
 class FunctionValue(ObjectValue):
+    __slots__ = ('name', 'params', 'return_type', 'block', 'env')
+
     def __init__(self, lineno, name, params, return_type, block):
         super(FunctionValue, self).__init__(lineno, None, [])
         # TODO: support for checking return types
@@ -538,66 +616,111 @@ class FunctionValue(ObjectValue):
         self.params = params
         self.return_type = return_type
         self.block = block
+        # frame the function was declared in, see closure()
+        self.env = None
+
+    def call(self, values, lineno, this=None, caller=None, check=True):
+        frame = self.new_frame(values, lineno, this, caller, check)
+        if _tracer is not None:
+            return self._call_traced(frame)
+        result = self.block.run(frame)
+        if result is None:
+            return UNDEFINED
+        return result
 
-    def call(self, values, lineno, this=None):
-        self._check_values(values)
-        try:
-            self._run(values, this)
-        except _Return as r:
-            return r.value
-        return UndefinedValue()
+    def _call_traced(self, frame):
+        _tracer(frame, 'call', self)
+        result = self.block.run(frame)
+        if result is None:
+            result = UNDEFINED
+        _tracer(frame, 'return', result)
+        return result
+
+    def closure(self, env):
+        func = copy.copy(self)
+        func.env = env
+        return func
+
+    def get_member(self, name):
+        return UNDEFINED
 
     def gettype(self):
         # TODO: also specify params and return type
         return 'function'
 
+    def new_frame(self, values, lineno, this=None, caller=None, check=True):
+        self._check_values(values, check)
+        frame = Frame(self.block.frame_size, self.env, this, self, caller, lineno)
+        # parameters occupy the first slots of the frame, see resolver
+        frame.slots[:len(values)] = values
+        return frame
+
+    def set_member(self, lineno, name, value, check=True):
+        raise NoMemberError('None', name, lineno)
+
     def str(self):
         return self.gettype()
 
-    def _check_values(self, values):
+    def _check_values(self, values, check=True):
         if len(values) != len(self.params):
             raise ParameterNumberError(
                 self.name, len(self.params), len(values), self.lineno
             )
+        if not check:
+            return
         for value, param in zip(values, self.params):
             typecheck(self.lineno, param.name, value, param.type)
 
-    def _run(self, values, this):
-        scope = {}
-        for value, param in zip(values, self.params):
-            var = Variable(param.name, param.type, value)
-            scope[param.name] = var
-        self.block.update_scope(scope)
-        self.block.set_this(this)
-        self.block.run()
-
 
 class ClassValue(ObjectValue):
-    def __init__(self, lineno, name, members):
-        super(ClassValue, self).__init__(lineno, None, [])
+    # the methods are kept as variables by name
+    __slots__ = ('name', 'members', 'shape', '_methods', 'constructor')
+
+    def __init__(self, lineno, name, members, shape=None):
+        super(ClassValue, self).__init__(lineno, None, {})
         self.name = name
         self.members = members
-        self._fields = [m for m in members if isinstance(m, Variable)]
+        if shape is None:
+            shape = Shape([m for m in members if isinstance(m, Variable)])
+        self.shape = shape
         self._methods = [m for m in members if isinstance(m, FunctionValue)]
-        self._constructor = None
+        self.constructor = None
         self._register_methods()
 
+    def closure(self, env):
+        members = []
+        for member in self.members:
+            if isinstance(member, FunctionValue):
+                member = member.closure(env)
+            members.append(member)
+        # the shape is shared, as the fields are the same
+        return ClassValue(self.lineno, self.name, members, self.shape)
+
+    def get_member(self, name):
+        var = self.value.get(name)
+        if var is None:
+            return UNDEFINED
+        return var.value
+
     def gettype(self):
         # TODO: specify
         return 'class'
 
-    def instantiate(self, values, lineno):
-        result = self._instantiate(lineno)
-        self._constructor.call(values, lineno, result)
+    def allocate(self, lineno):
+        return ObjectValue(lineno, self, [UNDEFINED] * len(self.shape.names))
+
+    def instantiate(self, values, lineno, caller=None, check=True):
+        result = self.allocate(lineno)
+        if _tracer is not None:
+            _tracer(caller, 'allocation', result)
+        self.constructor.call(values, lineno, result, caller, check)
         return result
 
-    def _instantiate(self, lineno):
-        params = []
-        for param in self._fields:
-            var = Variable(param.name, param.type)
-            params.append(var)
-        obj = ObjectValue(lineno, self, params)
-        return obj
+    def set_member(self, lineno, name, value, check=True):
+        raise NoMemberError('None', name, lineno)
+
+    def str(self):
+        return str(self.value)
 
     def _register_methods(self):
         for method in self._methods:
@@ -606,24 +729,27 @@ class ClassValue(ObjectValue):
                 self._register_constructor(method)
             else:
                 var = Variable(method.name, method.gettype(), method)
-                self[method.name] = var
+                self.value[method.name] = var
         self._try_add_constructor()
 
     def _register_constructor(self, method):
-        if self._constructor is not None:
+        if self.constructor is not None:
             raise MultipleConstructorsError(self.name, self.lineno)
-        self._constructor = method
+        self.constructor = method
 
     def _try_add_constructor(self):
-        if self._constructor is None:
+        if self.constructor is None:
             block = ScopeNode(self.lineno, [])
-            self._constructor = FunctionValue(
+            self.constructor = FunctionValue(
                 self.lineno, 'constructor', [], None, block
             )
+            # so that it is resolved and closed over like the declared ones
+            self.members.append(self.constructor)
 
 
 class NullValue(LanguageValue):
-    # TODO: make a singleton
+    __slots__ = ()
+
     def bool(self):
         return False
 
@@ -638,7 +764,8 @@ class NullValue(LanguageValue):
 
 
 class UndefinedValue(LanguageValue):
-    # TODO: make a singleton
+    __slots__ = ()
+
     def bool(self):
         return False
 
@@ -652,6 +779,37 @@ class UndefinedValue(LanguageValue):
         return 'undefined'
 
 
+# Shared values, primitive values are never changed in place.
+# Use these and the factories below instead of creating values directly
+
+
+UNDEFINED = UndefinedValue()
+NULL = NullValue()
+TRUE = BooleanValue(True)
+FALSE = BooleanValue(False)
+
+# 0.0 is left out, as it is equal to -0.0 which is printed differently
+_SMALL_NUMBERS = {
+    float(i): NumberValue(float(i)) for i in xrange(-128, 1024) if i
+}
+
+
+def boolean_value(value):
+    if value:
+        return TRUE
+    return FALSE
+
+
+def number_value(value):
+    # ints come from booleans and are printed differently, so only floats
+    # are shared
+    if type(value) is float:
+        cached = _SMALL_NUMBERS.get(value)
+        if cached is not None:
+            return cached
+    return NumberValue(value)
+
+
 # Auxiliary objects
 
 
@@ -663,6 +821,8 @@ _VALUE_TYPE_MAP = {
 
 
 def typecheck(lineno, name, value, var_type):
+    if var_type == 'any':
+        return
     if isinstance(value, NullValue) or isinstance(value, UndefinedValue):
         return
     cur_type = type(value)
@@ -676,21 +836,172 @@ def typecheck(lineno, name, value, var_type):
     raise TypeMismatchError(name, value, var_type, lineno)
 
 
-class _Return(Exception):
-    def __init__(self, value):
-        self.value = value
+def walk(node):
+    # every node of the subtree, function and method bodies included
+    yield node
+    if isinstance(node, FunctionDeclarationNode):
+        funcs = [node.func]
+    elif isinstance(node, ClassDeclarationNode):
+        funcs = [m for m in node.cls.members if isinstance(m, FunctionValue)]
+    else:
+        funcs = []
+    for func in funcs:
+        for child in walk(func.block):
+            yield child
+    for child in node.iterchildren():
+        for descendant in walk(child):
+            yield descendant
+
+
+class Frame(object):
+    # activation record of a function call or of the program itself
+    __slots__ = ('slots', 'parent', 'this', 'func', 'back', 'lineno')
+
+    def __init__(self, size, parent=None, this=None, func=None, back=None, lineno=None):
+        self.slots = [UNDEFINED] * size
+        self.parent = parent  # frame of the enclosing function
+        self.this = this if this is not None else UNDEFINED
+        self.func = func
+        self.back = back  # calling frame
+        self.lineno = lineno
+
+    def iterstack(self):
+        frame = self
+        while frame is not None:
+            yield frame
+            frame = frame.back
+
+    def up(self, hops):
+        frame = self
+        while hops:
+            frame = frame.parent
+            hops -= 1
+        return frame
+
+    def __repr__(self):
+        name = self.func.name if self.func is not None else '<program>'
+        return 'Frame({}, line {})'.format(name, self.lineno)
 
 
 class Variable(object):
+    __slots__ = ('name', 'type', 'value')
+
     def __init__(self, name, var_type, value=None):
         self.name = name
         self.type = var_type
-        self.value = value if value is not None else UndefinedValue()
+        self.value = value if value is not None else UNDEFINED
 
     def __repr__(self):
         return 'Variable({}, {}, {})'.format(self.name, self.type, self.value)
 
 
+class Shape(object):
+    # layout of the instances of a class: the names and types of the fields,
+    # in the order they are first declared in, and their offsets by name
+    __slots__ = ('names', 'types', 'offsets')
+
+    def __init__(self, fields):
+        self.names = []
+        self.types = []
+        self.offsets = {}
+        for var in fields:
+            offset = self.offsets.get(var.name)
+            if offset is None:
+                self.offsets[var.name] = len(self.names)
+                self.names.append(var.name)
+                self.types.append(var.type)
+            else:
+                # the last declaration wins
+                self.types[offset] = var.type
+
+    def __repr__(self):
+        return 'Shape({})'.format(', '.join(self.names))
+
+
+_UNSEEN = object()
+
+
+class InlineCache(object):
+    # where the member of a given name is found, by the shape of the class of
+    # the object it is read from: the offset of a field, or else the index of
+    # a method of the class. Every class made from the same declaration, see
+    # ClassValue.closure(), has the same shape and its methods in the same
+    # order, and shapes are never changed once created, so entries never go
+    # stale. The first shape seen is checked before the others, its entry
+    # being kept as one tuple, which is read at once, so that threads running
+    # the same program never see half of an entry. Past MAX_CLASSES shapes
+    # the site is megamorphic, no more entries are added and the other
+    # classes get the full lookup
+    __slots__ = ('name', 'hits', 'misses', 'megamorphic', '_first', '_entries')
+    MAX_CLASSES = 4
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.megamorphic = 0  # full lookups after the site became megamorphic
+        self._first = (_UNSEEN, None, None)  # (shape, offset, index)
+        self._entries = {}  # (offset, index) by shape, None if megamorphic
+
+    def get(self, obj):
+        cls = obj.cls
+        if cls is None:
+            # functions and classes, which have no shape
+            self.misses += 1
+            return obj.get_member(self.name)
+        shape, offset, index = self._first
+        if cls.shape is not shape:
+            entries = self._entries
+            entry = entries.get(cls.shape) if entries is not None else None
+            if entry is None:
+                return self._lookup(obj)
+            offset, index = entry
+        self.hits += 1
+        if offset is not None:
+            return obj.value[offset]
+        if index is not None:
+            return cls._methods[index]
+        return UNDEFINED
+
+    def _lookup(self, obj):
+        cls = obj.cls
+        entries = self._entries
+        if entries is None:
+            self.megamorphic += 1
+            return obj.get_member(self.name)
+        self.misses += 1
+        offset = cls.shape.offsets.get(self.name)
+        index = None
+        if offset is None:
+            member = cls.get_member(self.name)
+            for i, method in enumerate(cls._methods):
+                if method is member:
+                    index = i
+        if self._first[0] is _UNSEEN:
+            self._first = (cls.shape, offset, index)
+        elif len(entries) < self.MAX_CLASSES - 1:
+            entries[cls.shape] = (offset, index)
+        else:
+            self._entries = None
+        return obj.get_member(self.name)
+
+    def __repr__(self):
+        return 'InlineCache({}, hits={}, misses={}, megamorphic={})'.format(
+            self.name, self.hits, self.misses, self.megamorphic
+        )
+
+
+def cache_stats(caches):
+    # totals of the counters of the given caches
+    stats = {'sites': 0, 'hits': 0, 'misses': 0, 'megamorphic': 0}
+    for cache in caches:
+        stats['sites'] += 1
+        stats['hits'] += cache.hits
+        stats['misses'] += cache.misses
+        stats['megamorphic'] += cache.megamorphic
+    return stats
+
+
 # Errors
 
 
@@ -730,7 +1041,7 @@ class UndeclaredVariableError(SemanticError):
 class MultipleConstructorsError(SemanticError):
     def __init__(self, cls_name, lineno):
         msg = 'multiple constructors in class {}'.format(cls_name)
-        super(UndeclaredVariableError, self).__init__(msg, lineno)
+        super(MultipleConstructorsError, self).__init__(msg, lineno)
 
 
 class NoMemberError(SemanticError):
@@ -742,7 +1053,7 @@ class NoMemberError(SemanticError):
 class UndeclaredClassError(SemanticError):
     def __init__(self, name, lineno):
         msg = 'specifying undeclared class "{}"'.format(name)
-        super(UndeclaredVariableError, self).__init__(msg, lineno)
+        super(UndeclaredClassError, self).__init__(msg, lineno)
 
 
 class TypeMismatchError(SemanticError):
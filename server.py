@@ -0,0 +1,311 @@
+#! /bin/python
+
+import SocketServer
+import Queue
+import argparse
+import collections
+import json
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import caching
+import parser
+from output import capture
+
+
+# NOTE: a server that runs programs in worker processes, which are started
+# with the lexer and the parser already built, so that a program costs
+# neither the startup of python nor the loading of the tables. Requests and
+# responses are JSON objects, one per line, over a Unix socket or a local
+# TCP port:
+#
+#   {"source": "...", "engine": "tree"}
+#       {"output": "...", "error": null, "elapsed": ..., "queued": ..., "latency": ...}
+#   {"command": "stats"}
+#       {"workers": 4, "queue": 0, "running": 1, "requests": 10, "latency": {...}}
+#
+# output is what the program printed, SemanticErrors included, and error
+# an exception that stopped it, or the timeout. Times are in seconds:
+# elapsed is the time the program ran for, queued the time it waited for a
+# worker and latency the whole time the request took. The latency
+# percentiles are over the last LATENCY_WINDOW requests
+
+SOCKET = caching.path('server.sock')
+HOST = '127.0.0.1'
+TIMEOUT = 30.0
+LATENCY_WINDOW = 1000
+PERCENTILES = [50, 90, 99]
+
+
+class WorkerPool(object):
+    def __init__(self, workers, timeout=TIMEOUT):
+        self.timeout = timeout
+        self.size = workers
+        self.waiting = 0  # requests waiting for a worker
+        self.running = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._idle = Queue.Queue()
+        for _ in xrange(workers):
+            self._idle.put(_Worker())
+
+    def execute(self, source, engine='tree'):
+        start = time.time()
+        with self._lock:
+            self.waiting += 1
+        worker = self._idle.get()
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+        queued = time.time() - start
+        try:
+            output, error, elapsed, worker = worker.execute(source, engine, self.timeout)
+        finally:
+            self._idle.put(worker)
+            latency = time.time() - start
+            with self._lock:
+                self.running -= 1
+                self.requests += 1
+                self._latencies.append(latency)
+        return {
+            'output': output, 'error': error, 'elapsed': elapsed,
+            'queued': queued, 'latency': latency,
+        }
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            result = {
+                'workers': self.size, 'queue': self.waiting,
+                'running': self.running, 'requests': self.requests,
+            }
+        result['latency'] = {
+            'p{}'.format(p): _percentile(latencies, p) for p in PERCENTILES
+        }
+        result['latency']['max'] = latencies[-1] if latencies else None
+        return result
+
+    def stop(self):
+        for _ in xrange(self.size):
+            self._idle.get().stop()
+
+
+class _Worker(object):
+    def __init__(self):
+        self.connection, connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_work, args=(connection,))
+        self.process.daemon = True
+        self.process.start()
+        connection.close()
+
+    def execute(self, source, engine, timeout):
+        # (output, error, time taken, the worker to use next): a worker that
+        # takes too long or dies is replaced
+        start = time.time()
+        try:
+            self.connection.send((source, engine))
+            if self.connection.poll(timeout):
+                output, error, elapsed = self.connection.recv()
+                return output, error, elapsed, self
+            error = 'took more than {}s'.format(timeout)
+        except (EOFError, IOError):
+            error = 'the worker died'
+        self.stop()
+        return '', error, time.time() - start, _Worker()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+def _work(connection):
+    _warm_up()
+    while True:
+        try:
+            source, engine = connection.recv()
+        except EOFError:
+            break
+        connection.send(_execute(source, engine))
+
+
+def _warm_up():
+    # also done by the server before starting the workers, which then
+    # inherit the lexer and the parser
+    import lexis
+    import syntax
+    lexis.get_lexer()
+    syntax.get_analyzer()
+
+
+def _execute(source, engine):
+    # (output, error, time taken) of a program
+    output, error, elapsed = capture(parser.interpret, source, engine)
+    if error is not None:
+        error = '{}: {}'.format(type(error).__name__, error)
+    return output, error, elapsed
+
+
+def _percentile(values, percent):
+    # nearest rank, values being sorted
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+# Server
+
+
+class _Handler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self._respond(json.loads(line))
+            except (ValueError, TypeError, KeyError, AttributeError) as e:
+                response = {'error': 'bad request: {}'.format(e)}
+            self.wfile.write(json.dumps(response) + '\n')
+            self.wfile.flush()
+
+    def _respond(self, request):
+        pool = self.server.pool
+        if request.get('command') == 'stats':
+            return pool.stats()
+        # json gives unicode, sources are byte strings everywhere else
+        source = request['source'].encode('utf-8')
+        return pool.execute(source, str(request.get('engine', 'tree')))
+
+
+class _UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(address, workers, timeout=TIMEOUT):
+    # address is a port or the path of a Unix socket
+    _warm_up()
+    pool = WorkerPool(workers, timeout)
+    if isinstance(address, int):
+        server = _TCPServer((HOST, address), _Handler)
+    else:
+        if os.path.exists(address):
+            os.remove(address)  # left by a server that was killed
+        server = _UnixServer(address, _Handler)
+    server.pool = pool
+    # so that the socket is removed when the server is terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        pool.stop()
+        if not isinstance(address, int) and os.path.exists(address):
+            os.remove(address)
+
+
+# Client
+
+
+class Client(object):
+    def __init__(self, address):
+        if isinstance(address, int):
+            self._socket = socket.create_connection((HOST, address))
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(address)
+        self._file = self._socket.makefile('r+b')
+
+    def request(self, request):
+        self._file.write(json.dumps(request) + '\n')
+        self._file.flush()
+        return json.loads(self._file.readline())
+
+    def run(self, source, engine='tree'):
+        return self.request({'source': source, 'engine': engine})
+
+    def stats(self):
+        return self.request({'command': 'stats'})
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+# Command line
+
+
+def make_argument_parser():
+    argument_parser = argparse.ArgumentParser(
+        description='Runs programs in warm worker processes.'
+    )
+    address = argument_parser.add_mutually_exclusive_group()
+    address.add_argument(
+        '--socket', default=SOCKET,
+        help='path of the Unix socket (default: {})'.format(SOCKET)
+    )
+    address.add_argument('--port', type=int, help='local TCP port, instead of a socket')
+    subparsers = argument_parser.add_subparsers(dest='command')
+
+    serve_parser = subparsers.add_parser('serve', help='start the server')
+    serve_parser.add_argument(
+        '-w', '--workers', type=int, default=0,
+        help='number of worker processes, 0 for one per CPU (default)'
+    )
+    serve_parser.add_argument(
+        '-t', '--timeout', type=float, default=TIMEOUT,
+        help='seconds a program may run for (default: {})'.format(TIMEOUT)
+    )
+    run = subparsers.add_parser('run', help='run programs on the server')
+    run.add_argument(
+        '-e', '--engine', choices=sorted(parser.ENGINES), default='tree'
+    )
+    run.add_argument('files', nargs='+')
+    subparsers.add_parser('stats', help='print the statistics of the server')
+    return argument_parser
+
+
+def main(argv=None):
+    args = make_argument_parser().parse_args(argv)
+    address = args.port if args.port is not None else args.socket
+    if args.command == 'serve':
+        try:
+            serve(address, args.workers or multiprocessing.cpu_count(), args.timeout)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    client = Client(address)
+    try:
+        if args.command == 'stats':
+            print json.dumps(client.stats(), indent=2, sort_keys=True)
+            return 0
+        failed = 0
+        for path in args.files:
+            with open(path) as f:
+                response = client.run(f.read(), args.engine)
+            sys.stdout.write(response['output'])
+            if response['error'] is not None:
+                failed += 1
+                print >>sys.stderr, '{}: {}'.format(path, response['error'])
+            print >>sys.stderr, '{}: {:.1f}ms, {:.1f}ms queued, {:.1f}ms in all'.format(
+                path, response['elapsed'] * 1e3, response['queued'] * 1e3,
+                response['latency'] * 1e3
+            )
+        return 1 if failed else 0
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import re
+
+
+# NOTE: sources can be strings, file objects or mmaps. Files and mmaps are
+# read in chunks, and the text is lexed in segments that end right after a
+# blank or a newline, outside of string literals and comments: no token
+# spans two segments, and the lookbehinds of lexis see a blank at the end of
+# a segment just as the start of the next one. The lexer keeps counting
+# lines from one segment to the next, as input() doesn't reset its line
+# number. The text is scanned once, the state of the scan being kept from
+# one chunk to the next, and what is carried over is at most a chunk, a
+# string literal or comment, or a run of text without blanks. A string or a
+# comment that is still open after a chunk of text is looked for the end of
+# in the rest of the source, which is read and dropped, so that a quote that
+# is never closed doesn't keep the rest of the source buffered. Sources that
+# can't seek are buffered instead
+
+CHUNK_SIZE = 1 << 20
+
+_OPENERS = re.compile(r"'|//")
+_BLANKS = ' \t\n'
+
+
+def segments(source, chunk_size=None):
+    # (offset, text) pairs
+    if isinstance(source, basestring):
+        yield 0, source
+        return
+    chunk_size = chunk_size or CHUNK_SIZE
+    offset = 0  # of pending in the source
+    pending = ''
+    pos = 0  # where the scan goes on in pending
+    cut = 0  # where pending can be cut
+    start = 0  # of the string or comment that is open
+    closer = None  # what ends it, None if there is none
+    ahead = False  # whether it is known to end
+    missing = set()  # closers that the rest of the source doesn't have
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        while True:
+            if closer is not None:
+                end = pending.find(closer, pos)
+                if end >= 0:
+                    pos = cut = end + 1
+                    closer = None
+                    continue
+                pos = len(pending)
+                if closer not in missing:
+                    if ahead or len(pending) - start <= chunk_size:
+                        break
+                    ahead = _comes_later(source, closer, chunk_size)
+                    if ahead:
+                        break
+                    missing.add(closer)
+                # it doesn't end, the opener is lexed as other tokens
+                pos = start + 1
+                closer = None
+                continue
+            match = _OPENERS.search(pending, pos)
+            # a slash at the end may open a comment with the next chunk
+            stop = match.start() if match is not None else len(pending.rstrip('/'))
+            cut = max([cut] + [pending.rfind(blank, pos, stop) + 1 for blank in _BLANKS])
+            pos = stop
+            if match is None:
+                break
+            start = stop
+            closer = "'" if match.group() == "'" else '\n'
+            pos = match.end()
+            ahead = False
+        if cut:
+            yield offset, pending[:cut]
+            offset += cut
+            pending = pending[cut:]
+            pos -= cut
+            start -= cut
+            cut = 0
+    if pending:
+        yield offset, pending
+
+
+def tokens(lexer, source, chunk_size=None):
+    for offset, text in segments(source, chunk_size):
+        lexer.input(text)
+        while True:
+            token = lexer.token()
+            if token is None:
+                break
+            token.lexpos += offset
+            yield token
+
+
+class ChunkedLexer(object):
+    # the lexer as the parser sees it, over a whole source
+    def __init__(self, lexer, source, chunk_size=None):
+        self.lexer = lexer
+        self._tokens = tokens(lexer, source, chunk_size)
+
+    @property
+    def lineno(self):
+        return self.lexer.lineno
+
+    @property
+    def errors(self):
+        return self.lexer.errors
+
+    @errors.setter
+    def errors(self, errors):
+        self.lexer.errors = errors
+
+    def token(self):
+        return next(self._tokens, None)
+
+
+def _comes_later(source, text, chunk_size):
+    # whether text is in the rest of source, which is read from where it is
+    # and set back. True if source can't seek, so that it is buffered
+    try:
+        position = source.tell()
+    except (AttributeError, IOError):
+        return True
+    try:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return False
+            if text in chunk:
+                return True
+    finally:
+        source.seek(position)
@@ -1,6 +1,9 @@
-from ply import yacc
+import sys
+import threading
 
 import lexis
+import output
+import tables
 from lexis import tokens, literals
 from semantics import *
 
@@ -145,11 +148,11 @@ def p_primitive_boolean(p):
     '''primitive : TRUE
                 | FALSE'''
     value = p[1] == 'true'
-    p[0] = BooleanValue(value)
+    p[0] = boolean_value(value)
 
 def p_primitive_number(p):
     "primitive : NUMBER"
-    p[0] = NumberValue(p[1])
+    p[0] = number_value(p[1])
 
 def p_operand_string(p):
     "primitive : STRING"
@@ -157,11 +160,11 @@ def p_operand_string(p):
 
 def p_primitive_null(p):
     "primitive : NULL"
-    p[0] = NullValue()
+    p[0] = NULL
 
 def p_primitive_undefined(p):
     "primitive : UNDEFINED"
-    p[0] = UndefinedValue()
+    p[0] = UNDEFINED
 
 def p_operand_complex(p):
     "operand : '(' expression ')'"
@@ -299,10 +302,41 @@ def p_empty(p):
 def p_error(p):
     # TODO: it's possible to clarify error based on token type
     if p is None:
-        print 'Syntax Error: unexpected end of file'
-    print "Syntax error on line {}. Unexpected token of type '{}': {}".format(
+        output.write('Syntax Error: unexpected end of file')
+        # there's no token to reach the lexer through, see parse()
+        if _parsing.lexer is not None:
+            _parsing.lexer.errors += 1
+        return
+    # the parser sets the lexer of the token, see lexis
+    p.lexer.errors += 1
+    output.write("Syntax error on line {}. Unexpected token of type '{}': {}".format(
         p.lineno, p.type, p.value
-    )
+    ))
 
 
-analyzer = yacc.yacc()
+class _Parsing(threading.local):
+    lexer = None
+
+
+_analyzer = None
+_parsing = _Parsing()
+
+
+def parse(analyzer, source, lexer):
+    # analyzer.parse(), errors being counted on lexer, see p_error(). The
+    # lexer is kept for the thread while it parses, as PLY gives p_error()
+    # no token at the end of the source
+    previous = _parsing.lexer
+    _parsing.lexer = lexer
+    try:
+        return analyzer.parse(source, lexer=lexer)
+    finally:
+        _parsing.lexer = previous
+
+
+def get_analyzer():
+    # built on first use, see tables
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = tables.build_parser(sys.modules[__name__], lexis)
+    return _analyzer
@@ -0,0 +1,81 @@
+import hashlib
+import imp
+import os
+import shutil
+import tempfile
+
+import ply
+from ply import lex, yacc
+
+import caching
+
+
+# NOTE: lexer and parser tables are generated once and kept in the cache
+# directory, in modules named after a hash of the grammar sources and the
+# version of PLY, so that a changed grammar gets tables of its own. Once they
+# exist, the lexer and the parser are built from them without validating the
+# grammar again. Nothing is written to the working directory, and no debug
+# files are written at all. Building them prints nothing either: PLY warns
+# about the COMMENT token, which is discarded by the lexer, and errors in
+# the grammar are raised anyway
+
+
+def build_lexer(module):
+    name = 'lextab_' + _key([module])
+    tables = _load(name)
+    if tables is not None:
+        return lex.lex(module=module, optimize=True, lextab=tables)
+    lexer = lex.lex(module=module, errorlog=lex.NullLogger())
+    _generate(name, lambda outputdir: lexer.writetab(name, outputdir))
+    return lexer
+
+
+def build_parser(module, lexis_module):
+    # the tokens come from the lexer module, so it is a part of the key too
+    name = 'parsetab_' + _key([module, lexis_module])
+    tables = _load(name)
+    if tables is not None:
+        return yacc.yacc(module=module, optimize=True, tabmodule=tables)
+    return _generate(name, lambda outputdir: yacc.yacc(
+        module=module, debug=False, tabmodule=name, outputdir=outputdir,
+        errorlog=yacc.NullLogger()
+    ))
+
+
+def _key(modules):
+    digest = hashlib.sha1(ply.__version__)
+    for module in modules:
+        with open(os.path.splitext(module.__file__)[0] + '.py', 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _load(name):
+    path = caching.path(name + '.py')
+    if not os.path.exists(path):
+        return None
+    try:
+        return imp.load_source(name, path)
+    except (IOError, ImportError, SyntaxError):
+        return None
+
+
+def _generate(name, build):
+    # tables are written by PLY into a directory of their own first, as it
+    # doesn't replace files atomically
+    outputdir = tempfile.mkdtemp()
+    try:
+        result = build(outputdir)
+        _store(name, os.path.join(outputdir, name + '.py'))
+        return result
+    finally:
+        shutil.rmtree(outputdir, ignore_errors=True)
+
+
+def _store(name, path):
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+    except IOError:
+        return  # PLY only warns when it can't write the tables
+    caching.store(name + '.py', lambda f: f.write(source))
@@ -0,0 +1,18 @@
+let x: number = 1;
+if (x === 1) {
+    let x: string = 'inner';
+    console.log(x);
+}
+console.log(x);
+let n: number = 0;
+while (n < 3) {
+    let y: number;
+    console.log(y);
+    y = n;
+    n = n + 1;
+}
+let t: boolean = true && false || true;
+console.log(t);
+console.log(null);
+console.log(undefined);
+console.log('abc');
@@ -0,0 +1,41 @@
+class Point {
+    x: number;
+    y: number;
+
+    constructor(x: number, y: number) {
+        this.x = x;
+        this.y = y;
+    }
+
+    sum(): number {
+        return this.x + this.y;
+    }
+}
+
+class Box {
+    w: number;
+    y: number;
+    x: number;
+
+    constructor(x: number, y: number) {
+        this.x = x;
+        this.y = y;
+        this.w = 0;
+    }
+
+    sum(): number {
+        return this.x * this.y;
+    }
+}
+
+function total(shape: any): number {
+    return shape.x + shape.y + shape.sum();
+}
+
+let i: number = 0;
+let s: number = 0;
+while (i < 200) {
+    s = s + total(new Point(i, 1)) + total(new Box(i, 2));
+    i = i + 1;
+}
+console.log(s);
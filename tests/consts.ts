@@ -0,0 +1,26 @@
+let a: number = 1 + 2 * 3;
+console.log(a);
+console.log(!true);
+console.log(1 < 2 && 3 >= 4);
+console.log(-(2 + 3));
+let k: number = 10;
+let t: number = k * 2;
+console.log(t);
+function early(): number {
+    return late;
+}
+console.log(early());
+let late: number = 5;
+console.log(early());
+let r: number = 1;
+r = r + 1;
+console.log(r);
+let i: number = 0;
+while (i < 3) {
+    let c: number = 2;
+    i = i + c - 1;
+}
+console.log(i);
+let s: string = 'ab';
+console.log(s);
+console.log(1 / 0);
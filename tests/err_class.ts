@@ -0,0 +1 @@
+let v: Missing;
@@ -0,0 +1,3 @@
+let d: number = 1;
+console.log(d);
+console.log(d / 0);
@@ -0,0 +1,3 @@
+let a: number = 1;
+console.log(a) #;
+console.log(a + 1);
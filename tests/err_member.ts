@@ -0,0 +1,7 @@
+class P {
+    x: number;
+}
+let p: P = new P();
+p.x = 3;
+console.log(p.x);
+p.y = 4;
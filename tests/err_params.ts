@@ -0,0 +1,4 @@
+function f(a: number): number {
+    return a;
+}
+console.log(f(1, 2));
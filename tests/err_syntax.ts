@@ -0,0 +1,3 @@
+let a: number = 1;
+let b: number = ;
+console.log(a);
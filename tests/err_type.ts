@@ -0,0 +1,3 @@
+let s: string = 'a';
+console.log(s);
+s = 5;
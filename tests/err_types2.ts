@@ -0,0 +1,12 @@
+class P {
+    x: number;
+    constructor(x: number) {
+        this.x = x;
+    }
+    set(v: string): number {
+        return 0;
+    }
+}
+let p: P = new P(1);
+console.log(p.x);
+p.x = 'no';
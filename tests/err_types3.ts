@@ -0,0 +1,8 @@
+class P {
+    x: number;
+    constructor(x: number) {
+        this.x = x;
+    }
+}
+console.log('before');
+let p: P = new P('s');
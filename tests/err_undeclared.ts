@@ -0,0 +1,2 @@
+console.log('before');
+console.log(z);
@@ -0,0 +1,10 @@
+let i: number = 0;
+let s: number = 0;
+while (i < 10) {
+    s = s + i * 2;
+    i = i + 1;
+}
+console.log(s);
+console.log(1 + 2 * 3);
+console.log(!true);
+console.log(10 / 4);
@@ -0,0 +1,20 @@
+class P {
+    x: number;
+    x: string;
+    y: number;
+    constructor() {
+        this.y = 2;
+    }
+    y(): number {
+        return 1;
+    }
+    get(): number {
+        return this.y;
+    }
+}
+let p: P = new P();
+p.x = 'str';
+console.log(p);
+console.log(p.get());
+console.log(p.z);
+console.log(P);
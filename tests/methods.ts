@@ -0,0 +1,30 @@
+class Vector {
+    x: number;
+    y: number;
+
+    constructor(x: number, y: number) {
+        this.x = x;
+        this.y = y;
+    }
+
+    dot(other: Vector): number {
+        if (1 < 2) {
+            return this.x * other.x + this.y * other.y;
+        }
+        return 0;
+    }
+}
+
+let scale: number = 10;
+
+function scaled(v: Vector): Vector {
+    let nx: number = v.x * scale;
+    let ny: number = v.y * scale;
+    return new Vector(nx, ny);
+}
+
+let a: Vector = new Vector(1, 2);
+let b: Vector = scaled(a);
+console.log(b.x);
+console.log(a.dot(b));
+console.log(a);
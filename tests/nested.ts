@@ -0,0 +1,31 @@
+let total: number = 0;
+
+function counter(start: number): number {
+    let count: number = start;
+    function bump(by: number): number {
+        count = count + by;
+        total = total + 1;
+        return count;
+    }
+    bump(1);
+    bump(2);
+    return count;
+}
+
+console.log(counter(10));
+console.log(counter(0));
+console.log(total);
+
+function early(n: number): string {
+    while (n > 0) {
+        if (n === 3) {
+            return 'three';
+        }
+        n = n - 1;
+    }
+    return 'none';
+}
+console.log(early(5));
+console.log(early(2));
+let big: number = Infinity;
+console.log(big);
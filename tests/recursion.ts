@@ -0,0 +1,46 @@
+function fact(n: number): number {
+    if (n < 2) {
+        return 1;
+    }
+    let m: number = n - 1;
+    let r: number = fact(m);
+    return n * r;
+}
+console.log(fact(10));
+
+function isEven(n: number): boolean {
+    if (n === 0) {
+        return true;
+    }
+    let m: number = n - 1;
+    return isOdd(m);
+}
+
+function isOdd(n: number): boolean {
+    if (n === 0) {
+        return false;
+    }
+    let m: number = n - 1;
+    return isEven(m);
+}
+console.log(isEven(10));
+console.log(isOdd(7));
+let neg: number = -5;
+console.log(neg);
+
+class Counter {
+    count: number;
+
+    constructor() {
+        this.count = 0;
+    }
+
+    add(n: number): Counter {
+        this.count = this.count + n;
+        return this;
+    }
+}
+let c: Counter = new Counter();
+c.add(2);
+let c2: Counter = c.add(3);
+console.log(c2.count);
@@ -0,0 +1,29 @@
+class P {
+    x: number;
+    name: string;
+    constructor(x: number, name: string) {
+        this.x = x;
+        this.name = name;
+    }
+    move(d: number): number {
+        this.x = this.x + d;
+        return this.x;
+    }
+}
+function id(v: any): any {
+    return v;
+}
+let p: P = new P(1, 'a');
+console.log(p.move(2));
+let q: any = 5;
+q = 'str';
+console.log(q);
+console.log(id(3));
+let u: number = undefined;
+u = null;
+console.log(u);
+let n: number = p.x + 1;
+console.log(n);
+p.name = 'b';
+console.log(p.name);
+let w: string = id(7);
@@ -0,0 +1,15 @@
+let z: number = 0;
+z = -z;
+console.log(z);
+console.log(-0);
+console.log(true + true);
+console.log(5 - 5);
+let i: number = 0;
+let b: boolean = false;
+while (i < 3) {
+    b = i < 2;
+    console.log(b);
+    i = i + 0.5 + 0.5;
+}
+console.log(null);
+console.log(undefined);
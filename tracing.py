@@ -0,0 +1,28 @@
+import semantics
+
+
+# NOTE: hooks in the spirit of sys.settrace(). A tracer is called as
+# tracer(frame, event, arg), frame being the semantics.Frame the event
+# happens in:
+#
+#   'call'        a function is called, arg is the FunctionValue and frame
+#                 the new one
+#   'return'      it returns, arg is the value
+#   'line'        a statement of a block is about to run, arg is the node
+#   'allocation'  an instance is created, before its constructor runs, arg
+#                 is the ObjectValue
+#   'print'       a value is printed, arg is the value
+#
+# Events come from the tree engine: ScopeNode.run(), PrintNode.run(),
+# FunctionValue.call() and ClassValue.instantiate() check for a tracer, and
+# run their traced variant if one is set. Nothing is swapped, so that the
+# profiler, which wraps methods, can be enabled and disabled in any order
+
+
+def settrace(tracer):
+    # tracer is None to remove the current one
+    semantics._tracer = tracer
+
+
+def gettrace():
+    return semantics._tracer
@@ -0,0 +1,491 @@
+import hashlib
+import marshal
+import os
+
+import caching
+import output
+from semantics import *
+
+
+# NOTE: code objects are cached by source, so that a cached program is run
+# without lexing, parsing and generating code again. The key covers the
+# sources of the modules that decide the code, down to the slots, the
+# folded constants and the skipped checks. As with trees, see astcache, only
+# the code of sources without errors is stored, and entries are evicted in
+# the same way
+SUFFIX = '.bin'
+MAX_SIZE = 64 << 20
+MAX_AGE = 30 * 24 * 60 * 60
+
+_SOURCES = [
+    'lexis.py', 'syntax.py', 'semantics.py', 'resolver.py', 'optimizer.py',
+    'checker.py', 'transpiler.py',
+]
+
+_key_prefix = None
+
+# NOTE: a variable becomes a python variable named after its (depth, slot)
+# pair. Program-level variables are globals, and variables of a function
+# that are assigned from a nested function are kept in one-element lists
+# ('cells'), as python 2 cannot rebind names of an enclosing function
+
+
+class _Function(FunctionValue):
+    # a function value backed by a generated python function
+    __slots__ = ('_func',)
+
+    def __init__(self, lineno, name, params, func):
+        super(FunctionValue, self).__init__(lineno, None, [])
+        self.name = name
+        self.params = params
+        self.return_type = None
+        self._func = func
+
+    def call(self, values, lineno, this=None, caller=None, check=True):
+        self._check_values(values, check)
+        if this is None:
+            this = UNDEFINED
+        result = self._func(this, *values)
+        if result is None:
+            return UNDEFINED
+        return result
+
+
+def _call(func, values, lineno, check):
+    return func.call(values, lineno, None, None, check)
+
+
+def _call_method(bound, values, lineno, check):
+    this, func = bound
+    return func.call(values, lineno, this, None, check)
+
+
+def _checked(lineno, name, value, var_type):
+    typecheck(lineno, name, value, var_type)
+    return value
+
+
+def _class(value, name, lineno):
+    if not isinstance(value, ClassValue):
+        raise NotAClassError(name, lineno)
+    return value
+
+
+def _divide(lvalue, rvalue, lineno):
+    try:
+        return number_value(lvalue.num() / rvalue.num())
+    except ZeroDivisionError:
+        raise DivisionByZeroError(lineno)
+
+
+def _function(value, lineno):
+    func = value.obj(lineno)
+    if not isinstance(func, FunctionValue):
+        raise NotAFunctionError(func, lineno)
+    return func
+
+
+def _method(value, cache, lineno):
+    this = value.obj(lineno)
+    return this, _function(cache.get(this), lineno)
+
+
+_RUNTIME = {
+    'FALSE': FALSE,
+    'NULL': NULL,
+    'TRUE': TRUE,
+    'UNDEFINED': UNDEFINED,
+    'ClassValue': ClassValue,
+    'InlineCache': InlineCache,
+    'Shape': Shape,
+    'StringValue': StringValue,
+    'Variable': Variable,
+    '_Function': _Function,
+    '_call': _call,
+    '_call_method': _call_method,
+    '_checked': _checked,
+    '_class': _class,
+    '_divide': _divide,
+    '_function': _function,
+    '_method': _method,
+    'boolean_value': boolean_value,
+    'number_value': number_value,
+}
+
+_EQUALITY_OPS = {
+    '===': '==',
+    '!==': '!=',
+}
+
+
+class _FunctionContext(object):
+    def __init__(self, depth):
+        self.depth = depth
+        self.locals = set()  # (depth, slot) of variables of the function
+
+
+class Transpiler(object):
+    def __init__(self):
+        self._lines = []
+        self._indent = 0
+        self._consts = []
+        self._caches = []  # member names, one inline cache per site
+        self._shapes = []  # field lists, one shape per class declaration
+        self._func_count = 0
+        self._cells = set()
+        self._function = None
+        self._globals = []
+
+    def transpile(self, root):
+        self._cells = _find_cells(root)
+        self._globals = [_name((0, slot)) for slot in xrange(root.frame_size)]
+        self._function = _FunctionContext(0)
+        self._line('def _program():')
+        self._block_body(root, [])
+        self._function = None
+        self._line('_program()')
+        consts = ['k{} = {}'.format(i, c) for i, c in enumerate(self._consts)]
+        caches = ['c{} = InlineCache({!r})'.format(i, n) for i, n in enumerate(self._caches)]
+        shapes = ['s{} = Shape([{}])'.format(i, f) for i, f in enumerate(self._shapes)]
+        return '\n'.join(consts + caches + shapes + self._lines) + '\n'
+
+    # Output
+
+    def _line(self, line):
+        self._lines.append('    ' * self._indent + line)
+
+    def _const(self, value):
+        literal = _literal(value)
+        if literal not in self._consts:
+            self._consts.append(literal)
+        return 'k{}'.format(self._consts.index(literal))
+
+    def _cache(self, name):
+        self._caches.append(name)
+        return 'c{}'.format(len(self._caches) - 1)
+
+    def _shape(self, fields):
+        # shared by the classes a declaration makes, see InlineCache
+        self._shapes.append(fields)
+        return 's{}'.format(len(self._shapes) - 1)
+
+    def _function_name(self, name):
+        self._func_count += 1
+        return '_f{}_{}'.format(self._func_count, name.replace('$', '_'))
+
+    # Variables
+
+    def _load(self, node):
+        key = (node.binding.depth, node.binding.slot)
+        if key in self._cells:
+            return _name(key) + '[0]'
+        return _name(key)
+
+    def _block_body(self, block, params):
+        # body of a generated python function: all of the variables are
+        # set up first, as they may be read before their declaration is run
+        self._indent += 1
+        if self._globals:
+            self._line('global ' + ', '.join(self._globals))
+        start = len(self._lines)
+        self._statements(block)
+        body = self._lines[start:]
+        del self._lines[start:]
+        for key in sorted(self._function.locals):
+            name = _name(key)
+            if key in params:
+                if key in self._cells:
+                    self._line('{0} = [{0}]'.format(name))
+            elif key in self._cells:
+                self._line('{} = [UNDEFINED]'.format(name))
+            else:
+                self._line('{} = UNDEFINED'.format(name))
+        self._lines.extend(body)
+        self._indent -= 1
+
+    def _statements(self, block):
+        start = len(self._lines)
+        for child in block.iterchildren():
+            self._statement(child)
+        if len(self._lines) == start:
+            self._line('pass')
+
+    def _declare(self, node):
+        self._function.locals.add((node.binding.depth, node.binding.slot))
+
+    def _def_function(self, func):
+        name = self._function_name(func.name)
+        outer = self._function
+        self._function = _FunctionContext(outer.depth + 1)
+        # parameters occupy the first slots, see resolver
+        params = [(self._function.depth, i) for i in xrange(len(func.params))]
+        self._function.locals.update(params)
+        args = ['this'] + [_name(key) for key in params]
+        self._line('def {}({}):'.format(name, ', '.join(args)))
+        self._block_body(func.block, params)
+        self._function = outer
+        return '_Function({}, {!r}, [{}], {})'.format(
+            func.lineno, func.name, ', '.join(
+                'Variable({!r}, {!r})'.format(p.name, p.type) for p in func.params
+            ), name
+        )
+
+    # Statements
+
+    def _statement(self, node):
+        getattr(self, '_transpile_' + type(node).__name__)(node)
+
+    def _transpile_ScopeNode(self, node):
+        self._statements(node)
+
+    def _transpile_ExpressionStatementNode(self, node):
+        self._line(self._expression(next(node.iterchildren())))
+
+    def _transpile_VariableAssignmentNode(self, node):
+        self._assign(node, self._expression(next(node.iterchildren())))
+
+    def _transpile_DeclaredVariableAssignmentNode(self, node):
+        expression, var_decl = node.iterchildren()
+        self._statement(var_decl)
+        self._assign(node, self._expression(expression))
+
+    def _assign(self, node, expression):
+        if not node.checked:
+            self._line('{} = {}'.format(self._load(node), expression))
+            return
+        self._line('{} = _checked({}, {!r}, {}, {!r})'.format(
+            self._load(node), node.lineno, node.name, expression, node.binding.type
+        ))
+
+    def _transpile_MemberAssignmentNode(self, node):
+        member_node, expression = node.iterchildren()
+        operand = self._expression(next(member_node.iterchildren()))
+        self._line('{}.obj({}).set_member({}, {!r}, {}, {})'.format(
+            operand, node.lineno, node.lineno, member_node.name,
+            self._expression(expression), node.checked
+        ))
+
+    def _transpile_FunctionDeclarationNode(self, node):
+        self._declare(node)
+        value = self._def_function(node.func)
+        self._line('{} = {}'.format(self._load(node), value))
+
+    def _transpile_ReturnNode(self, node):
+        self._line('return ' + self._expression(next(node.iterchildren())))
+
+    def _transpile_ClassDeclarationNode(self, node):
+        self._declare(node)
+        cls = node.cls
+        members = []
+        fields = []
+        for member in cls.members:
+            if isinstance(member, FunctionValue):
+                members.append(self._def_function(member))
+            else:
+                members.append('Variable({!r}, {!r})'.format(member.name, member.type))
+                fields.append(members[-1])
+        self._line('{} = ClassValue({}, {!r}, [{}], {})'.format(
+            self._load(node), cls.lineno, cls.name, ', '.join(members),
+            self._shape(', '.join(fields))
+        ))
+
+    def _transpile_PrintNode(self, node):
+        self._line('_write({}.str())'.format(
+            self._expression(next(node.iterchildren()))
+        ))
+
+    def _transpile_IfNode(self, node):
+        children = list(node.iterchildren())
+        self._line('if {}:'.format(self._test(children[0])))
+        self._nested(children[1])
+        if len(children) == 3:
+            self._line('else:')
+            self._nested(children[2])
+
+    def _transpile_WhileLoopNode(self, node):
+        condition, block = node.iterchildren()
+        self._line('while {}:'.format(self._test(condition)))
+        self._nested(block)
+
+    def _nested(self, block):
+        self._indent += 1
+        self._statement(block)
+        self._indent -= 1
+
+    def _transpile_VariableDeclarationNode(self, node):
+        self._declare(node)
+        self._line('{} = UNDEFINED'.format(self._load(node)))
+
+    # Expressions
+
+    def _expression(self, node):
+        return getattr(self, '_transpile_' + type(node).__name__)(node)
+
+    def _test(self, node):
+        # conditions are evaluated straight to python booleans where possible
+        if isinstance(node, ComparisonExpression):
+            return self._comparison(node)
+        return '{}.bool()'.format(self._expression(node))
+
+    def _transpile_PrimitiveValueExpression(self, node):
+        return self._const(node.value)
+
+    def _transpile_VariableExpression(self, node):
+        return self._load(node)
+
+    def _transpile_NegateExpression(self, node):
+        return 'boolean_value(not {}.bool())'.format(
+            self._expression(next(node.iterchildren()))
+        )
+
+    def _transpile_NegativeExpression(self, node):
+        return 'number_value(-{}.num())'.format(
+            self._expression(next(node.iterchildren()))
+        )
+
+    def _transpile_BooleanOperationExpression(self, node):
+        # both operands are always evaluated, as in the tree walker
+        left, right = [self._expression(c) for c in node.iterchildren()]
+        op = '&' if node.op == '&&' else '|'
+        return 'boolean_value({}.bool() {} {}.bool())'.format(left, op, right)
+
+    def _transpile_ArithmeticOperationExpression(self, node):
+        if node.op == '/':
+            left, right = [self._expression(c) for c in node.iterchildren()]
+            return '_divide({}, {}, {})'.format(left, right, node.lineno)
+        left, right = [self._num(c) for c in node.iterchildren()]
+        return 'number_value({} {} {})'.format(left, node.op, right)
+
+    def _transpile_ComparisonExpression(self, node):
+        return 'boolean_value({})'.format(self._comparison(node))
+
+    def _comparison(self, node):
+        left, right = [self._num(c) for c in node.iterchildren()]
+        op = _EQUALITY_OPS.get(node.op, node.op)
+        return '({} {} {})'.format(left, op, right)
+
+    def _num(self, node):
+        # number literals are used as python floats right away
+        if isinstance(node, PrimitiveValueExpression):
+            if isinstance(node.value, NumberValue):
+                literal = _float_literal(node.value.value)
+                return '({})'.format(literal) if literal.startswith('-') else literal
+        return '{}.num()'.format(self._expression(node))
+
+    def _transpile_MemberAccessExpression(self, node):
+        operand = self._expression(next(node.iterchildren()))
+        return '{}.get({}.obj({}))'.format(
+            self._cache(node.name), operand, node.lineno
+        )
+
+    def _transpile_FunctionCallExpression(self, node):
+        children = list(node.iterchildren())
+        callee = children[0]
+        values = '[{}]'.format(', '.join(self._expression(c) for c in children[1:]))
+        if isinstance(callee, MemberAccessExpression):
+            operand = self._expression(next(callee.iterchildren()))
+            cache = self._cache(callee.name)
+            bound = '_method({}, {}, {})'.format(operand, cache, node.lineno)
+            return '_call_method({}, {}, {}, {})'.format(
+                bound, values, node.lineno, node.checked
+            )
+        func = '_function({}, {})'.format(self._expression(callee), node.lineno)
+        return '_call({}, {}, {}, {})'.format(func, values, node.lineno, node.checked)
+
+    def _transpile_NewInstanceExpression(self, node):
+        cls = '_class({}, {!r}, {})'.format(self._load(node), node.name, node.lineno)
+        values = ', '.join(self._expression(c) for c in node.iterchildren())
+        return '{}.instantiate([{}], {}, None, {})'.format(
+            cls, values, node.lineno, node.checked
+        )
+
+    def _transpile_ThisExpression(self, node):
+        if self._function.depth == 0:
+            return 'UNDEFINED'
+        return 'this'
+
+
+def _float_literal(number):
+    if number != number or number in (float('inf'), float('-inf')):
+        return "float('{}')".format(number)
+    return repr(number)
+
+
+def _literal(value):
+    if isinstance(value, NumberValue):
+        return 'number_value({})'.format(_float_literal(value.value))
+    if isinstance(value, StringValue):
+        return 'StringValue({!r})'.format(value.value)
+    if isinstance(value, BooleanValue):
+        return 'TRUE' if value.value else 'FALSE'
+    if isinstance(value, NullValue):
+        return 'NULL'
+    return 'UNDEFINED'
+
+
+def _find_cells(root):
+    # variables of functions that are assigned from nested functions
+    cells = set()
+    for node in walk(root):
+        if isinstance(node, VariableAssignmentNode):
+            if node.hops and node.binding.depth:
+                cells.add((node.binding.depth, node.binding.slot))
+    return cells
+
+
+def _name(key):
+    return 'v{}_{}'.format(*key)
+
+
+def transpile(root):
+    return Transpiler().transpile(root)
+
+
+def compile_program(root):
+    return compile(transpile(root), '<program>', 'exec')
+
+
+def execute(code, values=()):
+    # values are the ones of the first variables of the program, see
+    # resolver.resolve(). What it prints goes to the sink of the thread as
+    # it is when the run starts
+    namespace = dict(_RUNTIME)
+    namespace['_write'] = output.current().write
+    for slot, value in enumerate(values):
+        namespace[_name((0, slot))] = value
+    try:
+        exec code in namespace
+    finally:
+        output.flush()
+
+
+def load(data):
+    # the code of the source, None if it isn't cached
+    path = caching.path(_key(data) + SUFFIX)
+    try:
+        with open(path, 'rb') as f:
+            code = marshal.load(f)
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+    try:
+        os.utime(path, None)  # the age is the time since the last use
+    except OSError:
+        pass
+    return code
+
+
+def store(data, code):
+    caching.store(_key(data) + SUFFIX, lambda f: marshal.dump(code, f))
+    caching.evict(SUFFIX, MAX_SIZE, MAX_AGE)
+
+
+def _key(data):
+    global _key_prefix
+    if _key_prefix is None:
+        _key_prefix = caching.sources_digest(_SOURCES)
+    return hashlib.sha1(_key_prefix + data).hexdigest()
+
+
+def run(root):
+    execute(compile_program(root))
+
@@ -0,0 +1,376 @@
+import operator
+
+import output
+from bytecode import *
+from semantics import (
+    ClassValue, DivisionByZeroError, Frame, FunctionValue, NotAClassError,
+    NotAFunctionError, NumberValue, ObjectValue, boolean_value, number_value,
+    typecheck
+)
+
+
+# NOTE: in CPython, dispatching an instruction of the stack machine costs
+# about as much as a node of the tree walker, so common sequences of
+# instructions are decoded into superinstructions, which do in one dispatch
+# what takes three or four: a comparison of a variable with a number and the
+# jump that follows it, an operation on a variable and a number, or two
+# variables, and the store of its result, see _fuse(). Superinstructions
+# only exist in decoded code, bytecode doesn't have them. Compiling makes
+# programs that run once slower, see benchmarks/engines.py
+
+# superinstructions, numbered below the opcodes so that they are checked
+# first. Operations are given as (function, wrapper of the result, ...)
+JUMP_UNLESS_SLOT_CONST = -1  # (function, slot, number, target)
+BINARY_SLOT_CONST_STORE = -2  # (function, wrapper, slot, number, slot)
+BINARY_SLOT_CONST = -3  # (function, wrapper, slot, number)
+BINARY_CONST_STORE = -4  # (function, wrapper, number, slot)
+BINARY_CONST = -5  # (function, wrapper, number)
+BINARY_SLOT_SLOT_STORE = -6  # (function, wrapper, slot, slot, slot)
+BINARY_SLOT_SLOT = -7  # (function, wrapper, slot, slot)
+STORE_CONST = -8  # (value, slot)
+RETURN_SLOT = -9  # slot
+LOAD_OUTER_FUNCTION = -10  # (hops, slot, line number)
+
+# the operations that can't fail, DIV only with a number other than 0
+_OPERATIONS = {
+    ADD: (operator.add, number_value),
+    SUB: (operator.sub, number_value),
+    MUL: (operator.mul, number_value),
+    DIV: (operator.div, number_value),
+    LT: (operator.lt, boolean_value),
+    GT: (operator.gt, boolean_value),
+    LE: (operator.le, boolean_value),
+    GE: (operator.ge, boolean_value),
+    EQ: (operator.eq, boolean_value),
+    NE: (operator.ne, boolean_value),
+}
+
+_COMPARISONS = {
+    JUMP_UNLESS_LT: operator.lt,
+    JUMP_UNLESS_GT: operator.gt,
+    JUMP_UNLESS_LE: operator.le,
+    JUMP_UNLESS_GE: operator.ge,
+    JUMP_UNLESS_EQ: operator.eq,
+    JUMP_UNLESS_NE: operator.ne,
+}
+
+
+class VM(object):
+    def __init__(self, bodies):
+        # (instructions, lines) of the function bodies by block node, see
+        # decode()
+        self._bodies = {block: decode(code) for block, code in bodies.iteritems()}
+        # the same for the code run by execute(), which can be run again
+        self._decoded = {}
+
+    def call(self, func, values, lineno, this, caller, check=True):
+        frame = func.new_frame(values, lineno, this, caller, check)
+        instructions, lines = self._bodies[func.block]
+        return self._execute(instructions, lines, frame)
+
+    def execute(self, code, frame):
+        decoded = self._decoded.get(code)
+        if decoded is None:
+            decoded = self._decoded[code] = decode(code)
+        instructions, lines = decoded
+        return self._execute(instructions, lines, frame)
+
+    def _execute(self, instructions, lines, frame):
+        # NOTE: superinstructions come first, then opcodes are dispatched in
+        # groups, see bytecode, and checked in order of frequency within a
+        # group. Line numbers are looked up only to raise an error,
+        # lines[pc - 1] being the line of the current instruction
+        bodies = self._bodies
+        slots = frame.slots
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        while True:
+            op, arg = instructions[pc]
+            pc += 1
+            if op < 0:
+                if op == JUMP_UNLESS_SLOT_CONST:
+                    function, slot, number, target = arg
+                    if not function(slots[slot].num(), number):
+                        pc = target
+                elif op == BINARY_SLOT_CONST_STORE:
+                    function, wrapper, slot, number, target = arg
+                    slots[target] = wrapper(function(slots[slot].num(), number))
+                elif op == BINARY_SLOT_CONST:
+                    function, wrapper, slot, number = arg
+                    push(wrapper(function(slots[slot].num(), number)))
+                elif op == BINARY_CONST_STORE:
+                    function, wrapper, number, target = arg
+                    slots[target] = wrapper(function(pop().num(), number))
+                elif op == BINARY_CONST:
+                    function, wrapper, number = arg
+                    push(wrapper(function(pop().num(), number)))
+                elif op == BINARY_SLOT_SLOT_STORE:
+                    function, wrapper, left, right, target = arg
+                    slots[target] = wrapper(function(slots[left].num(), slots[right].num()))
+                elif op == BINARY_SLOT_SLOT:
+                    function, wrapper, left, right = arg
+                    push(wrapper(function(slots[left].num(), slots[right].num())))
+                elif op == STORE_CONST:
+                    value, slot = arg
+                    slots[slot] = value
+                elif op == RETURN_SLOT:
+                    return slots[arg]
+                else:
+                    hops, slot, lineno = arg
+                    func = frame.up(hops).slots[slot].obj(lineno)
+                    if not isinstance(func, FunctionValue):
+                        raise NotAFunctionError(func, lineno)
+                    push(func)
+            elif op < ADD:
+                if op == LOAD_SLOT:
+                    push(slots[arg])
+                elif op == LOAD_CONST:
+                    push(arg)
+                elif op == STORE_CHECKED:
+                    name, var_type, lineno, slot = arg
+                    value = pop()
+                    typecheck(lineno, name, value, var_type)
+                    slots[slot] = value
+                elif op == STORE_SLOT:
+                    slots[arg] = pop()
+                elif op < JUMP:
+                    rvalue = pop().num()
+                    lvalue = pop().num()
+                    if op == JUMP_UNLESS_LT:
+                        result = lvalue < rvalue
+                    elif op == JUMP_UNLESS_GT:
+                        result = lvalue > rvalue
+                    elif op == JUMP_UNLESS_LE:
+                        result = lvalue <= rvalue
+                    elif op == JUMP_UNLESS_GE:
+                        result = lvalue >= rvalue
+                    elif op == JUMP_UNLESS_EQ:
+                        result = lvalue == rvalue
+                    else:
+                        result = lvalue != rvalue
+                    if not result:
+                        pc = arg
+                elif op == JUMP:
+                    pc = arg
+                elif not pop().bool():
+                    pc = arg
+            elif op <= OR:
+                right = pop()
+                left = pop()
+                if op == ADD:
+                    push(number_value(left.num() + right.num()))
+                elif op == SUB:
+                    push(number_value(left.num() - right.num()))
+                elif op == MUL:
+                    push(number_value(left.num() * right.num()))
+                elif op == DIV:
+                    try:
+                        push(number_value(left.num() / right.num()))
+                    except ZeroDivisionError:
+                        raise DivisionByZeroError(lines[pc - 1])
+                elif op == LT:
+                    push(boolean_value(left.num() < right.num()))
+                elif op == GT:
+                    push(boolean_value(left.num() > right.num()))
+                elif op == LE:
+                    push(boolean_value(left.num() <= right.num()))
+                elif op == GE:
+                    push(boolean_value(left.num() >= right.num()))
+                elif op == EQ:
+                    push(boolean_value(left.num() == right.num()))
+                elif op == NE:
+                    push(boolean_value(left.num() != right.num()))
+                else:
+                    # both operands are evaluated already, as in the tree walker
+                    lvalue, rvalue = left.bool(), right.bool()
+                    if op == AND:
+                        push(boolean_value(lvalue and rvalue))
+                    else:
+                        push(boolean_value(lvalue or rvalue))
+            elif op < TO_OBJECT:
+                if op == LOAD_OUTER:
+                    hops, slot = arg
+                    push(frame.up(hops).slots[slot])
+                elif op == CHECK_FUNCTION:
+                    # the argument is the line number
+                    func = pop().obj(arg)
+                    if not isinstance(func, FunctionValue):
+                        raise NotAFunctionError(func, arg)
+                    push(func)
+                elif op == CALL:
+                    count, check, lineno = arg
+                    if count:
+                        values = stack[-count:]
+                        del stack[-count:]
+                    else:
+                        values = []
+                    func = pop()
+                    callee = func.new_frame(values, lineno, None, frame, check)
+                    body, body_lines = bodies[func.block]
+                    push(self._execute(body, body_lines, callee))
+                else:
+                    return pop()
+            elif op == TO_OBJECT:
+                push(pop().obj(arg))
+            elif op == GET_METHOD:
+                push(arg.get(stack[-1]))
+            elif op == CALL_METHOD:
+                count, check, lineno = arg
+                if count:
+                    values = stack[-count:]
+                    del stack[-count:]
+                else:
+                    values = []
+                func = pop()
+                callee = func.new_frame(values, lineno, pop(), frame, check)
+                body, body_lines = bodies[func.block]
+                push(self._execute(body, body_lines, callee))
+            elif op == GET_MEMBER:
+                obj = pop()
+                if not isinstance(obj, ObjectValue):
+                    obj.obj(lines[pc - 1])  # raises
+                push(arg.get(obj))
+            elif op == LOAD_THIS:
+                push(frame.this)
+            elif op == SET_MEMBER:
+                name, check, lineno = arg
+                value = pop()
+                pop().set_member(lineno, name, value, check)
+            elif op == NEW:
+                count, check, lineno = arg
+                values = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                cls = pop()
+                obj = cls.allocate(lineno)
+                self.call(cls.constructor, values, lineno, obj, frame, check)
+                push(obj)
+            elif op == CHECK_CLASS:
+                if not isinstance(stack[-1], ClassValue):
+                    raise NotAClassError(arg, lines[pc - 1])
+            elif op == POP:
+                pop()
+            elif op == STORE_OUTER:
+                hops, slot = arg
+                frame.up(hops).slots[slot] = pop()
+            elif op == TYPECHECK:
+                name, var_type, lineno = arg
+                typecheck(lineno, name, stack[-1], var_type)
+            elif op == NEG:
+                push(number_value(-pop().num()))
+            elif op == NOT:
+                push(boolean_value(not pop().bool()))
+            elif op == PRINT:
+                output.write(pop().str())
+            elif op == MAKE_FUNCTION or op == MAKE_CLASS:
+                push(arg.closure(frame))
+            else:
+                raise Exception('Unknown opcode {}'.format(op))
+
+
+def decode(code):
+    # (instructions, lines): the instructions of code as a list of (opcode,
+    # argument), with superinstructions, and the line number of each. Jump
+    # targets are indices in the list, and arguments that index a table of
+    # code are replaced by the entry, with the line number for the
+    # instructions that need it, so that the VM looks nothing up
+    tables = {
+        LOAD_CONST: code.consts, MAKE_FUNCTION: code.consts, MAKE_CLASS: code.consts,
+        STORE_CHECKED: code.stores, TYPECHECK: code.checks,
+        GET_MEMBER: code.caches, GET_METHOD: code.caches,
+        LOAD_OUTER: code.refs, STORE_OUTER: code.refs, CHECK_CLASS: code.names,
+    }
+    instructions = []
+    lines = []
+    for offset in xrange(0, len(code.code), 2):
+        op, arg = code.code[offset], code.code[offset + 1]
+        lineno = code.lines[offset // 2]
+        if op in tables:
+            arg = tables[op][arg]
+        elif op in (CALL, CALL_METHOD, NEW):
+            arg = code.calls[arg] + (lineno,)
+        elif op == SET_MEMBER:
+            arg = code.member_stores[arg] + (lineno,)
+        elif op in (TO_OBJECT, CHECK_FUNCTION):
+            arg = lineno
+        elif JUMP_UNLESS_LT <= op <= JUMP_IF_FALSE:
+            arg //= 2
+        instructions.append((op, arg))
+        lines.append(lineno)
+    return _fuse(instructions, lines)
+
+
+def _fuse(instructions, lines):
+    # (instructions, lines) with superinstructions in place of the sequences
+    # they do. A sequence is only fused if no jump lands inside it, and the
+    # line of a superinstruction is the one of its last instruction
+    targets = set(
+        arg for op, arg in instructions if JUMP_UNLESS_LT <= op <= JUMP_IF_FALSE
+    )
+    fused = []
+    fused_lines = []
+    indices = {}  # new index by old one, of the instructions jumped to
+    index = 0
+    while index < len(instructions):
+        indices[index] = len(fused)
+        count = 1
+        while count < 4 and index + count < len(instructions) and index + count not in targets:
+            count += 1
+        instruction, size = _superinstruction(instructions[index:index + count])
+        fused.append(instruction)
+        fused_lines.append(lines[index + size - 1])
+        index += size
+    indices[index] = len(fused)
+    for i, (op, arg) in enumerate(fused):
+        if JUMP_UNLESS_LT <= op <= JUMP_IF_FALSE:
+            fused[i] = op, indices[arg]
+        elif op == JUMP_UNLESS_SLOT_CONST:
+            function, slot, number, target = arg
+            fused[i] = op, (function, slot, number, indices[target])
+    return fused, fused_lines
+
+
+def _superinstruction(sequence):
+    # (instruction, number of instructions it does) for the start of
+    # sequence, which no jump lands inside
+    ops = [op for op, _ in sequence] + [None] * (4 - len(sequence))
+    args = [arg for _, arg in sequence] + [None] * (4 - len(sequence))
+    number = args[1].num() if ops[1] == LOAD_CONST and isinstance(args[1], NumberValue) else None
+    if ops[0] == LOAD_SLOT:
+        if number is not None:
+            if ops[2] in _COMPARISONS:
+                return (JUMP_UNLESS_SLOT_CONST, (_COMPARISONS[ops[2]], args[0], number, args[2])), 3
+            if ops[2] in _OPERATIONS and (ops[2] != DIV or number != 0):
+                function, wrapper = _OPERATIONS[ops[2]]
+                if ops[3] == STORE_SLOT:
+                    return (BINARY_SLOT_CONST_STORE, (function, wrapper, args[0], number, args[3])), 4
+                return (BINARY_SLOT_CONST, (function, wrapper, args[0], number)), 3
+        if ops[1] == LOAD_SLOT and ops[2] in _OPERATIONS and ops[2] != DIV:
+            function, wrapper = _OPERATIONS[ops[2]]
+            if ops[3] == STORE_SLOT:
+                return (BINARY_SLOT_SLOT_STORE, (function, wrapper, args[0], args[1], args[3])), 4
+            return (BINARY_SLOT_SLOT, (function, wrapper, args[0], args[1])), 3
+        if ops[1] == RETURN:
+            return (RETURN_SLOT, args[0]), 2
+    elif ops[0] == LOAD_CONST:
+        if ops[1] == STORE_SLOT:
+            return (STORE_CONST, (args[0], args[1])), 2
+        number = args[0].num() if isinstance(args[0], NumberValue) else None
+        if number is not None and ops[1] in _OPERATIONS and (ops[1] != DIV or number != 0):
+            function, wrapper = _OPERATIONS[ops[1]]
+            if ops[2] == STORE_SLOT:
+                return (BINARY_CONST_STORE, (function, wrapper, number, args[2])), 3
+            return (BINARY_CONST, (function, wrapper, number)), 2
+    elif ops[0] == LOAD_OUTER and ops[1] == CHECK_FUNCTION:
+        hops, slot = args[0]
+        return (LOAD_OUTER_FUNCTION, (hops, slot, args[1])), 2
+    return sequence[0], 1
+
+
+def run(root):
+    code, bodies = compile_program(root)
+    try:
+        VM(bodies).execute(code, Frame(root.frame_size))
+    finally:
+        output.flush()